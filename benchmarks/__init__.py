@@ -0,0 +1 @@
+"""Бенчмарки горячих путей бота (запускаются против локального Postgres)"""
@@ -0,0 +1,241 @@
+"""Детерминированный генератор синтетических логистических данных
+
+Один и тот же seed всегда дает одни и те же заказы, контейнеры, задачи
+и подписки. Даты строятся относительно полуночи текущего дня, чтобы
+запросы «сегодня» и «ближайшие 48 часов» находили события.
+
+Пример:
+    python -m benchmarks.datagen --database-url postgresql://localhost/bot_bench --orders 5000 --reset
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from models import OrderStatus
+
+CLIENTS = [
+    "Altyn Asyr Trade", "Berkarar Import", "Daşoguz Textile", "Garagum Build",
+    "Lebap Agro", "Mary Energy", "Ahal Foods", "Balkan Oil Service",
+    "Turkmen Steel", "Ashgabat Motors", "Caspian Chemicals", "Merw Logistics"
+]
+
+GOODS = ["Электроника", "Текстиль", "Стройматериалы", "Оборудование", "Запчасти", "Химия", "Продукты"]
+
+ROUTES = ["Шанхай - Бендер-Аббас - Ашхабад", "Нинбо - Бендер-Аббас - Мары",
+          "Циндао - Бендер-Аббас - Туркменабад", "Шэньчжэнь - Бендер-Аббас - Ашхабад"]
+
+CHINESE_COMPANIES = ["COSCO", "Sinotrans", "China Shipping Agency"]
+IRANIAN_COMPANIES = ["IRISL", "Bandar Trans", "Pars Logistic"]
+CONTAINER_TYPES = ["20ft Standard", "40ft Standard", "40ft High Cube"]
+DRIVER_NAMES = ["Reza", "Ali", "Mehdi", "Hassan", "Amir", "Saeed"]
+DRIVER_SURNAMES = ["Ahmadi", "Hosseini", "Karimi", "Rahimi", "Moradi"]
+ASSIGNEES = ["perman", "aylar", "merdan", "jeren", "serdar"]
+TASK_STATUSES = ["ToDo", "InProgress", "Done"]
+PRIORITIES = ["Low", "Medium", "High"]
+
+# (поле, статус после наступления даты, мин. дней, макс. дней от предыдущей даты)
+TIMELINE = [
+    ('departure_date', OrderStatus.IN_TRANSIT_CHN_IR.value, 5, 15),
+    ('arrival_iran_date', OrderStatus.IN_PROGRESS_IR.value, 20, 35),
+    ('truck_loading_date', OrderStatus.IN_TRANSIT_IR_TKM.value, 2, 7),
+    ('arrival_turkmenistan_date', OrderStatus.IN_TRANSIT_IR_TKM.value, 3, 8),
+    ('client_receiving_date', OrderStatus.COMPLETED.value, 1, 3),
+]
+
+
+class LogisticsDataGenerator:
+    """Генератор заказов, контейнеров, задач и подписок"""
+
+    def __init__(self, seed: int = 42, now: Optional[datetime] = None):
+        self.rng = random.Random(seed)
+        self.now = now or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def _date_after(self, base: datetime, min_days: int, max_days: int) -> datetime:
+        return base + timedelta(days=self.rng.randint(min_days, max_days),
+                                hours=self.rng.randint(0, 23))
+
+    def generate_orders(self, count: int) -> List[Dict]:
+        """Сгенерировать заказы с согласованной цепочкой дат и статусом"""
+        orders = []
+        for i in range(1, count + 1):
+            creation_date = self.now - timedelta(days=self.rng.randint(0, 120),
+                                                 hours=self.rng.randint(0, 23))
+            order = {
+                'id': i,
+                'order_number': f"ORD-{i:06d}",
+                'client_name': self.rng.choice(CLIENTS),
+                'container_count': 0,
+                'goods_type': self.rng.choice(GOODS),
+                'route': self.rng.choice(ROUTES),
+                'transit_port': "Бендер-Аббас",
+                'document_number': f"BL{self.rng.randint(100000, 999999)}",
+                'chinese_transport_company': self.rng.choice(CHINESE_COMPANIES),
+                'iranian_transport_company': self.rng.choice(IRANIAN_COMPANIES),
+                'status': OrderStatus.IN_PROGRESS_CHN.value,
+                'creation_date': creation_date,
+                'loading_date': self._date_after(creation_date, 1, 4),
+                'has_loading_photo': self.rng.random() < 0.7,
+                'has_local_charges': self.rng.random() < 0.5,
+                'has_tex': self.rng.random() < 0.4,
+                'notes': None,
+                'created_at': creation_date,
+                'updated_at': creation_date,
+            }
+
+            # Плановая цепочка дат; статус определяется последним наступившим этапом
+            previous = order['loading_date']
+            if previous > self.now:
+                order['status'] = OrderStatus.NEW.value
+            for field, status, min_days, max_days in TIMELINE:
+                previous = self._date_after(previous, min_days, max_days)
+                order[field] = previous
+                if previous <= self.now:
+                    order['status'] = status
+
+            order['eta_date'] = order['arrival_turkmenistan_date']
+            order['arrival_notice_date'] = order['arrival_iran_date'] - timedelta(days=2)
+            order['tkm_date'] = order['arrival_turkmenistan_date']
+
+            if self.rng.random() < 0.03:
+                order['status'] = OrderStatus.CANCELLED.value
+            orders.append(order)
+
+        return orders
+
+    def generate_containers(self, orders: List[Dict]) -> List[Dict]:
+        """Сгенерировать 1-4 контейнера на заказ (обновляет container_count)"""
+        containers = []
+        for order in orders:
+            count = self.rng.randint(1, 4)
+            order['container_count'] = count
+            for _ in range(count):
+                containers.append({
+                    'id': len(containers) + 1,
+                    'order_id': order['id'],
+                    'container_number': f"{self.rng.choice(['MSKU', 'CSNU', 'TGHU'])}{self.rng.randint(1000000, 9999999)}",
+                    'container_type': self.rng.choice(CONTAINER_TYPES),
+                    'weight': round(self.rng.uniform(8000, 26000), 1),
+                    'volume': round(self.rng.uniform(25, 76), 1),
+                    'loading_date': order['loading_date'],
+                    'departure_date': order['departure_date'],
+                    'arrival_iran_date': order['arrival_iran_date'],
+                    'truck_loading_date': order['truck_loading_date'],
+                    'arrival_turkmenistan_date': order['arrival_turkmenistan_date'],
+                    'client_receiving_date': order['client_receiving_date'],
+                    'driver_first_name': self.rng.choice(DRIVER_NAMES),
+                    'driver_last_name': self.rng.choice(DRIVER_SURNAMES),
+                    'driver_company': self.rng.choice(IRANIAN_COMPANIES),
+                    'truck_number': f"{self.rng.randint(10, 99)}IR{self.rng.randint(100, 999)}",
+                    'driver_iran_phone': f"+98 9{self.rng.randint(100000000, 999999999)}",
+                    'driver_turkmenistan_phone': f"+993 6{self.rng.randint(1000000, 9999999)}",
+                })
+        return containers
+
+    def generate_tasks(self, orders: List[Dict], per_order: float = 0.5) -> List[Dict]:
+        """Сгенерировать задачи (в среднем per_order на заказ)"""
+        tasks = []
+        for order in orders:
+            while self.rng.random() < per_order / (1 + per_order):
+                tasks.append({
+                    'id': len(tasks) + 1,
+                    'order_id': order['id'],
+                    'description': f"Проверить документы по {order['order_number']}",
+                    'assigned_to': self.rng.choice(ASSIGNEES),
+                    'status': self.rng.choice(TASK_STATUSES),
+                    'priority': self.rng.choice(PRIORITIES),
+                    'due_date': self.now + timedelta(days=self.rng.randint(-10, 20)),
+                    'created_date': order['creation_date'],
+                })
+        return tasks
+
+    def generate_subscriptions(self, count: int) -> List[Dict]:
+        """Сгенерировать подписки на уведомления"""
+        return [
+            {
+                'id': i,
+                'chat_id': str(100000000 + i),
+                'is_active': self.rng.random() < 0.9,
+                'notify_events': True,
+                'notify_reminders': self.rng.random() < 0.8,
+                'notify_alerts': True,
+                'hours_before': self.rng.choice([6, 12, 24, 48]),
+                'created_at': self.now,
+                'updated_at': self.now,
+            }
+            for i in range(1, count + 1)
+        ]
+
+    def generate(self, orders: int, subscriptions: int) -> Dict[str, List[Dict]]:
+        """Сгенерировать полный набор данных"""
+        order_rows = self.generate_orders(orders)
+        return {
+            'orders': order_rows,
+            'containers': self.generate_containers(order_rows),
+            'tasks': self.generate_tasks(order_rows),
+            'subscriptions': self.generate_subscriptions(subscriptions),
+        }
+
+
+def load_dataset(dataset: Dict[str, List[Dict]], reset: bool = False, engine=None):
+    """Записать набор данных в базу (таблицы создаются миграциями)"""
+    from psycopg2.extras import execute_values
+    from database import get_engine
+    from migrations import run_migrations
+
+    engine = engine or get_engine()
+    run_migrations(engine)
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        if reset:
+            cursor.execute("TRUNCATE notifications, subscriptions, tasks, containers, orders RESTART IDENTITY CASCADE")
+
+        # Порядок важен из-за внешних ключей
+        for table in ('orders', 'containers', 'tasks', 'subscriptions'):
+            rows = dataset.get(table) or []
+            if not rows:
+                continue
+            columns = list(rows[0].keys())
+            execute_values(
+                cursor,
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s",
+                [tuple(row[c] for c in columns) for row in rows],
+                page_size=1000
+            )
+            # id заданы явно, поэтому сдвигаем последовательность
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))")
+
+        cursor.execute("ANALYZE")
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетических данных для бенчмарков")
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help="База для бенчмарков (по умолчанию BENCH_DATABASE_URL)")
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--subscriptions', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help="Очистить таблицы перед загрузкой")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL (локальный Postgres, не продакшн)")
+    os.environ['DATABASE_URL'] = args.database_url
+
+    dataset = LogisticsDataGenerator(args.seed).generate(args.orders, args.subscriptions)
+    load_dataset(dataset, reset=args.reset)
+    print(", ".join(f"{table}: {len(rows)}" for table, rows in dataset.items()))
+
+
+if __name__ == '__main__':
+    main()
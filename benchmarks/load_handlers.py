@@ -0,0 +1,269 @@
+"""Нагрузочный генератор для обработчиков бота
+
+Собирает Application из bot.py с подменным транспортом Bot API (без
+Telegram) и подает в очередь обновлений синтетические Update с заданной
+частотой и смесью команд. В конце печатает пропускную способность и
+p50/p95/p99 задержки от постановки в очередь до завершения обработки.
+
+Примеры:
+    python -m benchmarks.load_handlers --rate 50 --duration 20 --mix search=5,active=3,start=1
+    python -m benchmarks.load_handlers --database-url postgresql://localhost/bot_bench \\
+        --rate 200 --chats 100 --api-latency-ms 40 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+
+# Команды и их аргументы; callback:<data> означает нажатие inline кнопки
+DEFAULT_MIX = "search=5,active=3,start=1,summary=1,callback:active=1"
+SEARCH_TERMS = ["ORD-0001", "ORD-00", "Altyn", "Mary", "Ашхабад", "BL1"]
+
+
+class StubTelegramRequest(BaseRequest):
+    """Подменный транспорт Bot API: отвечает как Telegram, но локально"""
+
+    def __init__(self, api_latency: float = 0.0):
+        self.api_latency = api_latency
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs) -> Tuple[int, bytes]:
+        endpoint = url.rsplit('/', 1)[-1]
+        self.calls[endpoint] += 1
+        if self.api_latency:
+            await asyncio.sleep(self.api_latency)
+
+        params = request_data.parameters if request_data else {}
+        return 200, json.dumps({'ok': True, 'result': self._result(endpoint, params)}).encode()
+
+    def _result(self, endpoint: str, params: Dict):
+        if endpoint == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'LoadBot', 'username': 'load_test_bot'}
+        if endpoint.startswith(('send', 'edit')):
+            self._message_id += 1
+            return {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text', '')
+            }
+        return True
+
+
+def parse_mix(mix: str) -> List[Tuple[str, int]]:
+    """'search=5,active=3' -> [('search', 5), ('active', 3)]"""
+    result = []
+    for part in mix.split(','):
+        name, _, weight = part.strip().partition('=')
+        result.append((name, int(weight or 1)))
+    return result
+
+
+class UpdateFactory:
+    """Фабрика синтетических обновлений Telegram"""
+
+    def __init__(self, bot, chats: int, seed: int):
+        self.bot = bot
+        self.rng = random.Random(seed)
+        self.chat_ids = [200000000 + i for i in range(chats)]
+        self.update_id = 0
+
+    def _message(self, chat_id: int, text: str, entities: Optional[List[Dict]] = None) -> Dict:
+        self.update_id += 1
+        return {
+            'message_id': self.update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Load'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Load'},
+            'text': text,
+            'entities': entities or []
+        }
+
+    def build(self, kind: str):
+        """Создать Update для команды или callback"""
+        chat_id = self.rng.choice(self.chat_ids)
+
+        if kind.startswith('callback:'):
+            message = self._message(chat_id, "menu")
+            payload = {
+                'update_id': self.update_id,
+                'callback_query': {
+                    'id': str(self.update_id),
+                    'from': message['from'],
+                    'chat_instance': str(chat_id),
+                    'message': message,
+                    'data': kind.split(':', 1)[1]
+                }
+            }
+        else:
+            command = f"/{kind}"
+            text = command
+            if kind == 'search':
+                text += " " + self.rng.choice(SEARCH_TERMS)
+            message = self._message(chat_id, text, [{'type': 'bot_command', 'offset': 0, 'length': len(command)}])
+            payload = {'update_id': self.update_id, 'message': message}
+
+        return Update.de_json(payload, self.bot)
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+async def run_load(args) -> Dict:
+    """Подать нагрузку и собрать статистику"""
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', '123456:LOAD-TEST-TOKEN')
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ['BOT_CONCURRENT_UPDATES'] = str(args.concurrency)
+    if not args.flood_protection:
+        # Генератор шлет в один чат чаще живого пользователя
+        os.environ['FLOOD_RATE'] = os.environ['FLOOD_BURST'] = '1000000'
+        os.environ['FLOOD_MAX_PENDING'] = '1000000'
+
+    # bot.py читает окружение при импорте
+    import bot as bot_module
+
+    request = StubTelegramRequest(api_latency=args.api_latency_ms / 1000)
+    application = bot_module.build_application(os.environ['TELEGRAM_BOT_TOKEN'], request=request)
+
+    enqueued_at: Dict[int, Tuple[float, str]] = {}
+    latencies: Dict[str, List[float]] = {}
+    errors: Counter = Counter()
+    done = asyncio.Event()
+    expected = int(args.rate * args.duration)
+
+    async def record_done(update: Update, context):
+        started, kind = enqueued_at.pop(update.update_id, (None, None))
+        if started is not None:
+            latencies.setdefault(kind, []).append((time.perf_counter() - started) * 1000)
+        if sum(len(v) for v in latencies.values()) >= expected:
+            done.set()
+
+    async def record_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    # Последняя группа: срабатывает после всех обработчиков бота
+    application.add_handler(TypeHandler(Update, record_done), group=1000)
+    application.add_error_handler(record_error)
+
+    factory = UpdateFactory(application.bot, args.chats, args.seed)
+    mix = parse_mix(args.mix)
+    kinds = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+
+    async with application:
+        await application.start()
+        interval = 1.0 / args.rate
+        started = time.perf_counter()
+
+        for i in range(expected):
+            kind = factory.rng.choices(kinds, weights)[0]
+            update = factory.build(kind)
+            enqueued_at[update.update_id] = (time.perf_counter(), kind)
+            await application.update_queue.put(update)
+
+            # Выдерживаем заданную частоту без накопления ошибки
+            delay = started + (i + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        try:
+            await asyncio.wait_for(done.wait(), timeout=args.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    all_latencies = sorted(x for values in latencies.values() for x in values)
+    completed = len(all_latencies)
+
+    def summary(samples: List[float]) -> Dict:
+        samples = sorted(samples)
+        return {
+            'count': len(samples),
+            'p50_ms': round(percentile(samples, 0.50), 2),
+            'p95_ms': round(percentile(samples, 0.95), 2),
+            'p99_ms': round(percentile(samples, 0.99), 2),
+            'mean_ms': round(statistics.fmean(samples), 2) if samples else 0.0,
+        }
+
+    return {
+        'config': {
+            'rate': args.rate,
+            'duration': args.duration,
+            'chats': args.chats,
+            'mix': args.mix,
+            'api_latency_ms': args.api_latency_ms,
+            'concurrency': args.concurrency,
+            'flood_protection': args.flood_protection,
+            'database': 'postgres' if args.database_url else 'mock',
+        },
+        'sent': expected,
+        'completed': completed,
+        'lost': expected - completed,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(completed / elapsed, 2) if elapsed else 0.0,
+        'latency': summary(all_latencies),
+        'by_command': {kind: summary(values) for kind, values in latencies.items()},
+        'errors': dict(errors),
+        'dropped_by_flood': getattr(application.update_processor, 'dropped', 0),
+        'api_calls': dict(request.calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест обработчиков бота без Telegram")
+    parser.add_argument('--rate', type=float, default=50, help="Обновлений в секунду")
+    parser.add_argument('--duration', type=float, default=10, help="Длительность подачи, секунд")
+    parser.add_argument('--chats', type=int, default=20, help="Число разных чатов")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Смесь команд (по умолчанию {DEFAULT_MIX})")
+    parser.add_argument('--api-latency-ms', type=float, default=0, help="Имитация задержки Bot API")
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help="База для обработчиков (без нее используется заглушка)")
+    parser.add_argument('--concurrency', type=int, default=16, help="Обновлений одновременно (BOT_CONCURRENT_UPDATES)")
+    parser.add_argument('--flood-protection', action='store_true',
+                        help="Не отключать защиту от флуда (лишние обновления чата пропускаются)")
+    parser.add_argument('--drain-timeout', type=float, default=30, help="Ожидание обработки хвоста очереди")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="Записать результат в JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_load(args))
+
+    latency = report['latency']
+    print(f"Отправлено: {report['sent']}, обработано: {report['completed']}, за {report['elapsed_s']} с")
+    print(f"Пропускная способность: {report['throughput_rps']} обн/с")
+    print(f"Задержка: p50 {latency['p50_ms']} мс, p95 {latency['p95_ms']} мс, p99 {latency['p99_ms']} мс")
+    for kind, stats in sorted(report['by_command'].items()):
+        print(f"  {kind:20s} n={stats['count']:6d} p50 {stats['p50_ms']:8.2f} p95 {stats['p95_ms']:8.2f} p99 {stats['p99_ms']:8.2f}")
+    if report['dropped_by_flood']:
+        print(f"Пропущено защитой от флуда: {report['dropped_by_flood']}")
+    if report['errors']:
+        print(f"Ошибки: {report['errors']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+"""Бенчмарки горячих путей
+
+Замеряет каждый запрос DatabaseManager, генерацию уведомлений,
+format_order_info, оба PDF генератора и разбор ответа WPF на синтетических данных и пишет
+результаты в JSON. Два JSON можно сравнить, чтобы поймать регрессию.
+
+Примеры:
+    python -m benchmarks.run_benchmarks --database-url postgresql://localhost/bot_bench \\
+        --orders 5000 --load --output bench_before.json
+    python -m benchmarks.run_benchmarks --database-url ... --output bench_after.json \\
+        --compare bench_before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.datagen import LogisticsDataGenerator, load_dataset
+
+
+def measure(fn: Callable, repeat: int, warmup: int = 1, setup: Optional[Callable] = None) -> Dict:
+    """Выполнить fn repeat раз и вернуть статистику в миллисекундах"""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+
+    samples.sort()
+    return {
+        'runs': len(samples),
+        'min_ms': round(samples[0], 3),
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'mean_ms': round(statistics.fmean(samples), 3),
+        'max_ms': round(samples[-1], 3),
+    }
+
+
+def build_orm_orders(dataset: Dict[str, List[Dict]], limit: int) -> List:
+    """Собрать ORM объекты Order с контейнерами (для форматтеров и PDF)"""
+    from models import Order, Container
+
+    order_columns = set(Order.__table__.columns.keys())
+    container_columns = set(Container.__table__.columns.keys())
+
+    containers_by_order: Dict[int, List[Dict]] = {}
+    for container in dataset['containers']:
+        containers_by_order.setdefault(container['order_id'], []).append(container)
+
+    orders = []
+    for row in dataset['orders'][:limit]:
+        order = Order(**{k: v for k, v in row.items() if k in order_columns})
+        order.containers = [
+            Container(**{k: v for k, v in c.items() if k in container_columns})
+            for c in containers_by_order.get(row['id'], [])
+        ]
+        orders.append(order)
+    return orders
+
+
+def build_wpf_payload(dataset: Dict[str, List[Dict]]) -> bytes:
+    """Ответ WPF программы с заказами набора (даты в формате dd.mm.yyyy HH:MM)"""
+    orders = []
+    for row in dataset['orders']:
+        item = {}
+        for key, value in row.items():
+            if key == 'id':
+                continue
+            item[key] = value.strftime('%d.%m.%Y %H:%M') if isinstance(value, datetime) else value
+        orders.append(item)
+    return json.dumps({'orders': orders}, ensure_ascii=False).encode('utf-8')
+
+
+def database_benchmarks(db, dataset: Dict[str, List[Dict]]) -> Dict[str, Callable]:
+    """Запросы DatabaseManager с параметрами из набора данных"""
+    orders = dataset['orders']
+    sample = orders[len(orders) // 2]
+    now = datetime.now()
+
+    return {
+        'db.get_all_orders': db.get_all_orders,
+        'db.get_order_by_number': lambda: db.get_order_by_number(sample['order_number']),
+        'db.get_orders_by_status': lambda: db.get_orders_by_status(sample['status']),
+        'db.get_orders_by_statuses': lambda: db.get_orders_by_statuses(['New', 'In Transit CHN-IR']),
+        'db.get_active_orders': db.get_active_orders,
+        'db.search_orders.number_prefix': lambda: db.search_orders(sample['order_number'][:7]),
+        'db.search_orders.client': lambda: db.search_orders(sample['client_name'].split()[0]),
+        'db.get_statistics': lambda: db.get_statistics(30),
+        'db.get_orders_without_photos': db.get_orders_without_photos,
+        'db.get_orders_by_date_range': lambda: db.get_orders_by_date_range(now - timedelta(days=30), now),
+        'db.get_orders_with_events_today': db.get_orders_with_events_today,
+        'db.get_upcoming_events': lambda: db.get_upcoming_events(now, now + timedelta(hours=48)),
+    }
+
+
+def git_revision() -> Optional[str]:
+    """Текущий коммит (для сопоставления результатов)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args) -> Dict:
+    """Прогнать все бенчмарки"""
+    from database import DatabaseManager, get_engine
+    from notification_service import NotificationService
+    from utils import format_order_info
+    from pdf_generator import generate_order_pdf, generate_summary_pdf
+
+    dataset = LogisticsDataGenerator(args.seed).generate(args.orders, args.subscriptions)
+    if args.load:
+        load_dataset(dataset, reset=True)
+
+    db = DatabaseManager()
+    results: Dict[str, Dict] = {}
+
+    def record(name: str, fn: Callable, repeat: int, setup: Optional[Callable] = None):
+        if args.only and args.only not in name:
+            return
+        results[name] = measure(fn, repeat, args.warmup, setup)
+        print(f"{name:45s} median {results[name]['median_ms']:10.3f} ms   p95 {results[name]['p95_ms']:10.3f} ms")
+
+    for name, fn in database_benchmarks(db, dataset).items():
+        record(name, fn, args.repeat)
+
+    # Генерация уведомлений: очищаем таблицу перед каждым прогоном
+    service = NotificationService()
+
+    def clear_notifications():
+        conn = get_engine().raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM notifications")
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    record('notifications.check_and_create', service.check_and_create_notifications,
+           max(1, args.repeat // 5), setup=clear_notifications)
+    service.close()
+
+    # Поиск задержек по всем активным заказам: один запрос и расчет по колонкам
+    from delay_monitor import load_delays
+
+    def scan_delays_readonly():
+        conn = get_engine().raw_connection()
+        try:
+            cursor = conn.cursor()
+            load_delays(cursor)
+            cursor.close()
+        finally:
+            conn.rollback()
+            conn.close()
+
+    record('delays.scan_active_orders', scan_delays_readonly, args.repeat)
+
+    orm_orders = build_orm_orders(dataset, 200)
+    record('utils.format_order_info.x200',
+           lambda: [format_order_info(order) for order in orm_orders], args.repeat)
+    record('pdf.generate_order_pdf', lambda: generate_order_pdf(orm_orders[0]), max(1, args.repeat // 2))
+    record('pdf.generate_summary_pdf', lambda: generate_summary_pdf(30, db), max(1, args.repeat // 5))
+
+    # Готовый отчет из кэша (после первого построения — без базы и reportlab)
+    import tempfile
+    from summary_reports import SummaryReportCache
+    report_cache = SummaryReportCache(tempfile.mkdtemp(prefix='bench_reports_'))
+    record('pdf.summary_report_cached', lambda: report_cache.get(db, 30), args.repeat)
+
+    # Разбор ответа синхронизации: весь ответ в памяти против потокового
+    from wpf_stream import decode_orders, DATE_FIELDS
+    from utils import parse_date
+
+    payload = build_wpf_payload(dataset)
+    chunks = [payload[i:i + 65536] for i in range(0, len(payload), 65536)]
+
+    def decode_full():
+        orders = json.loads(payload)['orders']
+        for order in orders:
+            for field in DATE_FIELDS:
+                if order.get(field):
+                    order[field] = parse_date(order[field])
+        return orders
+
+    record('sync.decode_wpf_payload.json_loads', decode_full, max(1, args.repeat // 5))
+    record('sync.decode_wpf_payload.stream', lambda: list(decode_orders(chunks)), max(1, args.repeat // 5))
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'orders': args.orders,
+            'subscriptions': args.subscriptions,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Сравнить медианы, вернуть список регрессий"""
+    regressions = []
+    print(f"\n{'бенчмарк':45s} {'было':>10s} {'стало':>10s} {'x':>7s}")
+    for name, result in current['results'].items():
+        old = baseline.get('results', {}).get(name)
+        if not old:
+            continue
+        ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  ⚠️ регрессия"
+            regressions.append(name)
+        print(f"{name:45s} {old['median_ms']:10.3f} {result['median_ms']:10.3f} {ratio:7.2f}{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей бота")
+    parser.add_argument('--database-url', default=os.getenv('BENCH_DATABASE_URL'),
+                        help="База для бенчмарков (по умолчанию BENCH_DATABASE_URL)")
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--subscriptions', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--load', action='store_true', help="Перезалить синтетические данные перед замером")
+    parser.add_argument('--only', help="Запустить только бенчмарки, содержащие подстроку")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help="JSON предыдущего прогона для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Допустимое замедление медианы (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        parser.error("укажите --database-url или BENCH_DATABASE_URL (локальный Postgres, не продакшн)")
+    os.environ['DATABASE_URL'] = args.database_url
+
+    report = run(args)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты записаны в {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,52 @@
+from instrumentation import (
+    StartupTimer,
+    start_update_timing,
+    finish_update_timing,
+    timed,
+    capture_profile,
+    query_metrics,
+    memory_monitor
+)
+
 import os
+import asyncio
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List
+from datetime import datetime, timedelta, time as dtime
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent
+)
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
+    TypeHandler,
     ContextTypes,
     filters
 )
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, Forbidden
+from telegram.request import BaseRequest, HTTPXRequest
 import sys
 
+from search_index import order_search_index, SUMMARY_COLUMNS
+from rows import OrderView, make_row
+from status_board import status_counts
+from daily_agenda import daily_agenda
+from summary_reports import summary_reports, SUMMARY_PERIODS, REPORT_CHECK_SECONDS
+from circuit_breaker import track_stale
+from update_processor import ChatOrderedUpdateProcessor
+
+# Замер времени запуска (от начала процесса)
+startup_timer = StartupTimer()
+
 # Загрузка переменных окружения
 load_dotenv()
 
@@ -33,55 +65,188 @@ if not TELEGRAM_BOT_TOKEN:
     logger.info("Получите токен у @BotFather в Telegram")
     sys.exit(1)
 
-# Инициализация менеджеров с обработкой ошибок
-try:
-    from database import DatabaseManager
-    from models import OrderStatus
-    from utils import format_date, get_status_emoji, format_order_info
-    
-    db = DatabaseManager()
-    logger.info("✅ База данных подключена успешно")
-    
-except Exception as e:
-    logger.error(f"❌ Ошибка при подключении к базе данных: {e}")
-    logger.info("Создаем временную базу данных для тестирования...")
-    
-    # Создаем простой заглушечный DatabaseManager для тестирования
-    class MockDatabaseManager:
-        def get_all_orders(self):
-            return []
-        def get_order_by_number(self, order_number):
-            return None
-        def get_orders_by_status(self, status):
-            return []
-        def get_orders_by_statuses(self, statuses):
-            return []
-        def get_active_orders(self):
-            return []
-        def search_orders(self, search_text):
-            return []
-        def get_statistics(self, days=30):
-            return {
-                'total_orders': 0,
-                'completed_orders': 0,
-                'active_orders': 0,
-                'total_containers': 0,
-                'total_weight': 0,
-                'total_volume': 0,
-                'period_days': days
-            }
-    
-    db = MockDatabaseManager()
-    
-    # Заглушки для утилит
-    def format_date(date):
-        return date.strftime('%d.%m.%Y') if date else "-"
-    
-    def get_status_emoji(status):
-        return "📋"
-    
-    def format_order_info(order):
-        return f"Заказ: {order.order_number}"
+
+# Порог медленного обновления для логирования
+SLOW_UPDATE_MS = float(os.getenv('SLOW_UPDATE_MS', '1000'))
+
+# Период инкрементального обновления индекса inline-поиска, секунд
+INDEX_REFRESH_SECONDS = int(os.getenv('INDEX_REFRESH_SECONDS', '30'))
+INLINE_RESULTS_LIMIT = 20
+
+# Заказов на одной странице доски статусов
+STATUS_PAGE_SIZE = 10
+
+# Задач на одной странице /tasks
+TASK_PAGE_SIZE = 10
+# Формат срока задачи в callback_data (ключ keyset пагинации)
+TASK_CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+# Период проверки сроков задач, секунд
+TASK_REMINDER_SECONDS = int(os.getenv('TASK_REMINDER_SECONDS', '900'))
+
+# Период поиска задержек по активным заказам, секунд
+DELAY_SCAN_SECONDS = int(os.getenv('DELAY_SCAN_SECONDS', '900'))
+
+# Период отправки очереди уведомлений для WPF, секунд
+WPF_OUTBOX_FLUSH_SECONDS = int(os.getenv('WPF_OUTBOX_FLUSH_SECONDS', '5'))
+
+# Период проверки очереди уведомлений, секунд
+NOTIFICATION_CHECK_SECONDS = int(os.getenv('NOTIFICATION_CHECK_SECONDS', '30'))
+
+# Период записи RSS и числа объектов для /memory, секунд
+MEMORY_SAMPLE_SECONDS = int(os.getenv('MEMORY_SAMPLE_SECONDS', '300'))
+
+
+def parse_admin_chat_ids(value: str) -> set:
+    """Разобрать ADMIN_CHAT_IDS (через запятую)"""
+    ids = set()
+    for part in (value or '').split(','):
+        part = part.strip()
+        if part.lstrip('-').isdigit():
+            ids.add(int(part))
+    return ids
+
+ADMIN_CHAT_IDS = parse_admin_chat_ids(os.getenv('ADMIN_CHAT_IDS', ''))
+
+
+def is_admin(update: Update) -> bool:
+    """Проверить, что запрос пришел от администратора"""
+    chat = update.effective_chat
+    user = update.effective_user
+    return bool(
+        (chat and chat.id in ADMIN_CHAT_IDS) or
+        (user and user.id in ADMIN_CHAT_IDS)
+    )
+
+
+# Простой заглушечный DatabaseManager для тестирования без базы
+class MockDatabaseManager:
+    def get_all_orders(self):
+        return []
+    def get_order_by_number(self, order_number):
+        return None
+    def get_orders_by_status(self, status):
+        return []
+    def get_orders_by_statuses(self, statuses):
+        return []
+    def get_active_orders(self):
+        return []
+    def search_orders(self, search_text):
+        return []
+    def get_status_counts(self):
+        return []
+    def get_orders_page_by_status(self, status, before_id=None, limit=10):
+        return []
+    def get_agenda_orders(self, day):
+        return []
+    def find_containers(self, number, limit=10):
+        return []
+    def find_containers_by_truck(self, plate, limit=20):
+        return []
+    def get_task_counts(self, assignees=None):
+        return None
+    def get_open_tasks_page(self, after=None, limit=10, assignees=None):
+        return []
+    def get_task_assignees(self, chat_id):
+        return []
+    def get_agenda_orders_updated_since(self, since):
+        return []
+    def get_database_time(self):
+        return datetime.now()
+    def get_orders_updated_since(self, since):
+        return []
+    def get_statistics(self, days=30):
+        return {
+            'total_orders': 0,
+            'completed_orders': 0,
+            'active_orders': 0,
+            'total_containers': 0,
+            'total_weight': 0,
+            'total_volume': 0,
+            'period_days': days
+        }
+
+
+# Импорт модулей работы с базой. Подключение к базе здесь НЕ создается:
+# engine и пул создаются лениво при первом обращении (см. get_db)
+with startup_timer.phase("импорт модулей"):
+    try:
+        from database import DatabaseManager, get_pool_status, statement_registry, stale_results
+        from models import OrderStatus
+        from utils import format_date, get_status_emoji, format_order_info, format_container_info
+        
+        # Порядок статусов на доске — порядок прохождения заказа
+        ORDER_STATUSES = [status.value for status in OrderStatus]
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка при загрузке модулей базы данных: {e}")
+        logger.info("Используется временная база данных для тестирования...")
+        
+        DatabaseManager = None
+        ORDER_STATUSES = []
+        
+        # Заглушки для утилит
+        def format_date(date):
+            return date.strftime('%d.%m.%Y') if date else "-"
+        
+        def get_status_emoji(status):
+            return "📋"
+        
+        def format_order_info(order):
+            return f"Заказ: {order.order_number}"
+        
+        def format_container_info(container):
+            return f"Контейнер: {container.container_number}"
+        
+        def get_pool_status():
+            return "пул не создан"
+        
+        statement_registry = None
+        stale_results = None
+
+_db = None
+_notification_service = None
+
+# Типы областей подписки (с русскими синонимами)
+SCOPE_ALIASES = {
+    'order': 'order', 'заказ': 'order',
+    'client': 'client', 'клиент': 'client',
+    'route': 'route', 'маршрут': 'route',
+}
+
+
+def get_notification_service():
+    """Сервис уведомлений (создается при первом обращении, нужна база)"""
+    global _notification_service
+    if _notification_service is None and DatabaseManager is not None and os.getenv('DATABASE_URL'):
+        from notification_service import NotificationService
+        _notification_service = NotificationService()
+    return _notification_service
+
+
+def stale_note(reads) -> str:
+    """Пометка для ответа из сохраненных данных (база недоступна)"""
+    if not reads.stale:
+        return ""
+    return f"\n\n⚠️ _База недоступна, данные на {reads.fetched_at.strftime('%H:%M')}_"
+
+# Ответ, когда база недоступна, а сохраненных данных нет
+DB_UNAVAILABLE_TEXT = "⚠️ База данных временно недоступна. Попробуйте через минуту."
+
+def get_db():
+    """Получить менеджер базы данных (создается при первом обращении)"""
+    global _db
+    if _db is None:
+        if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+            _db = MockDatabaseManager()
+        else:
+            try:
+                _db = DatabaseManager()
+                logger.info("✅ Менеджер базы данных инициализирован")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при подключении к базе данных: {e}")
+                _db = MockDatabaseManager()
+    return _db
 
 # Команда /start
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -131,7 +296,8 @@ async def dbstatus_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Проверить статус подключения к базе данных"""
     try:
         # Проверяем подключение
-        orders_count = len(db.get_all_orders())
+        db = get_db()
+        orders_count = len(await asyncio.to_thread(db.get_all_orders))
         
         # Получаем информацию о переменных окружения (без паролей)
         db_url = os.getenv('DATABASE_URL', 'Не установлена')
@@ -144,6 +310,7 @@ async def dbstatus_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ✅ Telegram токен: {'Установлен' if bot_token_exists else 'Отсутствует'}
 ✅ База данных: {'Подключена' if not isinstance(db, MockDatabaseManager) else 'Временная'}
 📦 Заказов в базе: {orders_count}
+🔌 Пул соединений: {get_pool_status()}
 
 *Переменные окружения:*
 • DATABASE_URL: {'Установлена' if os.getenv('DATABASE_URL') else 'Отсутствует'}
@@ -155,13 +322,13 @@ async def dbstatus_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 3. Добавьте переменные в Railway
 """
         
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             status_text,
             parse_mode=ParseMode.MARKDOWN
         )
         
     except Exception as e:
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             f"❌ Ошибка проверки статуса: {str(e)[:100]}",
             parse_mode=ParseMode.MARKDOWN
         )
@@ -178,6 +345,22 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 /today - События сегодня
 /search [текст] - Поиск заказов
 /status [статус] - Заказы по статусу
+/container <номер> - Контейнер: хронология и водитель
+/truck <номер> - Контейнеры, перевезенные грузовиком
+/tasks - Открытые задачи по сроку
+/tasks mine - Мои задачи
+/tasks iam <имя> - Получать напоминания по задачам исполнителя
+/report [7|30|90] - Сводный PDF отчет за период
+
+*Уведомления:*
+/subscribe - Подписаться на все уведомления
+/subscribe order|client|route <значение> - Только по заказу, клиенту или маршруту
+/unsubscribe - Отписаться
+/subscriptions - Мои подписки
+
+*Быстрый поиск:*
+Наберите в любом чате `@имя_бота ORD-00` или имя клиента —
+подсказки появятся по мере ввода.
 
 *Информация:*
 /contacts - Контакты компании
@@ -195,7 +378,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 Для помощи по настройке обратитесь к разработчику.
 """
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         help_text,
         parse_mode=ParseMode.MARKDOWN
     )
@@ -204,10 +387,14 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def active_orders_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать активные заказы"""
     try:
-        orders = db.get_active_orders()
+        with track_stale() as reads:
+            orders = await asyncio.to_thread(get_db().get_active_orders)
         
+        if not orders and reads.unavailable:
+            await update.effective_message.reply_text(DB_UNAVAILABLE_TEXT)
+            return
         if not orders:
-            await update.message.reply_text(
+            await update.effective_message.reply_text(
                 "📭 Нет активных заказов.\n\n"
                 "Возможно:\n"
                 "1. База данных пуста\n"
@@ -226,14 +413,15 @@ async def active_orders_command(update: Update, context: ContextTypes.DEFAULT_TY
             text += f"   📦 Контейнеров: {order.container_count}\n"
             text += f"   📍 {order.route}\n"
             text += f"   📝 {order.status}\n\n"
+        text += stale_note(reads)
         
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             text,
             parse_mode=ParseMode.MARKDOWN
         )
         
     except Exception as e:
-        await update.message.reply_text(
+        await update.effective_message.reply_text(
             f"❌ Ошибка при получении заказов: {str(e)[:100]}",
             reply_markup=InlineKeyboardMarkup([[
                 InlineKeyboardButton("🔧 Проверить настройки", callback_data="dbstatus")
@@ -254,8 +442,12 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     search_text = ' '.join(context.args)
     try:
-        orders = db.search_orders(search_text)
+        with track_stale() as reads:
+            orders = await asyncio.to_thread(get_db().search_orders, search_text)
         
+        if not orders and reads.unavailable:
+            await update.message.reply_text(DB_UNAVAILABLE_TEXT)
+            return
         if not orders:
             await update.message.reply_text(
                 f"🔍 По запросу '{search_text}' ничего не найдено.\n\n"
@@ -272,6 +464,7 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             text += f"   📦 {order.container_count} контейнеров\n"
             text += f"   📍 {order.route}\n"
             text += f"   📝 {order.status}\n\n"
+        text += stale_note(reads)
         
         await update.message.reply_text(
             text,
@@ -287,7 +480,7 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def summary_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Сводная статистика"""
     try:
-        stats = db.get_statistics(30)
+        stats = await asyncio.to_thread(get_db().get_statistics, 30)
         
         text = f"""
 📊 *Сводная статистика за 30 дней:*
@@ -319,6 +512,361 @@ async def summary_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"❌ Ошибка при получении статистики: {str(e)[:100]}"
         )
 
+# Команда /report
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Сводный PDF отчет за 7, 30 или 90 дней (готовый, строится ночью)"""
+    days = 30
+    if context.args:
+        try:
+            days = int(context.args[0].lower().rstrip('dд'))
+        except ValueError:
+            days = 0
+    if days not in SUMMARY_PERIODS:
+        await update.message.reply_text(
+            f"📊 Использование: `/report [{'|'.join(map(str, SUMMARY_PERIODS))}]`\n\n"
+            "Пример: `/report 7` - отчет за неделю",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        await update.message.reply_text("❌ База данных не подключена")
+        return
+    
+    try:
+        report = await asyncio.to_thread(summary_reports.get, get_db(), days)
+        await update.message.reply_document(
+            document=report.pdf,
+            filename=f"summary_{days}d_{report.day.strftime('%Y%m%d')}.pdf",
+            caption=f"📊 Сводный отчет за {days} дней (данные на {report.built_at.strftime('%d.%m.%Y %H:%M')})"
+        )
+    except Exception as e:
+        await update.message.reply_text(
+            f"❌ Ошибка формирования отчета: {str(e)[:100]}"
+        )
+
+# Команда /today
+async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """События сегодня из заранее построенной повестки"""
+    try:
+        # Обычно повестка уже построена в полночь; иначе строим один раз за день
+        if not daily_agenda.is_current():
+            await asyncio.to_thread(daily_agenda.build, get_db())
+        
+        await update.effective_message.reply_text(
+            daily_agenda.render(),
+            parse_mode=ParseMode.MARKDOWN
+        )
+        
+    except Exception as e:
+        await update.effective_message.reply_text(
+            f"❌ Ошибка при получении событий: {str(e)[:100]}"
+        )
+
+# Команда /container
+async def container_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Найти контейнер по номеру (полностью или по началу)"""
+    if not context.args:
+        await update.message.reply_text(
+            "📦 Использование: `/container <номер>`\n\n"
+            "Пример: `/container MSKU1234567`\n"
+            "Можно указать начало номера, регистр и дефисы не важны",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+    
+    number = ' '.join(context.args)
+    try:
+        with track_stale() as reads:
+            containers = await asyncio.to_thread(get_db().find_containers, number)
+        
+        if not containers and reads.unavailable:
+            await update.message.reply_text(DB_UNAVAILABLE_TEXT)
+            return
+        if not containers:
+            await update.message.reply_text(f"📦 Контейнер '{number}' не найден.")
+            return
+        
+        text = format_container_info(containers[0])
+        if len(containers) > 1:
+            text += f"\n*Другие совпадения* ({len(containers) - 1}):\n"
+            for container in containers[1:]:
+                text += f"• `{container.container_number}` - {container.order_number}, {container.status}\n"
+        text += stale_note(reads)
+        
+        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
+        
+    except Exception as e:
+        await update.message.reply_text(
+            f"❌ Ошибка поиска контейнера: {str(e)[:100]}"
+        )
+
+# Команда /truck
+async def truck_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """История перевозок грузовика по номеру"""
+    if not context.args:
+        await update.message.reply_text(
+            "🚛 Использование: `/truck <номер грузовика>`\n\n"
+            "Пример: `/truck 12AB345`",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+    
+    plate = ' '.join(context.args)
+    try:
+        with track_stale() as reads:
+            containers = await asyncio.to_thread(get_db().find_containers_by_truck, plate)
+        
+        if not containers and reads.unavailable:
+            await update.message.reply_text(DB_UNAVAILABLE_TEXT)
+            return
+        if not containers:
+            await update.message.reply_text(f"🚛 Грузовик '{plate}' не найден.")
+            return
+        
+        latest = containers[0]
+        driver = ' '.join(part for part in (latest.driver_first_name, latest.driver_last_name) if part)
+        text = f"🚛 *Грузовик {latest.truck_number}*\n"
+        text += f"👤 {driver or '-'} · 🏢 {latest.driver_company or '-'}\n"
+        text += f"📞 Иран: {latest.driver_iran_phone or '-'} · Туркменистан: {latest.driver_turkmenistan_phone or '-'}\n\n"
+        text += f"*Перевозки* ({len(containers)}):\n"
+        for container in containers:
+            text += (
+                f"• `{container.container_number or '-'}` - *{container.order_number}*, {container.client_name}\n"
+                f"   🚛 {format_date(container.truck_loading_date)} → "
+                f"🏁 {format_date(container.arrival_turkmenistan_date)} · 📝 {container.status}\n"
+            )
+        
+        await update.message.reply_text(text[:4000] + stale_note(reads), parse_mode=ParseMode.MARKDOWN)
+        
+    except Exception as e:
+        await update.message.reply_text(
+            f"❌ Ошибка поиска грузовика: {str(e)[:100]}"
+        )
+
+# Доска статусов /status
+def find_status(text: str) -> Optional[str]:
+    """Статус по тексту: точное совпадение или единственное вхождение (без учета регистра)"""
+    key = text.strip().casefold()
+    for status in ORDER_STATUSES:
+        if status.casefold() == key:
+            return status
+    matches = [status for status in ORDER_STATUSES if key in status.casefold()]
+    return matches[0] if len(matches) == 1 else None
+
+def render_status_board() -> Tuple[str, InlineKeyboardMarkup]:
+    """Сводка по всем статусам: один GROUP BY запрос (или кэш)"""
+    with track_stale() as reads:
+        counts = status_counts.get(get_db())
+    
+    text = "📊 *Заказы по статусам:*\n\n"
+    if not counts and reads.unavailable:
+        text = DB_UNAVAILABLE_TEXT + "\n\n" + text
+    keyboard = []
+    for i, status in enumerate(ORDER_STATUSES):
+        count = counts.get(status)
+        orders = count.orders if count else 0
+        containers = count.containers if count else 0
+        text += f"{get_status_emoji(status)} {status}: *{orders}* (контейнеров: {containers})\n"
+        if orders:
+            keyboard.append([InlineKeyboardButton(
+                f"{get_status_emoji(status)} {status} ({orders})", callback_data=f"st:{i}"
+            )])
+    
+    other = sum(count.orders for status, count in counts.items() if status not in ORDER_STATUSES)
+    if other:
+        text += f"📋 Прочие статусы: *{other}*\n"
+    text += f"\n📦 Всего заказов: *{sum(count.orders for count in counts.values())}*"
+    text += stale_note(reads)
+    
+    keyboard.append([InlineKeyboardButton("🔄 Обновить", callback_data="st")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+def render_status_page(index: int, before_id: Optional[int] = None) -> Tuple[str, InlineKeyboardMarkup]:
+    """Страница заказов одного статуса (keyset пагинация по id)"""
+    status = ORDER_STATUSES[index]
+    db = get_db()
+    
+    with track_stale() as reads:
+        # Лишняя строка показывает, есть ли следующая страница
+        orders = db.get_orders_page_by_status(status, before_id, STATUS_PAGE_SIZE + 1)
+        count = status_counts.get(db).get(status)
+    has_more = len(orders) > STATUS_PAGE_SIZE
+    orders = orders[:STATUS_PAGE_SIZE]
+    
+    text = f"{get_status_emoji(status)} *{status}*"
+    if count:
+        text += f" ({count.orders})"
+    text += "\n\n"
+    
+    if not orders:
+        text += DB_UNAVAILABLE_TEXT if reads.unavailable else "📭 Нет заказов с этим статусом"
+    for order in orders:
+        text += f"• *{order.order_number}* - {order.client_name}\n"
+        text += f"   📦 {order.container_count} · 📍 {order.route or '-'} · ⏳ {format_date(order.eta_date)}\n"
+    text += stale_note(reads)
+    
+    navigation = []
+    if before_id is not None:
+        navigation.append(InlineKeyboardButton("⏮ В начало", callback_data=f"st:{index}"))
+    if has_more:
+        navigation.append(InlineKeyboardButton("➡️ Далее", callback_data=f"st:{index}:{orders[-1].id}"))
+    
+    keyboard = [navigation] if navigation else []
+    keyboard.append([InlineKeyboardButton("⬅️ Все статусы", callback_data="st")])
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Доска статусов или список заказов указанного статуса"""
+    try:
+        if context.args:
+            status = find_status(' '.join(context.args))
+            if status:
+                text, markup = await asyncio.to_thread(render_status_page, ORDER_STATUSES.index(status))
+                await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+                return
+        
+        text, markup = await asyncio.to_thread(render_status_board)
+        if context.args:
+            text = f"⚠️ Статус '{' '.join(context.args)}' не найден или неоднозначен.\n\n" + text
+        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+        
+    except Exception as e:
+        await update.message.reply_text(
+            f"❌ Ошибка при получении статусов: {str(e)[:100]}"
+        )
+
+async def status_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки доски статусов: st — доска, st:<статус>[:<id>] — страница статуса"""
+    query = update.callback_query
+    parts = query.data.split(':')
+    
+    try:
+        if len(parts) == 1:
+            text, markup = await asyncio.to_thread(render_status_board)
+        else:
+            index = int(parts[1])
+            if not 0 <= index < len(ORDER_STATUSES):
+                return
+            before_id = int(parts[2]) if len(parts) > 2 else None
+            text, markup = await asyncio.to_thread(render_status_page, index, before_id)
+        
+        await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+    except BadRequest as e:
+        # Повторное нажатие без изменений — не ошибка
+        if 'not modified' not in str(e).lower():
+            logger.error(f"Ошибка обновления доски статусов: {e}")
+    except Exception as e:
+        logger.error(f"Ошибка доски статусов: {e}")
+
+# Задачи /tasks
+def render_tasks_page(chat_id, mine: bool, after: Optional[tuple] = None) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+    """Страница открытых задач по сроку (keyset пагинация по (due_date, id))"""
+    db = get_db()
+    with track_stale() as reads:
+        assignees = None
+        if mine:
+            assignees = db.get_task_assignees(chat_id)
+            if not assignees:
+                if reads.unavailable:
+                    return DB_UNAVAILABLE_TEXT, None
+                return ("👤 К этому чату не привязан исполнитель.\n"
+                        "Привяжите имя из поля «Исполнитель»: `/tasks iam <имя>`"), None
+        
+        # Лишняя строка показывает, есть ли следующая страница
+        tasks = db.get_open_tasks_page(after, TASK_PAGE_SIZE + 1, assignees)
+        counts = db.get_task_counts(assignees)
+    has_more = len(tasks) > TASK_PAGE_SIZE
+    tasks = tasks[:TASK_PAGE_SIZE]
+    
+    text = "📋 *Мои задачи*" if mine else "📋 *Открытые задачи*"
+    if counts:
+        text += f" ({counts.total}, просрочено: {counts.overdue}, без срока: {counts.undated})"
+    text += "\n\n"
+    
+    if not tasks:
+        text += DB_UNAVAILABLE_TEXT if reads.unavailable else "📭 Нет открытых задач со сроком"
+    now = datetime.now()
+    for task in tasks:
+        if task.due_date < now:
+            mark = "🔴"
+        elif task.due_date < now + timedelta(days=1):
+            mark = "🟡"
+        else:
+            mark = "🟢"
+        text += f"{mark} {task.due_date.strftime('%d.%m.%Y %H:%M')} · *{task.order_number}*\n"
+        text += f"   {task.description}\n"
+        text += f"   👤 {task.assigned_to or '-'} · ⚡ {task.priority or '-'} · 📝 {task.status}\n"
+    text += stale_note(reads)
+    
+    scope = 'm' if mine else 'a'
+    navigation = []
+    if after is not None:
+        navigation.append(InlineKeyboardButton("⏮ В начало", callback_data=f"tk:{scope}"))
+    if has_more:
+        last = tasks[-1]
+        navigation.append(InlineKeyboardButton(
+            "➡️ Далее", callback_data=f"tk:{scope}:{last.due_date.strftime(TASK_CURSOR_FORMAT)}:{last.id}"
+        ))
+    return text, InlineKeyboardMarkup([navigation]) if navigation else None
+
+async def tasks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Открытые задачи; /tasks mine — свои, /tasks iam <имя> — привязка исполнителя"""
+    args = context.args or []
+    chat_id = update.effective_chat.id
+    action = args[0].lower() if args else ''
+    
+    try:
+        if action in ('iam', 'я', 'forget', 'забыть'):
+            if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+                await update.message.reply_text("❌ База данных не подключена")
+                return
+            from task_tracker import link_assignee, unlink_assignees
+            
+            if action in ('forget', 'забыть'):
+                removed = await asyncio.to_thread(unlink_assignees, chat_id)
+                await update.message.reply_text(f"✅ Исполнители отвязаны от чата ({removed})")
+                return
+            
+            name = ' '.join(args[1:])
+            if not name.strip():
+                await update.message.reply_text(
+                    "👤 Использование: `/tasks iam <имя исполнителя>`\n\n"
+                    "Имя — как в поле «Исполнитель» задачи (регистр не важен)",
+                    parse_mode=ParseMode.MARKDOWN
+                )
+                return
+            assignee = await asyncio.to_thread(link_assignee, name, chat_id)
+            await update.message.reply_text(
+                f"✅ Напоминания по задачам исполнителя «{assignee}» будут приходить в этот чат.\n"
+                "Свои задачи: /tasks mine"
+            )
+            return
+        
+        text, markup = await asyncio.to_thread(render_tasks_page, chat_id, action in ('mine', 'мои'))
+        await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+        
+    except Exception as e:
+        await update.message.reply_text(
+            f"❌ Ошибка при получении задач: {str(e)[:100]}"
+        )
+
+async def tasks_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки /tasks: tk:<a|m> — первая страница, tk:<a|m>:<срок>:<id> — следующая"""
+    query = update.callback_query
+    parts = query.data.split(':')
+    
+    try:
+        after = None
+        if len(parts) == 4:
+            after = (datetime.strptime(parts[2], TASK_CURSOR_FORMAT), int(parts[3]))
+        text, markup = await asyncio.to_thread(render_tasks_page, update.effective_chat.id, parts[1] == 'm', after)
+        await query.edit_message_text(text, parse_mode=ParseMode.MARKDOWN, reply_markup=markup)
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            logger.error(f"Ошибка обновления списка задач: {e}")
+    except Exception as e:
+        logger.error(f"Ошибка списка задач: {e}")
+
 # Команда /contacts
 async def contacts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Контакты компании"""
@@ -340,7 +888,7 @@ async def contacts_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 обратитесь к разработчику.
 """
     
-    await update.message.reply_text(
+    await update.effective_message.reply_text(
         contacts_text,
         parse_mode=ParseMode.MARKDOWN
     )
@@ -356,13 +904,127 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == "active":
         await active_orders_command(update, context)
     elif data == "today":
-        await update.message.reply_text("Функция 'События сегодня' скоро будет доступна!")
+        await today_command(update, context)
     elif data == "contacts":
         await contacts_command(update, context)
     elif data == "help":
         await help_command(update, context)
     elif data == "dbstatus":
         await dbstatus_command(update, context)
+    elif data == "st" or data.startswith("st:"):
+        await status_callback(update, context)
+    elif data.startswith("tk:"):
+        await tasks_callback(update, context)
+
+def parse_scope_args(args: List[str]):
+    """'/subscribe client Altyn Asyr' -> ('client', 'Altyn Asyr'); без типа — номер заказа"""
+    if not args:
+        return None, None
+    scope_type = SCOPE_ALIASES.get(args[0].lower())
+    if scope_type:
+        return scope_type, ' '.join(args[1:])
+    return 'order', ' '.join(args)
+
+# Команда /subscribe
+async def subscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Подписаться на все уведомления или на заказ/клиента/маршрут"""
+    service = get_notification_service()
+    if not service:
+        await update.message.reply_text("⚠️ Уведомления недоступны: база данных не настроена.")
+        return
+    
+    chat_id = str(update.effective_chat.id)
+    scope_type, value = parse_scope_args(context.args)
+    
+    if scope_type is None:
+        ok = await asyncio.to_thread(service.subscribe_user, chat_id)
+        text = "🔔 Вы подписаны на уведомления." if ok else "❌ Не удалось оформить подписку."
+    elif not value:
+        text = "Использование: /subscribe order|client|route <значение>"
+    else:
+        ok = await asyncio.to_thread(service.add_subscription_scope, chat_id, scope_type, value)
+        text = (f"🔔 Подписка добавлена: {scope_type} «{value}».\n"
+                "Теперь вы получаете уведомления только по своим подпискам." if ok
+                else "❌ Не удалось добавить подписку.")
+    
+    await update.message.reply_text(text)
+
+# Команда /unsubscribe
+async def unsubscribe_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отписаться от всего или от конкретного заказа/клиента/маршрута"""
+    service = get_notification_service()
+    if not service:
+        await update.message.reply_text("⚠️ Уведомления недоступны: база данных не настроена.")
+        return
+    
+    chat_id = str(update.effective_chat.id)
+    scope_type, value = parse_scope_args(context.args)
+    
+    if scope_type is None:
+        ok = await asyncio.to_thread(service.unsubscribe_user, chat_id)
+        text = "🔕 Вы отписаны от уведомлений." if ok else "ℹ️ Подписка не найдена."
+    elif not value:
+        text = "Использование: /unsubscribe [order|client|route <значение>]"
+    else:
+        ok = await asyncio.to_thread(service.remove_subscription_scope, chat_id, scope_type, value)
+        text = f"🔕 Подписка удалена: {scope_type} «{value}»." if ok else "ℹ️ Такой подписки нет."
+        if ok and not await asyncio.to_thread(service.get_subscription_scopes, chat_id):
+            text += ("\n\nДругих подписок не осталось: уведомления приходить не будут.\n"
+                     "Чтобы получать уведомления по всем заказам, отправьте /subscribe")
+    
+    await update.message.reply_text(text)
+
+# Команда /subscriptions
+async def subscriptions_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показать настройки и области подписки"""
+    service = get_notification_service()
+    if not service:
+        await update.message.reply_text("⚠️ Уведомления недоступны: база данных не настроена.")
+        return
+    
+    chat_id = str(update.effective_chat.id)
+    settings = await asyncio.to_thread(service.get_user_settings, chat_id)
+    if not settings or not settings['is_active']:
+        await update.message.reply_text("🔕 Подписки нет. Используйте /subscribe")
+        return
+    
+    scopes = await asyncio.to_thread(service.get_subscription_scopes, chat_id)
+    text = "🔔 Подписка активна\n\n"
+    text += f"События: {'✅' if settings['notify_events'] else '❌'}\n"
+    text += f"Напоминания: {'✅' if settings['notify_reminders'] else '❌'} (за {settings['hours_before']} ч)\n"
+    text += f"Оповещения: {'✅' if settings['notify_alerts'] else '❌'}\n\n"
+    if scopes:
+        text += "Только по подпискам:\n" + "\n".join(f"• {t}: {v}" for t, v in scopes)
+    elif settings.get('scoped'):
+        text += "Подписок на заказы, клиентов и маршруты нет: уведомления не приходят.\n/subscribe — по всем заказам."
+    else:
+        text += "Уведомления по всем заказам."
+    
+    await update.message.reply_text(text)
+
+# Inline-поиск заказов (@бот ORD-00)
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Подсказки по номеру заказа и клиенту из индекса в памяти"""
+    query = update.inline_query
+    orders = order_search_index.search(query.query, INLINE_RESULTS_LIMIT)
+    
+    results = []
+    for order in orders:
+        card = (
+            f"{get_status_emoji(order.status)} *{order.order_number}*\n"
+            f"👤 {order.client_name}\n"
+            f"📦 Контейнеров: {order.container_count or 0}\n"
+            f"📍 {order.route or '-'}\n"
+            f"📝 {order.status}"
+        )
+        results.append(InlineQueryResultArticle(
+            id=order.order_number[:64],
+            title=f"{order.order_number} — {order.client_name}",
+            description=f"{order.status} · {order.route or '-'}",
+            input_message_content=InputTextMessageContent(card, parse_mode=ParseMode.MARKDOWN)
+        ))
+    
+    await query.answer(results, cache_time=5)
 
 # Обработчик ошибок
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -374,24 +1036,554 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "❌ Произошла ошибка. Используйте /dbstatus для проверки настроек."
         )
 
-# Основная функция
-def main():
-    """Запуск бота"""
-    logger.info("=" * 50)
-    logger.info("🚀 Запуск Logistics Telegram Bot")
-    logger.info("=" * 50)
+# Транспорт Bot API с учетом времени вызовов Telegram
+class TimedRequest(BaseRequest):
+    """Обертка транспорта Bot API для замера времени вызовов Telegram"""
     
-    # Выводим информацию о настройках
-    logger.info(f"🤖 TELEGRAM_BOT_TOKEN: {'✅ Установлен' if TELEGRAM_BOT_TOKEN else '❌ Отсутствует'}")
-    logger.info(f"🗄️ DATABASE_URL: {'✅ Установлен' if os.getenv('DATABASE_URL') else '❌ Отсутствует'}")
-    logger.info(f"👑 ADMIN_CHAT_IDS: {os.getenv('ADMIN_CHAT_IDS', 'Не установлены')}")
+    def __init__(self, request: BaseRequest):
+        self._request = request
     
-    if not os.getenv('DATABASE_URL'):
-        logger.warning("⚠️  DATABASE_URL не установлен. Используется временная база данных.")
-        logger.info("Для работы с реальными данными создайте базу на supabase.com")
+    @property
+    def read_timeout(self):
+        return getattr(self._request, 'read_timeout', None)
     
-    # Создание приложения
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    async def initialize(self):
+        await self._request.initialize()
+    
+    async def shutdown(self):
+        await self._request.shutdown()
+    
+    async def do_request(self, *args, **kwargs):
+        with timed('api'):
+            return await self._request.do_request(*args, **kwargs)
+
+def describe_update(update: Update) -> str:
+    """Короткое имя обновления для логов: команда, callback или тип"""
+    if update.callback_query:
+        return f"callback:{update.callback_query.data}"
+    if update.inline_query:
+        return "inline"
+    message = update.effective_message
+    if message and message.text and message.text.startswith('/'):
+        return message.text.split()[0].split('@')[0]
+    if message:
+        return "message"
+    return "update"
+
+# Замер времени обработки обновления (первая и последняя группы обработчиков)
+async def timing_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начать замер обновления"""
+    start_update_timing(describe_update(update))
+
+async def timing_finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Завершить замер и залогировать медленное обновление"""
+    timing = finish_update_timing()
+    if timing and timing.total * 1000 >= SLOW_UPDATE_MS:
+        logger.warning(f"🐢 Медленное обновление {timing.describe()}")
+
+_profile_running = False
+
+# Команда /profile - профилирование (только для администраторов)
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Снять профиль процесса на N секунд: /profile [секунды] [cprofile|sample]"""
+    global _profile_running
+    
+    if not is_admin(update):
+        await update.message.reply_text("⛔ Команда доступна только администраторам.")
+        return
+    
+    if _profile_running:
+        await update.message.reply_text("⏳ Профилирование уже выполняется.")
+        return
+    
+    args = context.args or []
+    try:
+        seconds = min(max(int(args[0]), 1), 120) if args else 10
+    except ValueError:
+        seconds = 10
+    mode = 'sample' if len(args) > 1 and args[1].lower().startswith('sampl') else 'cprofile'
+    chat_id = update.effective_chat.id
+    
+    async def run_profile():
+        global _profile_running
+        try:
+            report = await capture_profile(seconds, mode)
+            await context.bot.send_document(
+                chat_id=chat_id,
+                document=report.encode('utf-8'),
+                filename=f"profile_{mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+                caption=f"📈 Профиль ({mode}) за {seconds} с"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка профилирования: {e}")
+        finally:
+            _profile_running = False
+    
+    # В фоне, чтобы профилировать обработку других обновлений, а не ожидание
+    _profile_running = True
+    context.application.create_task(run_profile())
+    await update.message.reply_text(f"📈 Профилирование ({mode}) запущено на {seconds} с. Отчет придет файлом.")
+
+# Команда /dbstats - статистика запросов (только для администраторов)
+async def dbstats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Счетчики и задержки запросов к базе по именам"""
+    if not is_admin(update):
+        await update.message.reply_text("⛔ Команда доступна только администраторам.")
+        return
+    
+    text = f"🗄️ Запросы к базе данных\n\n{query_metrics.report()}\n\n🔌 Пул: {get_pool_status()}"
+    processor = context.application.update_processor
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        text += f"\n\n🧵 {processor.report()}"
+    if statement_registry is not None:
+        text += f"\n\n📌 {statement_registry.report()}"
+    if context.args and context.args[0] == 'reset':
+        query_metrics.reset()
+        text += "\n\n♻️ Статистика сброшена"
+    await update.message.reply_text(text[:4000])
+
+# Команда /memory - память процесса (только для администраторов)
+async def memory_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """RSS во времени и размеры кэшей; /memory types | trace on|off | top"""
+    if not is_admin(update):
+        await update.message.reply_text("⛔ Команда доступна только администраторам.")
+        return
+    
+    args = [arg.lower() for arg in context.args or []]
+    action = args[0] if args else ''
+    
+    if action == 'types':
+        # gc.get_objects() обходит всю кучу: не в потоке event loop
+        report = await asyncio.to_thread(memory_monitor.top_types)
+        text = f"🧮 Объекты по типам\n\n{report}"
+    elif action == 'trace' and len(args) > 1 and args[1] in ('on', 'off'):
+        if args[1] == 'on':
+            await asyncio.to_thread(memory_monitor.start_trace)
+            text = "🔬 tracemalloc включен. /memory top покажет прирост с этого момента."
+        else:
+            memory_monitor.stop_trace()
+            text = "🔬 tracemalloc выключен."
+    elif action == 'top':
+        report = await asyncio.to_thread(memory_monitor.trace_report)
+        await update.message.reply_document(
+            document=report.encode('utf-8'),
+            filename=f"memory_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            caption="🔬 Выделения памяти по строкам кода"
+        )
+        return
+    else:
+        await asyncio.to_thread(memory_monitor.sample)
+        text = (f"🧠 Память процесса\n\n{memory_monitor.trend()}\n\n"
+                f"Индекс поиска: {len(order_search_index)} заказов\n"
+                f"Сохраненные ответы базы: {len(stale_results) if stale_results is not None else 0}\n"
+                f"tracemalloc: {'включен' if memory_monitor.tracing else 'выключен'}\n\n"
+                "/memory types — объекты по типам\n"
+                "/memory trace on|off — трассировка выделений\n"
+                "/memory top — прирост с прошлого снимка")
+    
+    await update.message.reply_text(text[:4000])
+
+# Команда /slowqueries - журнал медленных запросов с планами
+async def slowqueries_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показать последние медленные запросы с EXPLAIN (ANALYZE, BUFFERS)"""
+    if not is_admin(update):
+        await update.message.reply_text("⛔ Команда доступна только администраторам.")
+        return
+    
+    entries = list(query_metrics.slow_queries)
+    if not entries:
+        await update.message.reply_text("✅ Медленных запросов не зафиксировано.")
+        return
+    
+    try:
+        limit = int(context.args[0]) if context.args else 5
+    except ValueError:
+        limit = 5
+    
+    parts = []
+    for entry in reversed(entries[-limit:]):
+        parts.append(
+            f"=== {entry['name']} — {entry['duration_ms']} мс, "
+            f"{entry['captured_at'].strftime('%d.%m.%Y %H:%M:%S')}\n"
+            f"Параметры: {entry['params']}\n\n{entry['plan']}\n"
+        )
+    report = "\n".join(parts)
+    
+    if len(report) <= 4000:
+        await update.message.reply_text(report)
+    else:
+        await update.message.reply_document(
+            document=report.encode('utf-8'),
+            filename=f"slow_queries_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
+            caption=f"🐢 Медленные запросы: {len(parts)}"
+        )
+
+# Фоновая проверка схемы базы данных
+def run_startup_migrations():
+    """Проверить версию схемы и применить миграции"""
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        return
+    
+    try:
+        from migrations import run_migrations
+        
+        with startup_timer.phase("миграции (фон)"):
+            version = run_migrations()
+        _, seconds = startup_timer.phases[-1]
+        logger.info(f"✅ Версия схемы базы данных: {version} ({seconds * 1000:.0f} мс)")
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка миграций базы данных: {e}")
+
+# Прогрев кэшей в памяти
+def warm_caches():
+    """Загрузить индексы и кэши, которые обслуживают запросы без базы"""
+    try:
+        with startup_timer.phase("индекс inline-поиска (фон)"):
+            count = order_search_index.load(get_db())
+        _, seconds = startup_timer.phases[-1]
+        logger.info(f"✅ Индекс inline-поиска: {count} заказов ({seconds * 1000:.0f} мс)")
+    except Exception as e:
+        logger.error(f"❌ Ошибка загрузки индекса поиска: {e}")
+    
+    try:
+        with startup_timer.phase("повестка дня (фон)"):
+            count = daily_agenda.build(get_db())
+        _, seconds = startup_timer.phases[-1]
+        logger.info(f"✅ Повестка дня: {count} событий ({seconds * 1000:.0f} мс)")
+    except Exception as e:
+        logger.error(f"❌ Ошибка построения повестки дня: {e}")
+
+def run_startup_tasks():
+    """Фоновые задачи запуска: миграции, затем прогрев кэшей"""
+    run_startup_migrations()
+    warm_caches()
+
+# Периодическое обновление индекса inline-поиска
+async def refresh_search_index_job(context: ContextTypes.DEFAULT_TYPE):
+    """Инкрементальное обновление индекса по orders.updated_at"""
+    try:
+        changed = await asyncio.to_thread(order_search_index.refresh, get_db())
+        if changed > 0:
+            # Заказы менялись: доска статусов пересчитается при следующем запросе
+            status_counts.invalidate()
+            summary_reports.mark_dirty()
+    except Exception as e:
+        logger.error(f"Ошибка обновления индекса поиска: {e}")
+
+async def reload_search_index_job(context: ContextTypes.DEFAULT_TYPE):
+    """Полная перезагрузка индекса (убирает удаленные заказы)"""
+    try:
+        await asyncio.to_thread(order_search_index.load, get_db())
+    except Exception as e:
+        logger.error(f"Ошибка перезагрузки индекса поиска: {e}")
+
+# Повестка дня: построение в полночь и исправления по изменениям заказов
+async def build_daily_agenda_job(context: ContextTypes.DEFAULT_TYPE):
+    """Построить повестку на наступивший день"""
+    try:
+        count = await asyncio.to_thread(daily_agenda.build, get_db())
+        logger.info(f"📅 Повестка дня построена: {count} событий")
+    except Exception as e:
+        logger.error(f"Ошибка построения повестки дня: {e}")
+
+async def refresh_daily_agenda_job(context: ContextTypes.DEFAULT_TYPE):
+    """Исправить повестку по заказам, измененным с прошлой проверки"""
+    try:
+        await asyncio.to_thread(daily_agenda.refresh, get_db())
+    except Exception as e:
+        logger.error(f"Ошибка обновления повестки дня: {e}")
+
+# Сводные отчеты: ночное построение и перестроение при изменении данных
+async def build_summary_reports_job(context: ContextTypes.DEFAULT_TYPE):
+    """Построить все сводные отчеты заново (окна периодов сдвинулись на день)"""
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        return
+    
+    try:
+        rebuilt = await asyncio.to_thread(summary_reports.refresh, get_db(), True)
+        logger.info(f"📊 Сводные отчеты построены: {', '.join(f'{days} дн.' for days in rebuilt)}")
+    except Exception as e:
+        logger.error(f"Ошибка построения сводных отчетов: {e}")
+
+async def refresh_summary_reports_job(context: ContextTypes.DEFAULT_TYPE):
+    """Перестроить отчеты, если данные изменились (и построить недостающие)"""
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        return
+    
+    try:
+        rebuilt = await asyncio.to_thread(summary_reports.refresh, get_db())
+        if rebuilt:
+            logger.info(f"📊 Сводные отчеты перестроены: {', '.join(f'{days} дн.' for days in rebuilt)}")
+    except Exception as e:
+        logger.error(f"Ошибка обновления сводных отчетов: {e}")
+
+# Изменения заказов, присланные WPF программой через webhook
+def apply_wpf_changes(records: List, deleted: List[str]):
+    """Обновить кэши сразу после применения пакета (выполняется в потоке webhook)"""
+    for record in records:
+        order_search_index.upsert(make_row(
+            SUMMARY_COLUMNS, [getattr(record, name, None) for name in SUMMARY_COLUMNS], OrderView
+        ))
+    for order_number in deleted:
+        order_search_index.remove(order_number)
+    
+    status_counts.invalidate()
+    summary_reports.mark_dirty()
+    if daily_agenda.is_current():
+        from database import use_primary
+        daily_agenda.remove(deleted)
+        # Только что записанные изменения могут еще не дойти до реплики
+        with use_primary():
+            daily_agenda.refresh(get_db())
+
+def start_wpf_webhook():
+    """Запустить входящий webhook WPF, если задан WPF_WEBHOOK_PORT"""
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        return None
+    
+    try:
+        from wpf_webhook import start_webhook_server
+        return start_webhook_server(on_change=apply_wpf_changes)
+    except Exception as e:
+        logger.error(f"❌ Ошибка запуска webhook WPF: {e}")
+        return None
+
+async def webhook_maintenance_job(context: ContextTypes.DEFAULT_TYPE):
+    """Удалить старые ключи идемпотентности webhook"""
+    try:
+        from wpf_webhook import prune_deliveries
+        await asyncio.to_thread(prune_deliveries)
+    except Exception as e:
+        logger.error(f"Ошибка очистки журнала webhook WPF: {e}")
+
+# Отправка очереди уведомлений для WPF программы
+def drain_wpf_outbox() -> int:
+    """Отправлять пакеты, пока очередь не опустеет или WPF не начнет отвечать ошибкой"""
+    from sync_service import SyncService, OUTBOX_BATCH_SIZE
+    service = SyncService()
+    total = 0
+    while True:
+        sent = service.flush_outbox()
+        total += sent
+        if sent < OUTBOX_BATCH_SIZE:
+            return total
+
+async def flush_wpf_outbox_job(context: ContextTypes.DEFAULT_TYPE):
+    """Отправить накопившиеся уведомления для WPF пакетами"""
+    try:
+        sent = await asyncio.to_thread(drain_wpf_outbox)
+        if sent:
+            logger.info(f"📤 Уведомления для WPF: отправлено {sent}")
+    except Exception as e:
+        logger.error(f"Ошибка отправки очереди уведомлений WPF: {e}")
+
+async def prune_wpf_outbox_job(context: ContextTypes.DEFAULT_TYPE):
+    """Удалить старые отправленные уведомления WPF"""
+    try:
+        from sync_service import SyncService
+        await asyncio.to_thread(SyncService().prune_outbox)
+    except Exception as e:
+        logger.error(f"Ошибка очистки очереди уведомлений WPF: {e}")
+
+# Доставка уведомлений дайджестами
+def collect_notification_digests() -> List[Dict]:
+    """Собрать готовые дайджесты (отдельная сессия, выполняется в потоке)"""
+    from notification_service import NotificationService
+    service = NotificationService()
+    try:
+        return service.get_pending_digests()
+    finally:
+        service.close()
+
+def mark_notifications_sent(notification_ids: List[int]):
+    """Отметить отправленные уведомления одной командой UPDATE"""
+    from notification_service import NotificationService
+    service = NotificationService()
+    try:
+        service.mark_notifications_sent(notification_ids)
+    finally:
+        service.close()
+
+async def deliver_notifications_job(context: ContextTypes.DEFAULT_TYPE):
+    """Отправить накопившиеся уведомления: одно сообщение на чат вместо одного на событие"""
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        return
+    
+    try:
+        digests = await asyncio.to_thread(collect_notification_digests)
+    except Exception as e:
+        logger.error(f"Ошибка получения уведомлений: {e}")
+        return
+    
+    sent_ids = []
+    messages_sent = 0
+    try:
+        for digest in digests:
+            if not digest['parts']:
+                # Только пустые сообщения: отправлять нечего
+                sent_ids.extend(digest['ids'])
+                continue
+            
+            delivered = set()
+            try:
+                for text, ids in digest['parts']:
+                    try:
+                        await context.bot.send_message(digest['chat_id'], text, parse_mode=ParseMode.MARKDOWN)
+                    except BadRequest:
+                        # Разметка сломалась (например, при разрезании) — отправляем как есть
+                        await context.bot.send_message(digest['chat_id'], text)
+                    messages_sent += 1
+                    # Отмечаем по частям: при сбое следующей части эта не повторится
+                    sent_ids.extend(ids)
+                    delivered.update(ids)
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован, чат не найден и т.п. (BadRequest и без разметки):
+                # повторять бессмысленно
+                logger.warning(f"Чат {digest['chat_id']} недоступен, уведомления пропущены: {e}")
+                sent_ids.extend(i for i in digest['ids'] if i not in delivered)
+            except Exception as e:
+                # Неотправленные части останутся в очереди до следующего запуска
+                logger.error(f"Ошибка отправки уведомлений в чат {digest['chat_id']}: {e}")
+    finally:
+        if sent_ids:
+            await asyncio.to_thread(mark_notifications_sent, sent_ids)
+            logger.info(f"📨 Уведомления: {len(sent_ids)} шт. отправлены {messages_sent} сообщениями в {len(digests)} чатов")
+
+# Напоминания о сроках задач
+async def task_reminders_job(context: ContextTypes.DEFAULT_TYPE):
+    """Поставить в очередь уведомлений напоминания о просроченных и скоро истекающих задачах"""
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        return
+    
+    try:
+        from task_tracker import queue_task_reminders
+        tasks, chats = await asyncio.to_thread(queue_task_reminders)
+        if tasks:
+            logger.info(f"📋 Напоминания о задачах: {tasks} задач для {chats} чатов")
+    except Exception as e:
+        logger.error(f"Ошибка проверки сроков задач: {e}")
+
+# Поиск задержек заказов
+async def delay_scan_job(context: ContextTypes.DEFAULT_TYPE):
+    """Найти опаздывающие активные заказы и оповестить о новых задержках"""
+    service = get_notification_service()
+    if service is None:
+        return
+    
+    try:
+        from delay_monitor import scan_delays
+        late, new = await asyncio.to_thread(scan_delays, service)
+        if new:
+            logger.info(f"⏳ Задержки заказов: опаздывают {late}, новых {new}")
+    except Exception as e:
+        logger.error(f"Ошибка поиска задержек заказов: {e}")
+
+# Обслуживание секций таблицы уведомлений
+async def notification_maintenance_job(context: ContextTypes.DEFAULT_TYPE):
+    """Создать секции вперед и заархивировать секции старше срока хранения"""
+    if DatabaseManager is None or not os.getenv('DATABASE_URL'):
+        return
+    
+    try:
+        from notification_partitions import run_maintenance
+        created, archived = await asyncio.to_thread(run_maintenance)
+        if created or archived:
+            logger.info(f"🗄️ Секции уведомлений: создано {len(created)}, заархивировано {len(archived)}")
+    except Exception as e:
+        logger.error(f"Ошибка обслуживания секций уведомлений: {e}")
+
+# Запись памяти процесса для /memory
+async def memory_sample_job(context: ContextTypes.DEFAULT_TYPE):
+    """Записать RSS и число объектов (история за неделю в памяти)"""
+    try:
+        await asyncio.to_thread(memory_monitor.sample)
+    except Exception as e:
+        logger.error(f"Ошибка записи памяти процесса: {e}")
+
+_first_update_seen = False
+
+# Замер времени до первого обновления
+async def first_update_probe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Залогировать время от старта процесса до первого обновления"""
+    global _first_update_seen
+    if not _first_update_seen:
+        _first_update_seen = True
+        logger.info(f"⏱️ Первое обновление через {startup_timer.since_start() * 1000:.0f} мс после старта процесса")
+
+async def post_init(application: Application):
+    """Действия после инициализации приложения"""
+    startup_timer.log(logger)
+    
+    # Миграции и прогрев кэшей не задерживают начало опроса Telegram
+    application.create_task(asyncio.to_thread(run_startup_tasks))
+    
+    # Прием изменений заказов от WPF программы (вместо опроса)
+    webhook_server = start_wpf_webhook()
+    
+    if application.job_queue:
+        application.job_queue.run_repeating(
+            refresh_search_index_job, interval=INDEX_REFRESH_SECONDS, first=INDEX_REFRESH_SECONDS
+        )
+        application.job_queue.run_repeating(reload_search_index_job, interval=3600, first=3600)
+        application.job_queue.run_daily(
+            build_daily_agenda_job, time=dtime(hour=0, minute=0, tzinfo=datetime.now().astimezone().tzinfo)
+        )
+        application.job_queue.run_repeating(
+            refresh_daily_agenda_job, interval=INDEX_REFRESH_SECONDS, first=INDEX_REFRESH_SECONDS
+        )
+        application.job_queue.run_repeating(
+            deliver_notifications_job, interval=NOTIFICATION_CHECK_SECONDS, first=NOTIFICATION_CHECK_SECONDS
+        )
+        application.job_queue.run_repeating(task_reminders_job, interval=TASK_REMINDER_SECONDS, first=60)
+        application.job_queue.run_repeating(delay_scan_job, interval=DELAY_SCAN_SECONDS, first=90)
+        application.job_queue.run_daily(
+            build_summary_reports_job, time=dtime(hour=2, minute=0, tzinfo=datetime.now().astimezone().tzinfo)
+        )
+        application.job_queue.run_repeating(refresh_summary_reports_job, interval=REPORT_CHECK_SECONDS, first=120)
+        application.job_queue.run_daily(
+            notification_maintenance_job, time=dtime(hour=3, minute=0, tzinfo=datetime.now().astimezone().tzinfo)
+        )
+        application.job_queue.run_repeating(memory_sample_job, interval=MEMORY_SAMPLE_SECONDS, first=0)
+        if os.getenv('SYNC_API_KEY') and os.getenv('SYNC_ENDPOINT') and os.getenv('DATABASE_URL'):
+            application.job_queue.run_repeating(
+                flush_wpf_outbox_job, interval=WPF_OUTBOX_FLUSH_SECONDS, first=WPF_OUTBOX_FLUSH_SECONDS
+            )
+            application.job_queue.run_daily(
+                prune_wpf_outbox_job, time=dtime(hour=3, minute=45, tzinfo=datetime.now().astimezone().tzinfo)
+            )
+        if webhook_server is not None:
+            application.job_queue.run_daily(
+                webhook_maintenance_job, time=dtime(hour=3, minute=30, tzinfo=datetime.now().astimezone().tzinfo)
+            )
+    else:
+        logger.warning("⚠️ JobQueue недоступна: установите python-telegram-bot[job-queue]")
+
+def build_application(token: str = TELEGRAM_BOT_TOKEN, request: BaseRequest = None) -> Application:
+    """Создать приложение и зарегистрировать обработчики
+
+    request позволяет подменить транспорт Bot API (нагрузочные тесты).
+    Обновления разных чатов обрабатываются параллельно, одного чата —
+    по порядку (см. ChatOrderedUpdateProcessor); работа с базой в
+    обработчиках вынесена в потоки, чтобы не останавливать цикл событий.
+    """
+    # Вызовы Bot API проходят через обертку с замером времени
+    request = TimedRequest(request or HTTPXRequest(connection_pool_size=256))
+    application = (
+        Application.builder()
+        .token(token)
+        .request(request)
+        .concurrent_updates(ChatOrderedUpdateProcessor())
+        .post_init(post_init)
+        .build()
+    )
+    
+    # Замер обработки каждого обновления: начало в первой группе, конец в последней
+    application.add_handler(TypeHandler(Update, timing_start), group=-2)
+    application.add_handler(TypeHandler(Update, timing_finish), group=100)
+    
+    # Замер времени до первого обновления
+    application.add_handler(TypeHandler(Update, first_update_probe), group=-1)
     
     # Регистрация обработчиков команд
     application.add_handler(CommandHandler("start", start_command))
@@ -399,15 +1591,53 @@ def main():
     application.add_handler(CommandHandler("dbstatus", dbstatus_command))
     application.add_handler(CommandHandler("active", active_orders_command))
     application.add_handler(CommandHandler("search", search_command))
+    application.add_handler(CommandHandler("status", status_command))
+    application.add_handler(CommandHandler("today", today_command))
+    application.add_handler(CommandHandler("container", container_command))
+    application.add_handler(CommandHandler("truck", truck_command))
+    application.add_handler(CommandHandler("tasks", tasks_command))
     application.add_handler(CommandHandler("summary", summary_command))
+    application.add_handler(CommandHandler("report", report_command))
     application.add_handler(CommandHandler("contacts", contacts_command))
+    application.add_handler(CommandHandler("subscribe", subscribe_command))
+    application.add_handler(CommandHandler("unsubscribe", unsubscribe_command))
+    application.add_handler(CommandHandler("subscriptions", subscriptions_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("dbstats", dbstats_command))
+    application.add_handler(CommandHandler("memory", memory_command))
+    application.add_handler(CommandHandler("slowqueries", slowqueries_command))
     
     # Регистрация обработчика callback-запросов
     application.add_handler(CallbackQueryHandler(button_callback))
     
+    # Inline-поиск заказов
+    application.add_handler(InlineQueryHandler(inline_query_handler))
+    
     # Регистрация обработчика ошибок
     application.add_error_handler(error_handler)
     
+    return application
+
+# Основная функция
+def main():
+    """Запуск бота"""
+    logger.info("=" * 50)
+    logger.info("🚀 Запуск Logistics Telegram Bot")
+    logger.info("=" * 50)
+    
+    # Выводим информацию о настройках
+    logger.info(f"🤖 TELEGRAM_BOT_TOKEN: {'✅ Установлен' if TELEGRAM_BOT_TOKEN else '❌ Отсутствует'}")
+    logger.info(f"🗄️ DATABASE_URL: {'✅ Установлен' if os.getenv('DATABASE_URL') else '❌ Отсутствует'}")
+    logger.info(f"👑 ADMIN_CHAT_IDS: {os.getenv('ADMIN_CHAT_IDS', 'Не установлены')}")
+    
+    if not os.getenv('DATABASE_URL'):
+        logger.warning("⚠️  DATABASE_URL не установлен. Используется временная база данных.")
+        logger.info("Для работы с реальными данными создайте базу на supabase.com")
+    
+    # Создание приложения
+    with startup_timer.phase("создание приложения"):
+        application = build_application()
+    
     # Запуск бота
     logger.info("✅ Бот запущен и готов к работе!")
     logger.info("ℹ️  Используйте /dbstatus для проверки настроек")
@@ -0,0 +1,157 @@
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Hashable, Optional, Tuple
+
+
+class DatabaseUnavailableError(Exception):
+    """База недоступна, а сохраненного результата для запроса нет"""
+
+
+class CircuitOpenError(DatabaseUnavailableError):
+    """Цепь разомкнута: запросы к базе временно не выполняются"""
+
+
+class DatabaseOverloadedError(DatabaseUnavailableError):
+    """Слишком много запросов к базе одновременно: лишний запрос сброшен"""
+
+
+class CircuitBreaker:
+    """Размыкатель цепи для базы
+
+    После failure_threshold ошибок подряд цепь размыкается: запросы не
+    ждут таймаутов, а сразу отвечают из сохраненных результатов. Пока
+    цепь разомкнута, один фоновый поток раз в probe_interval секунд
+    проверяет базу (probe); первая удачная проверка замыкает цепь.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+
+    def __init__(self, failure_threshold: int, probe_interval: float,
+                 probe: Optional[Callable[[], None]] = None):
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[datetime] = None
+        self.times_opened = 0
+        self.last_error: Optional[str] = None
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def allow(self) -> bool:
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        if self.failures:
+            with self._lock:
+                self.failures = 0
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {str(error).strip()[:200]}"
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = datetime.now()
+                self.times_opened += 1
+                print(f"⚡ Цепь базы разомкнута после {self.failures} ошибок: {self.last_error}")
+                self._start_probe_locked()
+
+    def close(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                print(f"✅ Цепь базы замкнута (была разомкнута с {self.opened_at:%H:%M:%S})")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def _start_probe_locked(self):
+        if self.probe is None or (self._probe_thread is not None and self._probe_thread.is_alive()):
+            return
+        self._probe_thread = threading.Thread(target=self._probe_loop, name='db-circuit-probe', daemon=True)
+        self._probe_thread.start()
+
+    def _probe_loop(self):
+        while self.state == self.OPEN:
+            time.sleep(self.probe_interval)
+            try:
+                self.probe()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {str(e).strip()[:200]}"
+                continue
+            self.close()
+
+    def report(self) -> str:
+        if self.state == self.CLOSED:
+            text = "замкнута"
+            if self.failures:
+                text += f", ошибок подряд: {self.failures}"
+        else:
+            text = f"РАЗОМКНУТА с {self.opened_at:%H:%M:%S}"
+        if self.times_opened:
+            text += f" (размыканий: {self.times_opened}, последняя ошибка: {self.last_error})"
+        return text
+
+
+class StaleCache:
+    """Последние удачные результаты запросов (LRU), на случай недоступности базы"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Tuple[datetime, object]]' = OrderedDict()
+
+    def put(self, key: Hashable, value):
+        with self._lock:
+            self._entries[key] = (datetime.now(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Tuple[datetime, object]]:
+        """(время получения, результат) или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class StaleReport:
+    """Что произошло с чтениями внутри track_stale()"""
+
+    def __init__(self):
+        self.stale = False
+        self.fetched_at: Optional[datetime] = None
+        self.unavailable = False
+
+    def mark_stale(self, fetched_at: datetime):
+        self.stale = True
+        if self.fetched_at is None or fetched_at < self.fetched_at:
+            self.fetched_at = fetched_at
+
+
+_current_report: contextvars.ContextVar = contextvars.ContextVar('stale_report', default=None)
+
+
+@contextmanager
+def track_stale():
+    """Отметить, были ли чтения внутри блока отвечены устаревшими данными"""
+    report = StaleReport()
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+
+
+def current_report() -> Optional[StaleReport]:
+    return _current_report.get()
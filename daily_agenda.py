@@ -0,0 +1,144 @@
+import threading
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from search_index import REFRESH_OVERLAP
+
+# Поля дат заказа, которые считаются событиями дня, в порядке маршрута
+AGENDA_EVENTS = (
+    ('departure_date', '🚢', 'Отплытие из Китая'),
+    ('arrival_iran_date', '🏁', 'Прибытие в Иран'),
+    ('truck_loading_date', '🚛', 'Погрузка на грузовик'),
+    ('arrival_turkmenistan_date', '🏁', 'Прибытие в Туркменистан'),
+    ('client_receiving_date', '✅', 'Получение клиентом'),
+    ('eta_date', '⏳', 'Ожидаемое прибытие (ETA)'),
+)
+
+# Предел длины ответа (лимит Telegram 4096 символов)
+AGENDA_TEXT_LIMIT = 3800
+
+
+class AgendaEntry(NamedTuple):
+    """Событие дня по одному заказу"""
+    event_time: datetime
+    order_number: str
+    client_name: str
+    route: Optional[str]
+
+
+class DailyAgenda:
+    """Снимок событий на сегодня, сгруппированных по типу события
+
+    Строится целиком в полночь (и при первом обращении за новый день),
+    затем точечно исправляется по заказам, измененным после последней
+    проверки (orders.updated_at). /today и кнопка отвечают готовым
+    текстом из памяти.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.day: Optional[date] = None
+        self._events: Dict[str, Dict[str, AgendaEntry]] = {}  # поле -> номер заказа -> событие
+        self._text = ""
+        self.last_updated_at: Optional[datetime] = None
+        self.built_at: Optional[datetime] = None
+
+    @staticmethod
+    def _entries_for(row, day: date) -> List[Tuple[str, AgendaEntry]]:
+        """События заказа, приходящиеся на day"""
+        result = []
+        for field, _, _ in AGENDA_EVENTS:
+            value = getattr(row, field)
+            if value and value.date() == day:
+                result.append((field, AgendaEntry(value, row.order_number, row.client_name, row.route)))
+        return result
+
+    def _track_updated_at(self, row):
+        if row.updated_at and (self.last_updated_at is None or row.updated_at > self.last_updated_at):
+            self.last_updated_at = row.updated_at
+
+    def build(self, db, day: Optional[date] = None) -> int:
+        """Полностью построить повестку на день"""
+        day = day or date.today()
+        # Часы базы: с ними сравнивается orders.updated_at при исправлениях
+        started_at = db.get_database_time()
+        rows = db.get_agenda_orders(day)
+
+        events: Dict[str, Dict[str, AgendaEntry]] = {field: {} for field, _, _ in AGENDA_EVENTS}
+        for row in rows:
+            for field, entry in self._entries_for(row, day):
+                events[field][entry.order_number] = entry
+
+        with self._lock:
+            self.day = day
+            self._events = events
+            # Изменения с момента начала построения подхватит refresh
+            self.last_updated_at = started_at
+            self.built_at = datetime.now()
+            self._text = self._render_locked()
+        return sum(len(entries) for entries in events.values())
+
+    def refresh(self, db) -> int:
+        """Исправить повестку по измененным заказам; в новый день — построить заново"""
+        if self.day != date.today():
+            return self.build(db)
+
+        since = self.last_updated_at - REFRESH_OVERLAP if self.last_updated_at else None
+        rows = db.get_agenda_orders_updated_since(since)
+        if not rows:
+            return 0
+
+        with self._lock:
+            for row in rows:
+                # Даты могли сдвинуться: сначала убираем все события заказа
+                for entries in self._events.values():
+                    entries.pop(row.order_number, None)
+                for field, entry in self._entries_for(row, self.day):
+                    self._events[field][entry.order_number] = entry
+                self._track_updated_at(row)
+            self._text = self._render_locked()
+        return len(rows)
+
+    def remove(self, order_numbers):
+        """Убрать события удаленных заказов"""
+        with self._lock:
+            for entries in self._events.values():
+                for order_number in order_numbers:
+                    entries.pop(order_number, None)
+            if self.day is not None:
+                self._text = self._render_locked()
+
+    def _render_locked(self) -> str:
+        text = f"📅 *События сегодня ({self.day.strftime('%d.%m.%Y')})*\n"
+        total = 0
+        for field, emoji, title in AGENDA_EVENTS:
+            entries = sorted(self._events.get(field, {}).values(), key=lambda e: (e.event_time, e.order_number))
+            if not entries:
+                continue
+            total += len(entries)
+            text += f"\n{emoji} *{title}* ({len(entries)}):\n"
+            for i, entry in enumerate(entries):
+                line = f"• *{entry.order_number}* - {entry.client_name}"
+                if entry.route:
+                    line += f" · 📍 {entry.route}"
+                line += "\n"
+                if len(text) + len(line) > AGENDA_TEXT_LIMIT:
+                    text += f"… и еще {len(entries) - i}\n"
+                    break
+                text += line
+
+        if not total:
+            text += "\n📭 На сегодня событий нет"
+        return text
+
+    def render(self) -> str:
+        """Готовый текст повестки"""
+        with self._lock:
+            return self._text
+
+    def is_current(self) -> bool:
+        return self.day == date.today()
+
+
+# Повестка процесса
+daily_agenda = DailyAgenda()
@@ -1,121 +1,1162 @@
-self.conn.close()
-except:
-pass
+import os
+import re
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Optional, Type
 
-# В класс DatabaseManager добавьте методы:
+import psycopg2
+from sqlalchemy import create_engine, exc as sa_exc
+from sqlalchemy.orm import sessionmaker
 
-def get_orders_without_photos(self) -> List[Dict]:
-    """Получить заказы без фото загрузки"""
-    if not self.cursor:
-        return []
-    
+from circuit_breaker import (
+    CircuitBreaker, DatabaseOverloadedError, DatabaseUnavailableError, CircuitOpenError,
+    StaleCache, current_report,
+)
+from instrumentation import timed, query_metrics
+from rows import OrderView, RowView, make_row, make_rows
+
+# Статусы, которые считаются завершенными
+CLOSED_STATUSES = ('Completed', 'Cancelled')
+
+# Колонки контейнера с данными заказа для /container и /truck
+CONTAINER_LOOKUP_COLUMNS = """
+    c.id, c.container_number, c.container_type, c.weight, c.volume,
+    c.loading_date, c.departure_date, c.arrival_iran_date, c.truck_loading_date,
+    c.arrival_turkmenistan_date, c.client_receiving_date,
+    c.driver_first_name, c.driver_last_name, c.driver_company, c.truck_number,
+    c.driver_iran_phone, c.driver_turkmenistan_phone,
+    o.order_number, o.client_name, o.route, o.status
+"""
+
+
+def normalize_number(value: str) -> str:
+    """Номер контейнера или грузовика для поиска: верхний регистр, только буквы и цифры
+
+    Совпадает с выражением индексов ix_containers_*_norm.
+    """
+    return ''.join(ch for ch in (value or '').upper() if ch.isalnum())
+
+
+# Открытая задача; условие совпадает с частичным индексом ix_tasks_open_due
+TASK_OPEN_SQL = "t.status NOT IN ('Done', 'Completed', 'Cancelled')"
+
+# Колонки задачи для /tasks и напоминаний
+TASK_COLUMNS = """
+    t.id, t.description, t.assigned_to, t.status, t.priority, t.due_date,
+    o.order_number, o.client_name
+"""
+
+# Исполнитель задачи в виде ключа task_assignees.assignee
+ASSIGNEE_KEY_SQL = "lower(regexp_replace(btrim(t.assigned_to), '\\s+', ' ', 'g'))"
+
+
+def normalize_assignee(name: str) -> str:
+    """Имя исполнителя для сопоставления с tasks.assigned_to: без лишних пробелов и регистра
+
+    Совпадает с ASSIGNEE_KEY_SQL.
+    """
+    return ' '.join((name or '').split()).lower()
+
+
+# Колонки заказа, нужные повестке дня
+AGENDA_COLUMNS = """
+    order_number, client_name, route, departure_date, arrival_iran_date,
+    truck_loading_date, arrival_turkmenistan_date, client_receiving_date,
+    eta_date, updated_at
+"""
+
+# Запросы дольше порога попадают в журнал медленных запросов с планом
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+EXPLAIN_COOLDOWN = 300  # секунд между EXPLAIN одного и того же запроса
+EXPLAIN_TIMEOUT_MS = 10000
+
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+_explain_lock = threading.Lock()
+_last_explain: Dict[str, float] = {}
+
+# Общий для всего процесса engine: один пул соединений на всех
+# (DatabaseManager, NotificationService, PDF генератор)
+_engine = None
+_session_factory = None
+_engine_lock = threading.Lock()
+
+# Реплика для чтения (DATABASE_REPLICA_URL, необязательно).
+# При отставании больше REPLICA_MAX_LAG_SECONDS или недоступности
+# чтение идет в основную базу.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '10'))
+REPLICA_CHECK_SECONDS = 10  # как часто проверять отставание реплики
+REPLICA_RETRY_SECONDS = 30  # пауза после ошибки соединения с репликой
+
+_replica_engine = None
+_replica_state = {'checked_at': float('-inf'), 'usable': False, 'lag': None, 'down_until': float('-inf')}
+_replica_lock = threading.Lock()
+
+# Чтение в этом контексте идет только в основную базу (read-your-writes)
+_pin_primary = contextvars.ContextVar('pin_primary', default=False)
+
+# Ошибки, после которых запрос к реплике повторяется в основной базе
+REPLICA_FALLBACK_ERRORS = (psycopg2.OperationalError, sa_exc.OperationalError, sa_exc.TimeoutError)
+
+# Размыкатель цепи: после DB_BREAKER_FAILURES ошибок подряд (или ответов
+# дольше DB_BREAKER_SLOW_MS) чтения отвечают последним удачным результатом,
+# а базу раз в DB_BREAKER_PROBE_SECONDS проверяет один фоновый поток
+DB_BREAKER_FAILURES = int(os.getenv('DB_BREAKER_FAILURES', '5'))
+DB_BREAKER_PROBE_SECONDS = float(os.getenv('DB_BREAKER_PROBE_SECONDS', '15'))
+DB_BREAKER_SLOW_MS = float(os.getenv('DB_BREAKER_SLOW_MS', '5000'))
+
+# Сброс нагрузки: не больше DB_MAX_IN_FLIGHT запросов одновременно,
+# остальные ждут свободного места не дольше DB_QUEUE_TIMEOUT секунд.
+# Предел не больше емкости пула (DB_POOL_SIZE + DB_MAX_OVERFLOW): иначе
+# лишние запросы ждут соединения pool_timeout секунд вместо сброса
+DB_POOL_CAPACITY = int(os.getenv('DB_POOL_SIZE', '3')) + int(os.getenv('DB_MAX_OVERFLOW', '2'))
+DB_MAX_IN_FLIGHT = min(int(os.getenv('DB_MAX_IN_FLIGHT', str(DB_POOL_CAPACITY))), DB_POOL_CAPACITY)
+DB_QUEUE_TIMEOUT = float(os.getenv('DB_QUEUE_TIMEOUT', '1'))
+
+# Сколько последних результатов запросов хранить для ответа при недоступной базе
+DB_STALE_CACHE_SIZE = int(os.getenv('DB_STALE_CACHE_SIZE', '256'))
+
+# Ошибки, которые считает размыкатель цепи. Таймаут ожидания соединения
+# из пула (sa_exc.TimeoutError) — перегрузка процесса, а не сбой базы
+DB_UNAVAILABLE_ERRORS = (psycopg2.OperationalError, sa_exc.OperationalError)
+
+
+def _normalize_database_url(database_url: str) -> str:
+    """Supabase/Railway отдают postgres://, SQLAlchemy ожидает postgresql://"""
+    if database_url.startswith('postgres://'):
+        return 'postgresql://' + database_url[len('postgres://'):]
+    return database_url
+
+
+def get_engine():
+    """Получить общий engine (создается один раз на процесс)
+
+    Размер пула задается переменными окружения:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE.
+    Максимум соединений процесса = DB_POOL_SIZE + DB_MAX_OVERFLOW.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                database_url = os.getenv('DATABASE_URL')
+                if not database_url:
+                    raise RuntimeError("DATABASE_URL не установлен")
+
+                _engine = _create_engine(database_url, 'DB')
+    return _engine
+
+
+def _create_engine(database_url: str, prefix: str):
+    """Engine с размером пула из переменных окружения <prefix>_POOL_SIZE и т.д."""
+    return create_engine(
+        _normalize_database_url(database_url),
+        pool_size=int(os.getenv(f'{prefix}_POOL_SIZE', '3')),
+        max_overflow=int(os.getenv(f'{prefix}_MAX_OVERFLOW', '2')),
+        pool_timeout=int(os.getenv(f'{prefix}_POOL_TIMEOUT', '10')),
+        pool_recycle=int(os.getenv(f'{prefix}_POOL_RECYCLE', '1800')),
+        pool_pre_ping=True
+    )
+
+
+def get_replica_engine():
+    """Engine реплики для чтения (None, если DATABASE_REPLICA_URL не задан)
+
+    Пул реплики настраивается переменными DB_REPLICA_POOL_SIZE и т.д.
+    """
+    global _replica_engine
+    if _replica_engine is None:
+        replica_url = os.getenv('DATABASE_REPLICA_URL')
+        if not replica_url:
+            return None
+        with _engine_lock:
+            if _replica_engine is None:
+                _replica_engine = _create_engine(replica_url, 'DB_REPLICA')
+    return _replica_engine
+
+
+def _check_replica_lag(engine) -> float:
+    """Отставание реплики в секундах (0 для базы, которая не является репликой)"""
+    conn = engine.raw_connection()
     try:
-        self.cursor.execute("""
-            SELECT * FROM orders 
-            WHERE has_loading_photo = FALSE 
-            AND status NOT IN ('Completed', 'Cancelled')
-            ORDER BY creation_date DESC
+        cursor = conn.cursor()
+        # Без новых записей на основной базе replay_timestamp стареет,
+        # поэтому при совпадении принятого и примененного WAL отставание 0
+        cursor.execute("""
+            SELECT COALESCE(CASE
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+            END, 0)
         """)
-        return self.cursor.fetchall()
-    except Exception as e:
-        print(f"Ошибка получения заказов без фото: {e}")
-        return []
-
-def get_orders_by_date_range(self, start_date: datetime, end_date: datetime) -> List[Dict]:
-    """Получить заказы за период"""
-    if not self.cursor:
-        return []
-    
+        lag = float(cursor.fetchone()[0])
+        cursor.close()
+        return lag
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def replica_usable() -> bool:
+    """Можно ли сейчас читать с реплики (проверка отставания не чаще REPLICA_CHECK_SECONDS)"""
+    engine = get_replica_engine()
+    if engine is None:
+        return False
+
+    now = time.monotonic()
+    if now < _replica_state['down_until']:
+        return False
+    if now - _replica_state['checked_at'] < REPLICA_CHECK_SECONDS:
+        return _replica_state['usable']
+
+    # Проверяет один поток, остальные пока используют прошлый результат
+    if not _replica_lock.acquire(blocking=False):
+        return _replica_state['usable']
     try:
-        self.cursor.execute("""
-            SELECT * FROM orders 
-            WHERE creation_date BETWEEN %s AND %s
-            ORDER BY creation_date DESC
-        """, (start_date, end_date))
-        return self.cursor.fetchall()
-    except Exception as e:
-        print(f"Ошибка получения заказов за период: {e}")
-        return []
-
-def get_orders_with_events_today(self) -> List[Dict]:
-    """Получить заказы с событиями сегодня"""
-    if not self.cursor:
-        return []
-    
+        try:
+            lag = _check_replica_lag(engine)
+            _replica_state['lag'] = lag
+            _replica_state['usable'] = lag <= REPLICA_MAX_LAG_SECONDS
+        except Exception as e:
+            print(f"Реплика недоступна: {e}")
+            _replica_state['lag'] = None
+            _replica_state['usable'] = False
+            _replica_state['down_until'] = now + REPLICA_RETRY_SECONDS
+        _replica_state['checked_at'] = now
+        return _replica_state['usable']
+    finally:
+        _replica_lock.release()
+
+
+def mark_replica_down():
+    """Временно отключить реплику после ошибки соединения"""
+    _replica_state['usable'] = False
+    _replica_state['down_until'] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+
+@contextmanager
+def use_primary():
+    """Читать только из основной базы внутри блока (например, сразу после записи)"""
+    token = _pin_primary.set(True)
     try:
-        today = datetime.now().date()
-        tomorrow = today + timedelta(days=1)
-        
-        self.cursor.execute("""
-            SELECT * FROM orders 
-            WHERE (departure_date::date = %s OR
-                   arrival_iran_date::date = %s OR
-                   truck_loading_date::date = %s OR
-                   arrival_turkmenistan_date::date = %s OR
-                   client_receiving_date::date = %s OR
-                   eta_date::date = %s)
-            ORDER BY creation_date DESC
-        """, (today, today, today, today, today, today))
-        return self.cursor.fetchall()
-    except Exception as e:
-        print(f"Ошибка получения событий сегодня: {e}")
-        return []
-
-def get_upcoming_events(self, from_date: datetime, to_date: datetime) -> List[Dict]:
-    """Получить предстоящие события"""
-    if not self.cursor:
-        return []
-    
+        yield
+    finally:
+        _pin_primary.reset(token)
+
+
+def get_session_factory():
+    """Получить фабрику ORM сессий поверх общего engine"""
+    global _session_factory
+    if _session_factory is None:
+        with _engine_lock:
+            if _session_factory is None:
+                _session_factory = sessionmaker(
+                    autocommit=False,
+                    autoflush=False,
+                    bind=get_engine()
+                )
+    return _session_factory
+
+
+def get_pool_status() -> str:
+    """Текстовый статус пула соединений (и реплики, если она настроена)"""
+    if _engine is None:
+        return "пул не создан"
+    status = _engine.pool.status()
+    status += f"\nЦепь: {db_circuit.report()}; сохранено результатов: {len(stale_results)}"
+    if _replica_engine is not None:
+        lag = _replica_state['lag']
+        state = "используется" if _replica_state['usable'] else "не используется"
+        lag_text = f", отставание {lag:.1f} с" if lag is not None else ""
+        status += f"\nРеплика ({state}{lag_text}): {_replica_engine.pool.status()}"
+    return status
+
+
+def dispose_engine():
+    """Закрыть все соединения пула (при остановке процесса)"""
+    global _engine, _session_factory, _replica_engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        if _replica_engine is not None:
+            _replica_engine.dispose()
+        _engine = None
+        _session_factory = None
+        _replica_engine = None
+
+
+def _probe_database():
+    """Проверка основной базы для размыкателя цепи"""
+    conn = get_engine().raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def _serve_stale(key, error: Exception):
+    """Последний удачный результат запроса вместо ошибки базы"""
+    report = current_report()
+    entry = stale_results.get(key) if key is not None else None
+    if entry is None:
+        if report is not None:
+            report.unavailable = True
+        if isinstance(error, DatabaseUnavailableError):
+            raise error
+        raise DatabaseUnavailableError(str(error)) from error
+
+    fetched_at, result = entry
+    if report is not None:
+        report.mark_stale(fetched_at)
+    return result
+
+
+# Состояние базы для всего процесса
+db_circuit = CircuitBreaker(DB_BREAKER_FAILURES, DB_BREAKER_PROBE_SECONDS, probe=_probe_database)
+stale_results = StaleCache(DB_STALE_CACHE_SIZE)
+_in_flight = threading.BoundedSemaphore(DB_MAX_IN_FLIGHT)
+
+
+# Подготовленные запросы: PREPARE один раз на соединение, затем EXECUTE.
+# DB_PREPARED_STATEMENTS=0 отключает их (например, для PgBouncer в режиме
+# transaction); при ошибке подготовленного запроса они отключаются сами.
+PREPARED_STATEMENTS_ENABLED = os.getenv('DB_PREPARED_STATEMENTS', '1') != '0'
+
+_PLACEHOLDER_RE = re.compile(r'%\((\w+)\)s|%s')
+
+# Ошибки, означающие, что сервер (или пулер) не держит подготовленные запросы
+PREPARED_FALLBACK_ERRORS = (
+    psycopg2.errors.InvalidSqlStatementName,
+    psycopg2.errors.DuplicatePreparedStatement,
+)
+
+
+class PreparedStatement:
+    """Именованный запрос, переписанный под PREPARE ($1, $2 ... вместо %s)"""
+
+    __slots__ = ('name', 'sql', 'statement_name', 'prepare_sql', 'param_names', 'param_count',
+                 'prepares', 'prepared_executions', 'plain_executions')
+
+    def __init__(self, name: str, sql: str):
+        self.name = name
+        self.sql = sql
+        self.statement_name = 'q_' + re.sub(r'\W', '_', name)
+
+        param_names: List[str] = []
+        count = 0
+
+        def placeholder(match) -> str:
+            nonlocal count
+            if match.group(1) is None:
+                count += 1
+                return f"${count}"
+            if match.group(1) not in param_names:
+                param_names.append(match.group(1))
+            return f"${param_names.index(match.group(1)) + 1}"
+
+        body = _PLACEHOLDER_RE.sub(placeholder, sql)
+        self.param_names = param_names or None
+        self.param_count = len(param_names) if param_names else count
+        self.prepare_sql = f"PREPARE {self.statement_name} AS {body}"
+        self.prepares = 0
+        self.prepared_executions = 0
+        self.plain_executions = 0
+
+    def execute(self, cursor, prepared: set, params):
+        """EXECUTE на курсоре; PREPARE, если на этом соединении его еще не было"""
+        if self.statement_name not in prepared:
+            cursor.execute(self.prepare_sql)
+            prepared.add(self.statement_name)
+            self.prepares += 1
+
+        if self.param_names is not None:
+            args = [params[name] for name in self.param_names]
+        else:
+            args = list(params or ())
+
+        if args:
+            cursor.execute(f"EXECUTE {self.statement_name} ({', '.join(['%s'] * len(args))})", args)
+        else:
+            cursor.execute(f"EXECUTE {self.statement_name}")
+        self.prepared_executions += 1
+
+
+class StatementRegistry:
+    """Реестр подготовленных запросов горячих путей и их статистика"""
+
+    def __init__(self, enabled: bool = PREPARED_STATEMENTS_ENABLED):
+        self.enabled = enabled
+        self.disabled_reason: Optional[str] = None
+        self._statements: Dict[str, PreparedStatement] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, sql: str) -> Optional[PreparedStatement]:
+        """Подготовленный вариант запроса (None — выполнять как обычно)"""
+        if not self.enabled:
+            return None
+        statement = self._statements.get(name)
+        if statement is None:
+            with self._lock:
+                statement = self._statements.setdefault(name, PreparedStatement(name, sql))
+        # Под одним именем должен быть один и тот же текст запроса
+        return statement if statement.sql == sql else None
+
+    def record_plain(self, name: str):
+        statement = self._statements.get(name)
+        if statement is not None:
+            statement.plain_executions += 1
+
+    def disable(self, reason: str):
+        """Отключить подготовленные запросы для всего процесса"""
+        if self.enabled:
+            self.enabled = False
+            self.disabled_reason = reason
+            print(f"⚠️ Подготовленные запросы отключены: {reason}")
+
+    def report(self) -> str:
+        """Текстовый отчет по подготовленным запросам"""
+        if not self._statements:
+            state = "включены" if self.enabled else f"отключены ({self.disabled_reason or 'DB_PREPARED_STATEMENTS=0'})"
+            return f"Подготовленные запросы {state}, вызовов пока не было"
+
+        metrics = query_metrics.snapshot()
+        lines = ["Подготовленные запросы: " + ("включены" if self.enabled else
+                                               f"отключены ({self.disabled_reason or 'DB_PREPARED_STATEMENTS=0'})")]
+        for name, statement in sorted(self._statements.items()):
+            latency = metrics.get(name, {})
+            lines.append(
+                f"{name}: PREPARE {statement.prepares}, EXECUTE {statement.prepared_executions}, "
+                f"без подготовки {statement.plain_executions}, "
+                f"сред. {latency.get('mean_ms', 0)} мс, p95 ≤{latency.get('p95_ms', 0)} мс"
+            )
+        return "\n".join(lines)
+
+
+# Реестр процесса
+statement_registry = StatementRegistry()
+
+
+def _schedule_explain(engine, name: str, sql: str, params, elapsed: float):
+    """Запланировать EXPLAIN медленного запроса (не чаще раза в EXPLAIN_COOLDOWN на имя)"""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return
+
+    now = time.monotonic()
+    with _explain_lock:
+        if now - _last_explain.get(name, float('-inf')) < EXPLAIN_COOLDOWN:
+            return
+        _last_explain[name] = now
+
+    _explain_executor.submit(_capture_explain, engine, name, sql, params, elapsed)
+
+
+def _capture_explain(engine, name: str, sql: str, params, elapsed: float):
+    """Снять EXPLAIN (ANALYZE, BUFFERS) и сохранить в журнал медленных запросов"""
+    conn = engine.raw_connection()
     try:
-        self.cursor.execute("""
-            SELECT 
-                order_number,
-                'Отплытие из Китая' as event_type,
-                departure_date as event_date
-            FROM orders 
-            WHERE departure_date BETWEEN %s AND %s
-            
-            UNION ALL
-            
-            SELECT 
-                order_number,
-                'Прибытие в Иран' as event_type,
-                arrival_iran_date as event_date
-            FROM orders 
-            WHERE arrival_iran_date BETWEEN %s AND %s
-            
-            UNION ALL
-            
-            SELECT 
-                order_number,
-                'Погрузка на грузовик' as event_type,
-                truck_loading_date as event_date
-            FROM orders 
-            WHERE truck_loading_date BETWEEN %s AND %s
-            
-            UNION ALL
-            
-            SELECT 
-                order_number,
-                'Прибытие в Туркменистан' as event_type,
-                arrival_turkmenistan_date as event_date
-            FROM orders 
-            WHERE arrival_turkmenistan_date BETWEEN %s AND %s
-            
-            UNION ALL
-            
-            SELECT 
-                order_number,
-                'Получение клиентом' as event_type,
-                client_receiving_date as event_date
-            FROM orders 
-            WHERE client_receiving_date BETWEEN %s AND %s
-            
-            ORDER BY event_date
-        """, (from_date, to_date, from_date, to_date, from_date, to_date, 
-              from_date, to_date, from_date, to_date))
-        
-        return self.cursor.fetchall()
+        cursor = conn.cursor()
+        cursor.execute("SET LOCAL statement_timeout = %s", (EXPLAIN_TIMEOUT_MS,))
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + sql, params)
+        plan = "\n".join(row[0] for row in cursor.fetchall())
+        cursor.close()
+
+        query_metrics.add_slow_query({
+            'name': name,
+            'captured_at': datetime.now(),
+            'duration_ms': round(elapsed * 1000, 1),
+            'params': repr(params)[:200],
+            'plan': plan
+        })
     except Exception as e:
-        print(f"Ошибка получения предстоящих событий: {e}")
-        return []
+        print(f"Ошибка EXPLAIN для {name}: {e}")
+    finally:
+        # EXPLAIN ANALYZE выполняет запрос: ничего не фиксируем
+        conn.rollback()
+        conn.close()
+
+
+class DatabaseManager:
+    """Менеджер базы данных
+
+    Не держит собственного соединения: на время каждого запроса берет
+    соединение из общего пула и сразу возвращает его обратно. Поэтому
+    экземпляры дешевые и их можно создавать в любом сервисе.
+
+    Все методы только читают. Если задан DATABASE_REPLICA_URL, запросы
+    идут на реплику, кроме PRIMARY_QUERIES (инкрементальные выборки по
+    updated_at и часы базы: на отстающей реплике они теряли бы изменения)
+    и запросов внутри use_primary().
+    """
+
+    PRIMARY_QUERIES = frozenset({
+        'get_orders_updated_since',
+        'get_agenda_orders_updated_since',
+        'get_database_time',
+        'get_task_assignees',
+    })
+
+    # Запросы, которые при недоступной базе не отвечаются старым результатом:
+    # для инкрементальных выборок и часов базы старый ответ хуже ошибки
+    NO_STALE_QUERIES = frozenset({
+        'get_orders_updated_since',
+        'get_agenda_orders_updated_since',
+        'get_database_time',
+        'get_report_fingerprint',
+    })
+
+    # Горячие запросы: выполняются через PREPARE/EXECUTE (см. StatementRegistry)
+    PREPARED_QUERIES = frozenset({
+        'get_order_by_number',
+        'get_active_orders',
+        'search_orders',
+        'get_upcoming_events',
+        'get_orders_page_by_status',
+        'get_orders_page_by_status.next',
+        'get_status_counts',
+        'get_agenda_orders',
+        'find_containers',
+        'find_containers_by_truck',
+        'get_open_tasks_page',
+        'get_open_tasks_page.next',
+    })
+
+    def __init__(self):
+        self.engine = get_engine()
+        self.replica_engine = get_replica_engine()
+
+    def _engine_for(self, name: str):
+        """Основная база или реплика для запроса с этим именем"""
+        if (self.replica_engine is None or _pin_primary.get()
+                or name.split('.', 1)[0] in self.PRIMARY_QUERIES):
+            return self.engine
+        return self.replica_engine if replica_usable() else self.engine
+
+    @contextmanager
+    def _cursor(self, engine=None):
+        """Курсор на соединении из общего пула и множество запросов, подготовленных на нем"""
+        with timed('db'):
+            conn = (engine or self.engine).raw_connection()
+            try:
+                cursor = conn.cursor()
+                try:
+                    # info живет вместе с физическим соединением пула
+                    yield cursor, conn.info.setdefault('prepared_statements', set())
+                    conn.commit()
+                finally:
+                    cursor.close()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                # Для соединения из пула close() возвращает его в пул
+                conn.close()
+
+    def _execute(self, name: str, sql: str, params=None, fetch: Optional[str] = 'all',
+                 view: Type[RowView] = RowView):
+        """Выполнить запрос с учетом времени и счетчиков по имени запроса
+
+        fetch: 'all', 'one' или None (без чтения результата).
+        Строки возвращаются как view (кортежи с доступом по имени колонки).
+        Медленные SELECT дополнительно разбираются через EXPLAIN в фоне.
+
+        Пока цепь db_circuit разомкнута, при ошибке соединения или при
+        переполненной очереди запросов результат берется из stale_results
+        (отмечается в track_stale()); если его нет или запрос из
+        NO_STALE_QUERIES — DatabaseUnavailableError.
+        """
+        key = None
+        if fetch is not None and name.split('.', 1)[0] not in self.NO_STALE_QUERIES:
+            key = (name, repr(params))
+
+        if not db_circuit.allow():
+            return _serve_stale(key, CircuitOpenError(f"База временно недоступна ({name})"))
+        if not _in_flight.acquire(timeout=DB_QUEUE_TIMEOUT):
+            return _serve_stale(key, DatabaseOverloadedError(f"Слишком много запросов к базе ({name})"))
+
+        started = time.perf_counter()
+        try:
+            result = self._route(name, sql, params, fetch, view)
+        except sa_exc.TimeoutError as e:
+            return _serve_stale(key, DatabaseOverloadedError(f"Нет свободного соединения в пуле ({name}): {e}"))
+        except DB_UNAVAILABLE_ERRORS as e:
+            db_circuit.record_failure(e)
+            return _serve_stale(key, e)
+        finally:
+            _in_flight.release()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= DB_BREAKER_SLOW_MS:
+            db_circuit.record_failure(TimeoutError(f"{name} выполнялся {elapsed_ms:.0f} мс"))
+        else:
+            db_circuit.record_success()
+        if key is not None:
+            stale_results.put(key, result)
+        return result
+
+    def _route(self, name: str, sql: str, params, fetch: Optional[str], view: Type[RowView]):
+        """Выполнить на реплике или в основной базе (с переходом на основную при сбое реплики)"""
+        engine = self._engine_for(name)
+        if engine is not self.engine:
+            try:
+                return self._run(engine, name, sql, params, fetch, view)
+            except REPLICA_FALLBACK_ERRORS as e:
+                print(f"Реплика недоступна ({name}), запрос повторяется в основной базе: {e}")
+                mark_replica_down()
+        return self._run(self.engine, name, sql, params, fetch, view)
+
+    def _run(self, engine, name: str, sql: str, params, fetch: Optional[str], view: Type[RowView]):
+        statement = statement_registry.get(name, sql) if name in self.PREPARED_QUERIES else None
+        if statement is not None:
+            try:
+                return self._run_once(engine, name, sql, params, fetch, view, statement)
+            except PREPARED_FALLBACK_ERRORS as e:
+                # Пулер в режиме transaction: соединения сервера меняются между запросами
+                statement_registry.disable(f"{type(e).__name__}: {str(e).strip()[:100]}")
+        return self._run_once(engine, name, sql, params, fetch, view, None)
+
+    def _run_once(self, engine, name: str, sql: str, params, fetch: Optional[str],
+                  view: Type[RowView], statement: Optional[PreparedStatement]):
+        started = time.perf_counter()
+        error = False
+        try:
+            with self._cursor(engine) as (cursor, prepared):
+                if statement is not None:
+                    statement.execute(cursor, prepared, params)
+                else:
+                    cursor.execute(sql, params)
+                    statement_registry.record_plain(name)
+                if fetch is None:
+                    return None
+                columns = [column[0] for column in cursor.description]
+                if fetch == 'all':
+                    return make_rows(columns, cursor.fetchall(), view)
+                row = cursor.fetchone()
+                return make_row(columns, row, view) if row is not None else None
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            query_metrics.observe(name, elapsed, error)
+            if not error and elapsed * 1000 >= SLOW_QUERY_MS:
+                _schedule_explain(engine, name, sql, params, elapsed)
+
+    def _fetchall(self, name: str, sql: str, params=None) -> List[RowView]:
+        return self._execute(name, sql, params, 'all')
+
+    def _fetchone(self, name: str, sql: str, params=None) -> Optional[RowView]:
+        return self._execute(name, sql, params, 'one')
+
+    def _fetch_orders(self, name: str, sql: str, params=None) -> List[OrderView]:
+        return self._execute(name, sql, params, 'all', OrderView)
+
+    def _fetch_order(self, name: str, sql: str, params=None) -> Optional[OrderView]:
+        return self._execute(name, sql, params, 'one', OrderView)
+
+    def get_all_orders(self) -> List[OrderView]:
+        """Получить все заказы"""
+        try:
+            return self._fetch_orders('get_all_orders', """
+                SELECT * FROM orders
+                ORDER BY creation_date DESC
+            """)
+        except Exception as e:
+            print(f"Ошибка получения заказов: {e}")
+            return []
+
+    def get_order_by_number(self, order_number: str) -> Optional[OrderView]:
+        """Получить заказ по номеру (с итогами веса и объема контейнеров)"""
+        try:
+            return self._fetch_order('get_order_by_number', """
+                SELECT o.*,
+                    COALESCE(c.total_weight, 0) AS total_weight,
+                    COALESCE(c.total_volume, 0) AS total_volume
+                FROM orders o
+                LEFT JOIN LATERAL (
+                    SELECT SUM(weight) AS total_weight, SUM(volume) AS total_volume
+                    FROM containers
+                    WHERE order_id = o.id
+                ) c ON TRUE
+                WHERE o.order_number = %s
+            """, (order_number,))
+        except Exception as e:
+            print(f"Ошибка получения заказа {order_number}: {e}")
+            return None
+
+    def get_order_containers(self, order_id: int) -> List[RowView]:
+        """Контейнеры заказа (для PDF отчета)"""
+        try:
+            return self._fetchall('get_order_containers', """
+                SELECT container_number, container_type, weight, volume
+                FROM containers
+                WHERE order_id = %s
+                ORDER BY id
+            """, (order_id,))
+        except Exception as e:
+            print(f"Ошибка получения контейнеров заказа {order_id}: {e}")
+            return []
+
+    def find_containers(self, number: str, limit: int = 10) -> List[RowView]:
+        """Контейнеры по номеру (точно или по началу), с данными заказа"""
+        key = normalize_number(number)
+        if not key:
+            return []
+
+        try:
+            return self._fetchall('find_containers', f"""
+                SELECT {CONTAINER_LOOKUP_COLUMNS}
+                FROM containers c
+                JOIN orders o ON o.id = c.order_id
+                WHERE regexp_replace(upper(c.container_number), '[^[:alnum:]]', '', 'g') LIKE %s
+                ORDER BY regexp_replace(upper(c.container_number), '[^[:alnum:]]', '', 'g') = %s DESC,
+                         c.id DESC
+                LIMIT %s
+            """, (key + '%', key, limit))
+        except Exception as e:
+            print(f"Ошибка поиска контейнера {number}: {e}")
+            return []
+
+    def find_containers_by_truck(self, plate: str, limit: int = 20) -> List[RowView]:
+        """История перевозок грузовика: его контейнеры, новые первыми"""
+        key = normalize_number(plate)
+        if not key:
+            return []
+
+        try:
+            return self._fetchall('find_containers_by_truck', f"""
+                SELECT {CONTAINER_LOOKUP_COLUMNS}
+                FROM containers c
+                JOIN orders o ON o.id = c.order_id
+                WHERE regexp_replace(upper(c.truck_number), '[^[:alnum:]]', '', 'g') LIKE %s
+                ORDER BY c.truck_loading_date DESC NULLS LAST, c.id DESC
+                LIMIT %s
+            """, (key + '%', limit))
+        except Exception as e:
+            print(f"Ошибка поиска грузовика {plate}: {e}")
+            return []
+
+    def get_orders_by_status(self, status: str) -> List[OrderView]:
+        """Получить заказы по статусу"""
+        try:
+            return self._fetch_orders('get_orders_by_status', """
+                SELECT * FROM orders
+                WHERE status = %s
+                ORDER BY creation_date DESC
+            """, (status,))
+        except Exception as e:
+            print(f"Ошибка получения заказов по статусу: {e}")
+            return []
+
+    def get_orders_by_statuses(self, statuses: List[str]) -> List[OrderView]:
+        """Получить заказы по списку статусов"""
+        if not statuses:
+            return []
+
+        try:
+            return self._fetch_orders('get_orders_by_statuses', """
+                SELECT * FROM orders
+                WHERE status = ANY(%s)
+                ORDER BY creation_date DESC
+            """, (list(statuses),))
+        except Exception as e:
+            print(f"Ошибка получения заказов по статусам: {e}")
+            return []
+
+    def get_active_orders(self) -> List[OrderView]:
+        """Получить активные заказы"""
+        try:
+            return self._fetch_orders('get_active_orders', """
+                SELECT * FROM orders
+                WHERE status <> ALL(%s)
+                ORDER BY creation_date DESC
+            """, (list(CLOSED_STATUSES),))
+        except Exception as e:
+            print(f"Ошибка получения активных заказов: {e}")
+            return []
+
+    def search_orders(self, search_text: str) -> List[OrderView]:
+        """Поиск заказов по номеру, клиенту, маршруту и документу"""
+        pattern = f"%{search_text}%"
+        try:
+            return self._fetch_orders('search_orders', """
+                SELECT * FROM orders
+                WHERE order_number ILIKE %s
+                OR client_name ILIKE %s
+                OR route ILIKE %s
+                OR document_number ILIKE %s
+                ORDER BY creation_date DESC
+                LIMIT 50
+            """, (pattern, pattern, pattern, pattern))
+        except Exception as e:
+            print(f"Ошибка поиска заказов: {e}")
+            return []
+
+    def get_status_counts(self) -> List[RowView]:
+        """Число заказов и контейнеров по каждому статусу (один GROUP BY)"""
+        try:
+            return self._fetchall('get_status_counts', """
+                SELECT status,
+                    COUNT(*) AS order_count,
+                    COALESCE(SUM(container_count), 0) AS container_count
+                FROM orders
+                GROUP BY status
+            """)
+        except Exception as e:
+            print(f"Ошибка подсчета заказов по статусам: {e}")
+            return []
+
+    def get_orders_page_by_status(self, status: str, before_id: Optional[int] = None,
+                                  limit: int = 10) -> List[OrderView]:
+        """Страница заказов статуса, новые первыми (keyset по id вместо OFFSET)
+
+        Следующая страница запрашивается с before_id = id последнего заказа.
+        """
+        try:
+            if before_id is None:
+                return self._fetch_orders('get_orders_page_by_status', """
+                    SELECT id, order_number, client_name, container_count, route, status, eta_date
+                    FROM orders
+                    WHERE status = %s
+                    ORDER BY id DESC
+                    LIMIT %s
+                """, (status, limit))
+            return self._fetch_orders('get_orders_page_by_status.next', """
+                SELECT id, order_number, client_name, container_count, route, status, eta_date
+                FROM orders
+                WHERE status = %s AND id < %s
+                ORDER BY id DESC
+                LIMIT %s
+            """, (status, before_id, limit))
+        except Exception as e:
+            print(f"Ошибка получения заказов статуса {status}: {e}")
+            return []
+
+    def get_task_counts(self, assignees: Optional[List[str]] = None) -> Optional[RowView]:
+        """Счетчики открытых задач: всего, просрочено, без срока (часы базы)"""
+        where = TASK_OPEN_SQL
+        params = ()
+        if assignees is not None:
+            where += f" AND {ASSIGNEE_KEY_SQL} = ANY(%s)"
+            params = (list(assignees),)
+        name = 'get_task_counts.mine' if assignees is not None else 'get_task_counts'
+        try:
+            return self._fetchone(name, f"""
+                SELECT COUNT(*) AS total,
+                    COUNT(*) FILTER (WHERE t.due_date < LOCALTIMESTAMP) AS overdue,
+                    COUNT(*) FILTER (WHERE t.due_date IS NULL) AS undated
+                FROM tasks t
+                WHERE {where}
+            """, params)
+        except Exception as e:
+            print(f"Ошибка подсчета задач: {e}")
+            return None
+
+    def get_open_tasks_page(self, after: Optional[tuple] = None, limit: int = 10,
+                            assignees: Optional[List[str]] = None) -> List[RowView]:
+        """Страница открытых задач со сроком, ближайшие (и просроченные) первыми
+
+        Keyset по (due_date, id) вместо OFFSET: следующая страница
+        запрашивается с after = (due_date, id) последней задачи.
+        assignees — ключи исполнителей (normalize_assignee) для фильтра.
+        """
+        where = f"{TASK_OPEN_SQL} AND t.due_date IS NOT NULL"
+        params = []
+        name = 'get_open_tasks_page'
+        if after is not None:
+            where += " AND (t.due_date, t.id) > (%s, %s)"
+            params.extend(after)
+            name += '.next'
+        if assignees is not None:
+            where += f" AND {ASSIGNEE_KEY_SQL} = ANY(%s)"
+            params.append(list(assignees))
+            name += '.mine'
+        params.append(limit)
+        try:
+            return self._fetchall(name, f"""
+                SELECT {TASK_COLUMNS}
+                FROM tasks t
+                JOIN orders o ON o.id = t.order_id
+                WHERE {where}
+                ORDER BY t.due_date, t.id
+                LIMIT %s
+            """, tuple(params))
+        except Exception as e:
+            print(f"Ошибка получения задач: {e}")
+            return []
+
+    def get_task_assignees(self, chat_id: str) -> List[str]:
+        """Исполнители, привязанные к чату (/tasks iam)"""
+        try:
+            rows = self._fetchall('get_task_assignees', """
+                SELECT assignee FROM task_assignees
+                WHERE chat_id = %s
+                ORDER BY assignee
+            """, (str(chat_id),))
+            return [row.assignee for row in rows]
+        except Exception as e:
+            print(f"Ошибка получения исполнителей чата {chat_id}: {e}")
+            return []
+
+    def get_statistics(self, days: int = 30) -> Dict:
+        """Получить статистику за период"""
+        stats = {
+            'total_orders': 0,
+            'completed_orders': 0,
+            'active_orders': 0,
+            'total_containers': 0,
+            'total_weight': 0,
+            'total_volume': 0,
+            'period_days': days
+        }
+
+        try:
+            since = datetime.now() - timedelta(days=days)
+            orders = self._fetchone('get_statistics.orders', """
+                SELECT
+                    COUNT(*) AS total_orders,
+                    COUNT(*) FILTER (WHERE status = 'Completed') AS completed_orders,
+                    COUNT(*) FILTER (WHERE status <> ALL(%s)) AS active_orders,
+                    COALESCE(SUM(container_count), 0) AS total_containers
+                FROM orders
+                WHERE creation_date >= %s
+            """, (list(CLOSED_STATUSES), since))
+            if orders:
+                stats.update(orders._asdict())
+
+            containers = self._fetchone('get_statistics.containers', """
+                SELECT
+                    COALESCE(SUM(c.weight), 0) AS total_weight,
+                    COALESCE(SUM(c.volume), 0) AS total_volume
+                FROM containers c
+                JOIN orders o ON o.id = c.order_id
+                WHERE o.creation_date >= %s
+            """, (since,))
+            if containers:
+                stats.update(containers._asdict())
+        except Exception as e:
+            print(f"Ошибка получения статистики: {e}")
+
+        return stats
+
+    def get_recent_orders(self, limit: int = 10) -> List[OrderView]:
+        """Последние созданные заказы"""
+        try:
+            return self._fetch_orders('get_recent_orders', """
+                SELECT * FROM orders
+                ORDER BY creation_date DESC
+                LIMIT %s
+            """, (limit,))
+        except Exception as e:
+            print(f"Ошибка получения последних заказов: {e}")
+            return []
+
+    def get_period_status_counts(self, days: int) -> List[RowView]:
+        """Число заказов по статусам среди созданных за период"""
+        try:
+            return self._fetchall('get_period_status_counts', """
+                SELECT status, COUNT(*) AS order_count
+                FROM orders
+                WHERE creation_date >= %s
+                GROUP BY status
+                ORDER BY order_count DESC
+            """, (datetime.now() - timedelta(days=days),))
+        except Exception as e:
+            print(f"Ошибка подсчета статусов за период: {e}")
+            return []
+
+    def get_summary_series(self, days: int, bucket: str = 'week') -> List[RowView]:
+        """Заказы, контейнеры, вес и объем по дням или неделям создания заказа"""
+        try:
+            return self._fetchall('get_summary_series', """
+                SELECT date_trunc(%s, o.creation_date) AS bucket,
+                    COUNT(*) AS orders,
+                    COALESCE(SUM(o.container_count), 0) AS containers,
+                    COALESCE(SUM(c.weight), 0) AS weight,
+                    COALESCE(SUM(c.volume), 0) AS volume
+                FROM orders o
+                LEFT JOIN LATERAL (
+                    SELECT SUM(weight) AS weight, SUM(volume) AS volume
+                    FROM containers
+                    WHERE order_id = o.id
+                ) c ON TRUE
+                WHERE o.creation_date >= %s
+                GROUP BY 1
+                ORDER BY 1
+            """, (bucket, datetime.now() - timedelta(days=days)))
+        except Exception as e:
+            print(f"Ошибка получения динамики за период: {e}")
+            return []
+
+    def get_report_fingerprint(self) -> Optional[tuple]:
+        """Отпечаток данных сводных отчетов: меняется при любом изменении заказов или контейнеров"""
+        row = self._fetchone('get_report_fingerprint', """
+            SELECT o.order_count, o.last_updated_at, c.container_count, c.last_id, c.weight, c.volume
+            FROM (SELECT COUNT(*) AS order_count, MAX(updated_at) AS last_updated_at FROM orders) o,
+                 (SELECT COUNT(*) AS container_count, MAX(id) AS last_id,
+                         SUM(weight) AS weight, SUM(volume) AS volume FROM containers) c
+        """)
+        return tuple(str(value) for value in row) if row else None
+
+    def get_orders_without_photos(self) -> List[OrderView]:
+        """Получить заказы без фото загрузки"""
+        try:
+            return self._fetch_orders('get_orders_without_photos', """
+                SELECT * FROM orders
+                WHERE has_loading_photo = FALSE
+                AND status <> ALL(%s)
+                ORDER BY creation_date DESC
+            """, (list(CLOSED_STATUSES),))
+        except Exception as e:
+            print(f"Ошибка получения заказов без фото: {e}")
+            return []
+
+    def get_orders_by_date_range(self, start_date: datetime, end_date: datetime) -> List[OrderView]:
+        """Получить заказы за период"""
+        try:
+            return self._fetch_orders('get_orders_by_date_range', """
+                SELECT * FROM orders
+                WHERE creation_date BETWEEN %s AND %s
+                ORDER BY creation_date DESC
+            """, (start_date, end_date))
+        except Exception as e:
+            print(f"Ошибка получения заказов за период: {e}")
+            return []
+
+    def get_orders_with_events_today(self) -> List[OrderView]:
+        """Получить заказы с событиями сегодня"""
+        try:
+            today = datetime.now().date()
+
+            return self._fetch_orders('get_orders_with_events_today', """
+                SELECT * FROM orders
+                WHERE (departure_date::date = %s OR
+                       arrival_iran_date::date = %s OR
+                       truck_loading_date::date = %s OR
+                       arrival_turkmenistan_date::date = %s OR
+                       client_receiving_date::date = %s OR
+                       eta_date::date = %s)
+                ORDER BY creation_date DESC
+            """, (today, today, today, today, today, today))
+        except Exception as e:
+            print(f"Ошибка получения событий сегодня: {e}")
+            return []
+
+    def get_agenda_orders(self, day: date) -> List[OrderView]:
+        """Заказы с любым событием в указанный день (только нужные повестке колонки)"""
+        try:
+            start = datetime.combine(day, datetime.min.time())
+            end = start + timedelta(days=1)
+            return self._fetch_orders('get_agenda_orders', f"""
+                SELECT {AGENDA_COLUMNS}
+                FROM orders
+                WHERE (departure_date >= %(start)s AND departure_date < %(end)s)
+                   OR (arrival_iran_date >= %(start)s AND arrival_iran_date < %(end)s)
+                   OR (truck_loading_date >= %(start)s AND truck_loading_date < %(end)s)
+                   OR (arrival_turkmenistan_date >= %(start)s AND arrival_turkmenistan_date < %(end)s)
+                   OR (client_receiving_date >= %(start)s AND client_receiving_date < %(end)s)
+                   OR (eta_date >= %(start)s AND eta_date < %(end)s)
+            """, {'start': start, 'end': end})
+        except Exception as e:
+            print(f"Ошибка получения повестки на {day}: {e}")
+            return []
+
+    def get_agenda_orders_updated_since(self, since: Optional[datetime]) -> List[OrderView]:
+        """Колонки повестки для заказов, измененных после since"""
+        if since is None:
+            return []
+
+        try:
+            return self._fetch_orders('get_agenda_orders_updated_since', f"""
+                SELECT {AGENDA_COLUMNS}
+                FROM orders
+                WHERE updated_at >= %s
+            """, (since,))
+        except Exception as e:
+            print(f"Ошибка получения измененных заказов для повестки: {e}")
+            return []
+
+    def get_database_time(self) -> datetime:
+        """Текущее время по часам базы (для сравнения с updated_at)"""
+        return self._fetchone('get_database_time', "SELECT LOCALTIMESTAMP AS now").now
+
+    def get_upcoming_events(self, from_date: datetime, to_date: datetime) -> List[RowView]:
+        """Получить предстоящие события"""
+        try:
+            return self._fetchall('get_upcoming_events', """
+                SELECT
+                    order_number,
+                    'Отплытие из Китая' as event_type,
+                    departure_date as event_date
+                FROM orders
+                WHERE departure_date BETWEEN %s AND %s
+
+                UNION ALL
+
+                SELECT
+                    order_number,
+                    'Прибытие в Иран' as event_type,
+                    arrival_iran_date as event_date
+                FROM orders
+                WHERE arrival_iran_date BETWEEN %s AND %s
+
+                UNION ALL
+
+                SELECT
+                    order_number,
+                    'Погрузка на грузовик' as event_type,
+                    truck_loading_date as event_date
+                FROM orders
+                WHERE truck_loading_date BETWEEN %s AND %s
+
+                UNION ALL
+
+                SELECT
+                    order_number,
+                    'Прибытие в Туркменистан' as event_type,
+                    arrival_turkmenistan_date as event_date
+                FROM orders
+                WHERE arrival_turkmenistan_date BETWEEN %s AND %s
+
+                UNION ALL
+
+                SELECT
+                    order_number,
+                    'Получение клиентом' as event_type,
+                    client_receiving_date as event_date
+                FROM orders
+                WHERE client_receiving_date BETWEEN %s AND %s
+
+                ORDER BY event_date
+            """, (from_date, to_date, from_date, to_date, from_date, to_date,
+                  from_date, to_date, from_date, to_date))
+
+        except Exception as e:
+            print(f"Ошибка получения предстоящих событий: {e}")
+            return []
+
+    def get_orders_updated_since(self, since: Optional[datetime]) -> List[OrderView]:
+        """Краткие данные заказов, измененных после since (все при since=None)"""
+        try:
+            if since is None:
+                return self._fetch_orders('get_orders_updated_since.full', """
+                    SELECT order_number, client_name, status, route, container_count, updated_at
+                    FROM orders
+                """)
+            return self._fetch_orders('get_orders_updated_since', """
+                SELECT order_number, client_name, status, route, container_count, updated_at
+                FROM orders
+                WHERE updated_at >= %s
+                ORDER BY updated_at
+            """, (since,))
+        except Exception as e:
+            print(f"Ошибка получения измененных заказов: {e}")
+            return []
+
+    def close(self):
+        """Совместимость со старым API: соединения принадлежат общему пулу"""
+        pass
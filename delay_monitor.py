@@ -0,0 +1,206 @@
+"""Поиск задержек по всем активным заказам
+
+Один запрос забирает даты этапов всех активных заказов (в секундах от
+эпохи, без создания datetime на каждую ячейку) вместе с отметкой о уже
+отправленном оповещении. Дальше опоздание считается по колонкам целиком:
+для каждого заказа — текущий этап (последняя наступившая дата; даты в
+будущем — плановые, как в get_upcoming_events и /today), срок его
+окончания по ожидаемой длительности и прогноз доставки по оставшимся
+этапам, который сравнивается с eta_date.
+
+Оповещение 'delay' уходит только по заказам, которые стали опаздывать
+с прошлой проверки (или начали опаздывать на следующем этапе); отметки
+хранятся в order_delays и снимаются, когда заказ перестает опаздывать.
+"""
+import os
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from database import CLOSED_STATUSES, get_engine
+from rows import OrderView, make_row
+
+# Даты этапов по порядку прохождения заказа и событие, которым этап заканчивается
+MILESTONES = (
+    'loading_date',
+    'departure_date',
+    'arrival_iran_date',
+    'truck_loading_date',
+    'arrival_turkmenistan_date',
+    'client_receiving_date',
+)
+LEG_EVENTS = (
+    'Отплытие из Китая',
+    'Прибытие в Иран',
+    'Погрузка на грузовик',
+    'Прибытие в Туркменистан',
+    'Получение клиентом',
+)
+
+
+def parse_leg_days(value: str) -> Tuple[float, ...]:
+    """Разобрать DELAY_LEG_DAYS: длительности этапов в днях через запятую"""
+    days = tuple(float(part) for part in value.split(','))
+    if len(days) != len(LEG_EVENTS):
+        raise ValueError(f"DELAY_LEG_DAYS: нужно {len(LEG_EVENTS)} значений, получено {len(days)}")
+    return days
+
+# Ожидаемая длительность каждого этапа (от даты MILESTONES[i] до MILESTONES[i + 1]), дней
+LEG_DAYS = parse_leg_days(os.getenv('DELAY_LEG_DAYS', '7,30,7,5,3'))
+# Опоздание меньше этого не считается задержкой, часов
+DELAY_GRACE_HOURS = float(os.getenv('DELAY_GRACE_HOURS', '24'))
+
+# Этап «срок ETA прошел», когда даты этапов не заполнены
+ETA_STAGE = -1
+
+ORDER_COLUMNS = ('id', 'order_number', 'client_name', 'route', 'status', 'eta_date')
+
+DELAY_SCAN_SQL = f"""
+    SELECT {', '.join(f'o.{column}' for column in ORDER_COLUMNS)},
+           EXTRACT(EPOCH FROM o.eta_date)::float8 AS eta_at,
+           {', '.join(f'EXTRACT(EPOCH FROM o.{column})::float8' for column in MILESTONES)},
+           d.stage AS flagged_stage,
+           EXTRACT(EPOCH FROM LOCALTIMESTAMP)::float8 AS now
+    FROM orders o
+    LEFT JOIN order_delays d ON d.order_id = o.id
+    WHERE o.status <> ALL(%s)
+"""
+
+
+class Delay(NamedTuple):
+    """Опоздание заказа"""
+    order: OrderView
+    stage: int
+    # На сколько текущий этап дольше ожидаемого, секунд (None — этап не определен)
+    leg_overrun: Optional[float]
+    # На сколько прогноз доставки позже eta_date, секунд (None — нет ETA)
+    eta_slip: Optional[float]
+    is_new: bool
+
+
+def find_delays(columns: Sequence[Sequence], now: float,
+                leg_days: Sequence[float] = LEG_DAYS,
+                grace_hours: float = DELAY_GRACE_HOURS) -> List[Tuple[int, int, Optional[float], Optional[float]]]:
+    """Опаздывающие заказы по колонкам результата DELAY_SCAN_SQL
+
+    columns — колонки (не строки) результата, now — текущее время в
+    секундах. Возвращает (номер строки, этап, опоздание этапа, сдвиг ETA)
+    для заказов, опаздывающих больше grace_hours.
+    """
+    legs = [days * 86400 for days in leg_days]
+    # Сколько еще идти после окончания этапа i
+    remaining = [sum(legs[i + 1:]) for i in range(len(legs))]
+    grace = grace_hours * 3600
+    offset = len(ORDER_COLUMNS) + 1
+    eta = columns[len(ORDER_COLUMNS)]
+    count = len(eta)
+
+    # Текущий этап и его начало: последняя наступившая дата по порядку этапов.
+    # Даты позже now — плановые, этап по ним еще не пройден
+    stage = [ETA_STAGE] * count
+    started = [None] * count
+    for index in range(len(MILESTONES)):
+        column = columns[offset + index]
+        for row in range(count):
+            value = column[row]
+            if value is not None and value <= now:
+                stage[row] = index
+                started[row] = value
+
+    delays = []
+    last = len(MILESTONES) - 1
+    for row, (leg, start, eta_at) in enumerate(zip(stage, started, eta)):
+        if leg == last:
+            # Клиент уже получил груз
+            continue
+        if leg == ETA_STAGE:
+            overrun = None
+            eta_slip = now - eta_at if eta_at is not None else None
+        else:
+            expected_end = start + legs[leg]
+            overrun = now - expected_end
+            if eta_at is None:
+                eta_slip = None
+            else:
+                # Прогноз: этап кончается не раньше «сейчас», дальше этапы идут по плану
+                eta_slip = max(expected_end, now) + remaining[leg] - eta_at
+        if (overrun is not None and overrun > grace) or (eta_slip is not None and eta_slip > grace):
+            delays.append((row, leg, overrun, eta_slip))
+    return delays
+
+
+def _format_hours(seconds: float) -> str:
+    hours = seconds / 3600
+    return f"{hours / 24:.1f} дн." if hours >= 48 else f"{hours:.0f} ч"
+
+
+def format_delay(delay: Delay) -> str:
+    """Текст оповещения о задержке"""
+    lines = []
+    if delay.stage != ETA_STAGE and delay.leg_overrun is not None and delay.leg_overrun > 0:
+        lines.append(f"Этап «{LEG_EVENTS[delay.stage]}» дольше ожидаемого на {_format_hours(delay.leg_overrun)}")
+    if delay.eta_slip is not None and delay.eta_slip > 0:
+        eta = delay.order.eta_date.strftime('%d.%m.%Y') if delay.order.eta_date else '-'
+        if delay.stage == ETA_STAGE:
+            lines.append(f"Срок ETA {eta} прошел {_format_hours(delay.eta_slip)} назад")
+        else:
+            lines.append(f"Прогноз доставки позже ETA {eta} на {_format_hours(delay.eta_slip)}")
+    return "\n".join(lines)
+
+
+def load_delays(cursor) -> List[Delay]:
+    """Все опаздывающие активные заказы (один запрос)"""
+    cursor.execute(DELAY_SCAN_SQL, (list(CLOSED_STATUSES),))
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+
+    columns = list(zip(*rows))
+    found = find_delays(columns, rows[0][-1])
+    flagged = columns[-2]
+    return [
+        Delay(make_row(ORDER_COLUMNS, rows[row][:len(ORDER_COLUMNS)], OrderView), stage,
+              overrun, eta_slip, flagged[row] != stage)
+        for row, stage, overrun, eta_slip in found
+    ]
+
+
+def scan_delays(service, engine=None) -> Tuple[int, int]:
+    """Найти задержки и оповестить о новых
+
+    service — NotificationService (подбор получателей и формат оповещения).
+    Возвращает (опаздывающих заказов, новых задержек).
+    """
+    engine = engine or get_engine()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        delays = load_delays(cursor)
+        new = [delay for delay in delays if delay.is_new]
+
+        # Сначала оповещения, потом отметки: при сбое оповещение повторится,
+        # а не потеряется
+        if new and not service.create_alert_notifications(
+                [(delay.order, 'delay', format_delay(delay)) for delay in new]):
+            conn.rollback()
+            return len(delays), 0
+
+        if new:
+            execute_values(cursor, """
+                INSERT INTO order_delays (order_id, stage, flagged_at)
+                VALUES %s
+                ON CONFLICT (order_id) DO UPDATE SET stage = EXCLUDED.stage, flagged_at = EXCLUDED.flagged_at
+            """, [(delay.order.id, delay.stage) for delay in new],
+                template="(%s, %s, LOCALTIMESTAMP)")
+        # Заказ перестал опаздывать или закрыт: следующая задержка снова будет новой
+        cursor.execute("DELETE FROM order_delays WHERE order_id <> ALL(%s)",
+                       ([delay.order.id for delay in delays],))
+
+        conn.commit()
+        cursor.close()
+        return len(delays), len(new)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
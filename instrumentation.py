@@ -0,0 +1,421 @@
+import time
+
+# Момент импорта модуля: bot.py импортирует его первым, поэтому это
+# достаточно точная оценка времени старта процесса
+PROCESS_START = time.perf_counter()
+
+import io
+import sys
+import asyncio
+import cProfile
+import gc
+import logging
+import pstats
+import threading
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Tuple, Optional
+
+
+class StartupTimer:
+    """Замер времени запуска по фазам"""
+
+    def __init__(self, start: Optional[float] = None):
+        self.start = start if start is not None else PROCESS_START
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Засечь длительность фазы запуска"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def since_start(self) -> float:
+        """Секунд с момента старта процесса"""
+        return time.perf_counter() - self.start
+
+    def log(self, logger: logging.Logger, label: str = "Запуск"):
+        """Вывести длительности всех фаз в лог"""
+        for name, seconds in self.phases:
+            logger.info(f"⏱️ {label}: {name} — {seconds * 1000:.0f} мс")
+        logger.info(f"⏱️ {label}: всего {self.since_start() * 1000:.0f} мс с начала процесса")
+
+
+# Текущее обрабатываемое обновление (contextvars доходят и до потоков asyncio.to_thread)
+_current_timing: ContextVar[Optional['UpdateTiming']] = ContextVar('update_timing', default=None)
+
+
+class UpdateTiming:
+    """Разбивка времени обработки одного обновления"""
+
+    __slots__ = ('label', 'started', 'db', 'db_calls', 'api', 'api_calls', 'finished')
+
+    def __init__(self, label: str):
+        self.label = label
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.db = 0.0
+        self.db_calls = 0
+        self.api = 0.0
+        self.api_calls = 0
+
+    def add(self, kind: str, seconds: float):
+        """Добавить время внешнего вызова ('db' или 'api')"""
+        if kind == 'db':
+            self.db += seconds
+            self.db_calls += 1
+        elif kind == 'api':
+            self.api += seconds
+            self.api_calls += 1
+
+    @property
+    def total(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def render(self) -> float:
+        """Время в коде бота: все, что не БД и не Telegram API"""
+        return max(0.0, self.total - self.db - self.api)
+
+    def describe(self) -> str:
+        return (f"{self.label}: {self.total * 1000:.0f} мс "
+                f"(БД {self.db * 1000:.0f} мс / {self.db_calls} запр., "
+                f"Telegram {self.api * 1000:.0f} мс / {self.api_calls} выз., "
+                f"рендер {self.render * 1000:.0f} мс)")
+
+
+def start_update_timing(label: str) -> UpdateTiming:
+    """Начать замер обновления в текущем контексте"""
+    timing = UpdateTiming(label)
+    _current_timing.set(timing)
+    return timing
+
+
+def finish_update_timing() -> Optional[UpdateTiming]:
+    """Завершить замер текущего обновления"""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.finished = time.perf_counter()
+        _current_timing.set(None)
+    return timing
+
+
+@contextmanager
+def timed(kind: str):
+    """Учесть длительность блока в замере текущего обновления"""
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(kind, time.perf_counter() - started)
+
+
+# Границы корзин гистограммы задержек запросов, мс
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Гистограмма задержек с фиксированными корзинами"""
+
+    __slots__ = ('buckets', 'count', 'errors', 'total', 'max')
+
+    def __init__(self):
+        # Последняя корзина — все, что больше LATENCY_BUCKETS_MS[-1]
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, error: bool = False):
+        ms = seconds * 1000
+        index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                index = i
+                break
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        if error:
+            self.errors += 1
+
+    def percentile(self, q: float) -> float:
+        """Оценка перцентиля сверху (граница корзины), мс"""
+        if not self.count:
+            return 0.0
+        threshold = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class QueryMetrics:
+    """Счетчики, гистограммы задержек и журнал медленных запросов по имени запроса"""
+
+    def __init__(self, slow_log_size: int = 20):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.started_at = datetime.now()
+
+    def observe(self, name: str, seconds: float, error: bool = False):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.observe(seconds, error)
+
+    def add_slow_query(self, entry: Dict):
+        """Добавить запись в кольцевой буфер медленных запросов"""
+        with self._lock:
+            self.slow_queries.append(entry)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Сводка по каждому запросу"""
+        with self._lock:
+            return {
+                name: {
+                    'count': h.count,
+                    'errors': h.errors,
+                    'total_ms': round(h.total, 1),
+                    'mean_ms': round(h.mean, 2),
+                    'p50_ms': h.percentile(0.50),
+                    'p95_ms': h.percentile(0.95),
+                    'p99_ms': h.percentile(0.99),
+                    'max_ms': round(h.max, 1),
+                    'buckets': list(h.buckets),
+                }
+                for name, h in self._histograms.items()
+            }
+
+    def report(self, limit: int = 20) -> str:
+        """Текстовый отчет: запросы по суммарному времени"""
+        stats = sorted(self.snapshot().items(), key=lambda item: item[1]['total_ms'], reverse=True)
+        if not stats:
+            return "Запросов пока не было"
+
+        lines = [f"С {self.started_at.strftime('%d.%m.%Y %H:%M')}:"]
+        for name, s in stats[:limit]:
+            lines.append(
+                f"{name}: {s['count']} выз., ошибок {s['errors']}, "
+                f"сред. {s['mean_ms']} мс, p95 ≤{s['p95_ms']} мс, макс. {s['max_ms']} мс"
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.slow_queries.clear()
+            self.started_at = datetime.now()
+
+
+# Метрики запросов процесса
+query_metrics = QueryMetrics()
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер: периодически снимает стек указанного потока"""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.interval = interval
+        self.samples = 0
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_key(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno}({code.co_name})"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.self_counts[self._frame_key(frame)] += 1
+            seen = set()
+            while frame is not None:
+                key = self._frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    self.total_counts[key] += 1
+                frame = frame.f_back
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def report(self, limit: int = 30) -> str:
+        """Текстовый отчет: функции по собственному и суммарному времени"""
+        if not self.samples:
+            return "Нет сэмплов"
+
+        lines = [f"Сэмплов: {self.samples} (интервал {self.interval * 1000:.0f} мс)", "",
+                 "Собственное время:"]
+        for key, count in self.self_counts.most_common(limit):
+            lines.append(f"{count * 100 / self.samples:6.1f}%  {key}")
+        lines += ["", "Суммарное время (с вызываемыми):"]
+        for key, count in self.total_counts.most_common(limit):
+            lines.append(f"{count * 100 / self.samples:6.1f}%  {key}")
+        return "\n".join(lines)
+
+
+async def capture_profile(seconds: float, mode: str = 'cprofile', limit: int = 40) -> str:
+    """Профилировать процесс seconds секунд и вернуть текстовый отчет
+
+    cprofile — детерминированный профайлер потока event loop,
+    sample — сэмплирующий, с минимальным влиянием на задержки.
+    """
+    if mode == 'sample':
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+        return profiler.report(limit)
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.disable()
+
+    output = io.StringIO()
+    pstats.Stats(profiler, stream=output).strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return output.getvalue()
+
+
+class MemoryMonitor:
+    """Память процесса во времени: RSS, число объектов, снимки tracemalloc
+
+    sample() вызывается периодически (задача бота); история хранится
+    кольцевым буфером, так что за недели работы видно, растет ли память.
+    tracemalloc включается только по запросу: он замедляет выделение
+    памяти и сам занимает память.
+    """
+
+    def __init__(self, max_samples: int = 2016):
+        # 2016 сэмплов раз в 5 минут — неделя истории
+        self.samples: deque = deque(maxlen=max_samples)
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def rss_bytes() -> int:
+        """Текущий RSS процесса (на Linux из /proc, иначе пиковый из getrusage)"""
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # На macOS в байтах, на Linux в килобайтах
+            return peak if sys.platform == 'darwin' else peak * 1024
+        except (ImportError, OSError):
+            return 0
+
+    def sample(self) -> Tuple[datetime, int, int]:
+        """Записать (время, RSS, число объектов под сборщиком мусора)"""
+        entry = (datetime.now(), self.rss_bytes(), len(gc.get_objects()))
+        with self._lock:
+            self.samples.append(entry)
+        return entry
+
+    def trend(self, points: int = 12) -> str:
+        """RSS и число объектов: первый сэмпл, равномерная выборка, последний"""
+        with self._lock:
+            samples = list(self.samples)
+        if not samples:
+            return "Сэмплов памяти еще нет"
+
+        step = max(1, len(samples) // points)
+        shown = samples[::step]
+        if shown[-1] is not samples[-1]:
+            shown.append(samples[-1])
+        first = samples[0]
+        lines = [f"{at.strftime('%d.%m %H:%M')}  RSS {rss / 1048576:8.1f} МБ  объектов {objects:>10,}"
+                 for at, rss, objects in shown]
+        last = samples[-1]
+        lines.append(f"Изменение с {first[0].strftime('%d.%m %H:%M')}: "
+                     f"RSS {(last[1] - first[1]) / 1048576:+.1f} МБ, объектов {last[2] - first[2]:+,}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def top_types(limit: int = 25) -> str:
+        """Самые многочисленные типы объектов под сборщиком мусора"""
+        counts = Counter(type(obj).__name__ for obj in gc.get_objects())
+        return "\n".join(f"{count:>10,}  {name}" for name, count in counts.most_common(limit))
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start_trace(self, frames: int = 1):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._snapshot = tracemalloc.take_snapshot()
+
+    def stop_trace(self):
+        self._snapshot = None
+        tracemalloc.stop()
+
+    def trace_report(self, limit: int = 25) -> str:
+        """Строки с наибольшим приростом памяти с прошлого снимка"""
+        if not tracemalloc.is_tracing():
+            return "tracemalloc выключен"
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"tracemalloc: сейчас {current / 1048576:.1f} МБ, пик {peak / 1048576:.1f} МБ", ""]
+        if self._snapshot is not None:
+            lines.append("Прирост с прошлого снимка:")
+            for stat in snapshot.compare_to(self._snapshot, 'lineno')[:limit]:
+                lines.append(str(stat))
+        else:
+            lines.append("Крупнейшие выделения:")
+            for stat in snapshot.statistics('lineno')[:limit]:
+                lines.append(str(stat))
+        self._snapshot = snapshot
+        return "\n".join(lines)
+
+
+# Память процесса
+memory_monitor = MemoryMonitor()
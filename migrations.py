@@ -0,0 +1,376 @@
+"""Версионированные миграции схемы
+
+Текущая версия схемы хранится в единственной строке таблицы
+schema_version. При старте достаточно одного запроса к этой строке:
+если версия актуальна, ничего больше не делается. Новые миграции
+добавляются в конец списка MIGRATIONS с очередным номером версии.
+
+Ручной запуск: python migrations.py
+"""
+import logging
+from typing import List, Tuple
+
+import psycopg2
+
+from database import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Ключ для pg_advisory_xact_lock, чтобы два процесса не мигрировали одновременно
+MIGRATION_LOCK_KEY = 742113
+
+# (версия, описание, SQL)
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (1, "Начальная схема", """
+        CREATE TABLE IF NOT EXISTS orders (
+            id SERIAL PRIMARY KEY,
+            order_number VARCHAR(50) UNIQUE NOT NULL,
+            client_name VARCHAR(200) NOT NULL,
+            container_count INTEGER DEFAULT 0,
+            goods_type VARCHAR(100),
+            route VARCHAR(200),
+            transit_port VARCHAR(100),
+            document_number VARCHAR(100),
+            chinese_transport_company VARCHAR(200),
+            iranian_transport_company VARCHAR(200),
+            status VARCHAR(50) DEFAULT 'New',
+            status_color VARCHAR(20) DEFAULT '#FFFFFF',
+            creation_date TIMESTAMP DEFAULT NOW(),
+            loading_date TIMESTAMP,
+            departure_date TIMESTAMP,
+            arrival_iran_date TIMESTAMP,
+            truck_loading_date TIMESTAMP,
+            arrival_turkmenistan_date TIMESTAMP,
+            client_receiving_date TIMESTAMP,
+            arrival_notice_date TIMESTAMP,
+            tkm_date TIMESTAMP,
+            eta_date TIMESTAMP,
+            has_loading_photo BOOLEAN DEFAULT FALSE,
+            has_local_charges BOOLEAN DEFAULT FALSE,
+            has_tex BOOLEAN DEFAULT FALSE,
+            notes TEXT,
+            additional_info TEXT,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS containers (
+            id SERIAL PRIMARY KEY,
+            order_id INTEGER NOT NULL REFERENCES orders(id),
+            container_number VARCHAR(50),
+            container_type VARCHAR(50) DEFAULT '20ft Standard',
+            weight DOUBLE PRECISION DEFAULT 0,
+            volume DOUBLE PRECISION DEFAULT 0,
+            loading_date TIMESTAMP,
+            departure_date TIMESTAMP,
+            arrival_iran_date TIMESTAMP,
+            truck_loading_date TIMESTAMP,
+            arrival_turkmenistan_date TIMESTAMP,
+            client_receiving_date TIMESTAMP,
+            driver_first_name VARCHAR(100),
+            driver_last_name VARCHAR(100),
+            driver_company VARCHAR(200),
+            truck_number VARCHAR(50),
+            driver_iran_phone VARCHAR(50),
+            driver_turkmenistan_phone VARCHAR(50)
+        );
+
+        CREATE TABLE IF NOT EXISTS tasks (
+            id SERIAL PRIMARY KEY,
+            order_id INTEGER NOT NULL REFERENCES orders(id),
+            description VARCHAR(500) NOT NULL,
+            assigned_to VARCHAR(100),
+            status VARCHAR(50) DEFAULT 'ToDo',
+            priority VARCHAR(50) DEFAULT 'Medium',
+            due_date TIMESTAMP,
+            created_date TIMESTAMP DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS notifications (
+            id SERIAL PRIMARY KEY,
+            chat_id VARCHAR(100) NOT NULL,
+            message TEXT NOT NULL,
+            notification_type VARCHAR(50),
+            scheduled_time TIMESTAMP NOT NULL,
+            sent BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT NOW()
+        );
+
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id SERIAL PRIMARY KEY,
+            chat_id VARCHAR(100) UNIQUE NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            notify_events BOOLEAN DEFAULT TRUE,
+            notify_reminders BOOLEAN DEFAULT TRUE,
+            notify_alerts BOOLEAN DEFAULT TRUE,
+            hours_before INTEGER DEFAULT 24,
+            created_at TIMESTAMP DEFAULT NOW(),
+            updated_at TIMESTAMP DEFAULT NOW()
+        );
+    """),
+    (2, "updated_at заказов: индекс и триггер для инкрементального обновления", """
+        CREATE INDEX IF NOT EXISTS ix_orders_updated_at ON orders (updated_at);
+
+        CREATE OR REPLACE FUNCTION orders_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := NOW();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_orders_touch_updated_at ON orders;
+        CREATE TRIGGER trg_orders_touch_updated_at
+            BEFORE UPDATE ON orders
+            FOR EACH ROW EXECUTE FUNCTION orders_touch_updated_at();
+    """),
+    (3, "Подписки на конкретные заказы, клиентов и маршруты", """
+        CREATE TABLE IF NOT EXISTS subscription_scopes (
+            id SERIAL PRIMARY KEY,
+            chat_id VARCHAR(100) NOT NULL REFERENCES subscriptions(chat_id) ON DELETE CASCADE,
+            scope_type VARCHAR(20) NOT NULL CHECK (scope_type IN ('order', 'client', 'route')),
+            scope_value VARCHAR(200) NOT NULL,
+            created_at TIMESTAMP DEFAULT NOW(),
+            UNIQUE (chat_id, scope_type, scope_value)
+        );
+
+        CREATE INDEX IF NOT EXISTS ix_subscription_scopes_value
+            ON subscription_scopes (scope_type, scope_value);
+    """),
+    (4, "Помесячное секционирование notifications и частичный индекс неотправленных", """
+        ALTER TABLE notifications RENAME TO notifications_legacy;
+        ALTER SEQUENCE notifications_id_seq OWNED BY NONE;
+
+        CREATE TABLE notifications (
+            id INTEGER NOT NULL DEFAULT nextval('notifications_id_seq'),
+            chat_id VARCHAR(100) NOT NULL,
+            message TEXT NOT NULL,
+            notification_type VARCHAR(50),
+            scheduled_time TIMESTAMP NOT NULL,
+            sent BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (id, scheduled_time)
+        ) PARTITION BY RANGE (scheduled_time);
+
+        ALTER SEQUENCE notifications_id_seq OWNED BY notifications.id;
+
+        -- Страховочная секция для дат вне созданных месяцев
+        CREATE TABLE notifications_default PARTITION OF notifications DEFAULT;
+
+        -- Секции от самого старого месяца с данными до трех месяцев вперед
+        DO $$
+        DECLARE
+            month_start DATE;
+            last_month DATE := (date_trunc('month', NOW()) + INTERVAL '3 months')::date;
+        BEGIN
+            SELECT COALESCE(date_trunc('month', MIN(scheduled_time)), date_trunc('month', NOW()))::date
+            INTO month_start FROM notifications_legacy;
+
+            WHILE month_start <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS %I PARTITION OF notifications FOR VALUES FROM (%L) TO (%L)',
+                    'notifications_y' || to_char(month_start, 'YYYY') || 'm' || to_char(month_start, 'MM'),
+                    month_start,
+                    (month_start + INTERVAL '1 month')::date
+                );
+                month_start := (month_start + INTERVAL '1 month')::date;
+            END LOOP;
+        END $$;
+
+        INSERT INTO notifications (id, chat_id, message, notification_type, scheduled_time, sent, created_at)
+        SELECT id, chat_id, message, notification_type, scheduled_time, COALESCE(sent, FALSE), created_at
+        FROM notifications_legacy;
+
+        DROP TABLE notifications_legacy;
+
+        -- Поиск ожидающих отправки: индекс только по неотправленным строкам
+        CREATE INDEX IF NOT EXISTS ix_notifications_pending
+            ON notifications (scheduled_time, chat_id) WHERE sent = FALSE;
+    """),
+    (5, "Индекс заказов по статусу для доски статусов", """
+        -- Подсчет по статусам (index-only scan) и постраничный вывод по id
+        CREATE INDEX IF NOT EXISTS ix_orders_status_id
+            ON orders (status, id) INCLUDE (container_count);
+    """),
+    (6, "Журнал принятых пакетов webhook WPF (ключи идемпотентности)", """
+        CREATE TABLE IF NOT EXISTS wpf_webhook_deliveries (
+            idempotency_key VARCHAR(100) PRIMARY KEY,
+            received_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            orders_upserted INTEGER NOT NULL DEFAULT 0,
+            orders_deleted INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE INDEX IF NOT EXISTS ix_wpf_webhook_deliveries_received_at
+            ON wpf_webhook_deliveries (received_at);
+    """),
+    (7, "Очередь исходящих уведомлений для WPF (outbox)", """
+        CREATE TABLE IF NOT EXISTS wpf_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            notification_type VARCHAR(50) NOT NULL,
+            payload JSONB NOT NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'sent', 'failed')),
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            last_error TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            sent_at TIMESTAMP
+        );
+
+        -- Выборка флашера: только ожидающие отправки строки
+        CREATE INDEX IF NOT EXISTS ix_wpf_outbox_pending
+            ON wpf_outbox (next_attempt_at, id) WHERE status = 'pending';
+    """),
+    (8, "Поиск контейнеров по номеру и по номеру грузовика", """
+        -- Номера сравниваются нормализованными: верхний регистр, только буквы и цифры.
+        -- text_pattern_ops позволяет искать и точное совпадение, и по началу номера
+        CREATE INDEX IF NOT EXISTS ix_containers_number_norm
+            ON containers ((regexp_replace(upper(container_number), '[^[:alnum:]]', '', 'g')) text_pattern_ops);
+
+        CREATE INDEX IF NOT EXISTS ix_containers_truck_norm
+            ON containers ((regexp_replace(upper(truck_number), '[^[:alnum:]]', '', 'g')) text_pattern_ops);
+
+        CREATE INDEX IF NOT EXISTS ix_containers_order_id ON containers (order_id);
+    """),
+    (9, "Сроки задач: индекс открытых задач, исполнители и напоминания", """
+        -- Открытые задачи по сроку: /tasks и поиск просроченных одним диапазоном.
+        -- Условие должно совпадать с TASK_OPEN_SQL в database.py
+        CREATE INDEX IF NOT EXISTS ix_tasks_open_due
+            ON tasks (due_date, id) WHERE status NOT IN ('Done', 'Completed', 'Cancelled');
+
+        -- Чат Telegram исполнителя (tasks.assigned_to в нормализованном виде)
+        CREATE TABLE IF NOT EXISTS task_assignees (
+            assignee VARCHAR(100) NOT NULL,
+            chat_id VARCHAR(100) NOT NULL,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (assignee, chat_id)
+        );
+        CREATE INDEX IF NOT EXISTS ix_task_assignees_chat ON task_assignees (chat_id);
+
+        -- Когда по задаче уже напоминали
+        CREATE TABLE IF NOT EXISTS task_reminders (
+            task_id INTEGER PRIMARY KEY REFERENCES tasks(id) ON DELETE CASCADE,
+            due_soon_sent_at TIMESTAMP,
+            overdue_sent_at TIMESTAMP
+        );
+    """),
+    (10, "Отметки об оповещениях о задержках заказов", """
+        -- Заказ, о задержке которого уже оповестили, и этап задержки
+        -- (delay_monitor.py; -1 — прошел срок ETA)
+        CREATE TABLE IF NOT EXISTS order_delays (
+            order_id INTEGER PRIMARY KEY REFERENCES orders(id) ON DELETE CASCADE,
+            stage SMALLINT NOT NULL,
+            flagged_at TIMESTAMP NOT NULL
+        );
+    """),
+    (11, "Подписка только по областям сохраняется и без областей", """
+        -- TRUE: чат получает уведомления только по subscription_scopes, даже
+        -- когда их не осталось; на все заказы возвращает только /subscribe
+        ALTER TABLE subscriptions ADD COLUMN IF NOT EXISTS scoped BOOLEAN NOT NULL DEFAULT FALSE;
+        UPDATE subscriptions s SET scoped = TRUE
+        WHERE EXISTS (SELECT 1 FROM subscription_scopes sc WHERE sc.chat_id = s.chat_id);
+    """),
+    (12, "Даты подписок: TIMESTAMP вместо INTEGER в старых базах", """
+        -- В базах, созданных старыми версиями, created_at/updated_at подписок
+        -- остались INTEGER, а модель пишет в них datetime. Прежние значения
+        -- не переводятся в даты, поэтому сбрасываются. В новых базах
+        -- колонки уже TIMESTAMP, и блок ничего не делает
+        DO $$
+        DECLARE
+            col TEXT;
+        BEGIN
+            FOREACH col IN ARRAY ARRAY['created_at', 'updated_at'] LOOP
+                IF EXISTS (
+                    SELECT 1 FROM information_schema.columns
+                    WHERE table_schema = current_schema()
+                      AND table_name = 'subscriptions'
+                      AND column_name = col
+                      AND data_type IN ('smallint', 'integer', 'bigint')
+                ) THEN
+                    EXECUTE format('ALTER TABLE subscriptions ALTER COLUMN %I DROP DEFAULT', col);
+                    EXECUTE format('ALTER TABLE subscriptions ALTER COLUMN %I TYPE TIMESTAMP USING NULL', col);
+                    EXECUTE format('ALTER TABLE subscriptions ALTER COLUMN %I SET DEFAULT NOW()', col);
+                END IF;
+            END LOOP;
+        END
+        $$;
+    """),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _read_version(cursor) -> int:
+    """Прочитать текущую версию схемы (0, если таблицы версий еще нет)"""
+    cursor.execute("SELECT version FROM schema_version WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def get_schema_version(engine=None) -> int:
+    """Текущая версия схемы в базе"""
+    conn = (engine or get_engine()).raw_connection()
+    try:
+        cursor = conn.cursor()
+        try:
+            return _read_version(cursor)
+        except psycopg2.errors.UndefinedTable:
+            conn.rollback()
+            return 0
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+
+def run_migrations(engine=None) -> int:
+    """Применить недостающие миграции, вернуть итоговую версию схемы"""
+    engine = engine or get_engine()
+
+    # Быстрый путь: одна строка, никаких блокировок и рефлексии схемы
+    current = get_schema_version(engine)
+    if current >= LATEST_VERSION:
+        return current
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL,
+                    applied_at TIMESTAMP DEFAULT NOW()
+                )
+            """)
+
+            # Перечитываем под блокировкой: другой процесс мог уже мигрировать
+            current = _read_version(cursor)
+            for version, description, sql in MIGRATIONS:
+                if version <= current:
+                    continue
+                logger.info(f"🛠️ Миграция {version}: {description}")
+                cursor.execute(sql)
+                current = version
+
+            cursor.execute("""
+                INSERT INTO schema_version (id, version, applied_at)
+                VALUES (1, %s, NOW())
+                ON CONFLICT (id) DO UPDATE
+                SET version = EXCLUDED.version, applied_at = EXCLUDED.applied_at
+            """, (current,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+    finally:
+        conn.close()
+
+    return current
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(f"Версия схемы: {run_migrations()}")
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship, declarative_base
 import enum
 
@@ -119,7 +119,11 @@ class Task(Base):
 
 # Модели для уведомлений и подписок
 class Notification(Base):
-    """Модель уведомления"""
+    """Модель уведомления
+
+    Таблица секционирована по месяцам scheduled_time (см. migrations.py,
+    notification_partitions.py); id уникален благодаря общей последовательности.
+    """
     __tablename__ = 'notifications'
     
     id = Column(Integer, primary_key=True)
@@ -141,5 +145,19 @@ class Subscription(Base):
     notify_reminders = Column(Boolean, default=True)
     notify_alerts = Column(Boolean, default=True)
     hours_before = Column(Integer, default=24)  # За сколько часов уведомлять
-    created_at = Column(Integer, default=datetime.now)
-    updated_at = Column(Integer, default=datetime.now, onupdate=datetime.now)
\ No newline at end of file
+    scoped = Column(Boolean, default=False, nullable=False)  # Только по областям (subscription_scopes)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class SubscriptionScope(Base):
+    """Область подписки: конкретный заказ, клиент или маршрут"""
+    __tablename__ = 'subscription_scopes'
+    __table_args__ = (
+        UniqueConstraint('chat_id', 'scope_type', 'scope_value'),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    chat_id = Column(String(100), ForeignKey('subscriptions.chat_id', ondelete='CASCADE'), nullable=False)
+    scope_type = Column(String(20), nullable=False)  # 'order', 'client', 'route'
+    scope_value = Column(String(200), nullable=False)  # нормализованное значение
+    created_at = Column(DateTime, default=datetime.now)
\ No newline at end of file
@@ -0,0 +1,171 @@
+import os
+import re
+import gzip
+import logging
+from datetime import date
+from typing import List, Optional, Tuple
+
+from database import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Сколько месяцев истории хранить в базе (текущий месяц не считается)
+RETENTION_MONTHS = int(os.getenv('NOTIFICATION_RETENTION_MONTHS', '6'))
+
+# Схема, куда переносятся отсоединенные секции: история остается в базе
+ARCHIVE_SCHEMA = os.getenv('NOTIFICATION_ARCHIVE_SCHEMA', 'notifications_archive')
+
+# Каталог для выгрузки архивных секций в *.csv.gz с последующим удалением
+# таблиц. Только долговременное хранилище (подключенный том): диск
+# контейнера Railway очищается при каждом деплое. Не задан — секции
+# остаются в ARCHIVE_SCHEMA и не удаляются
+ARCHIVE_DIR = os.getenv('NOTIFICATION_ARCHIVE_DIR', '')
+
+# Сколько месяцев вперед держать готовые секции
+MONTHS_AHEAD = 3
+
+PARTITION_NAME_RE = re.compile(r'^notifications_y(\d{4})m(\d{2})$')
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"notifications_y{month.year:04d}m{month.month:02d}"
+
+
+def _month_of(table_name: str) -> Optional[date]:
+    match = PARTITION_NAME_RE.match(table_name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def _list_partitions(cursor) -> List[Tuple[str, bool]]:
+    """Помесячные таблицы уведомлений в схеме notifications: (имя, присоединена ли)"""
+    cursor.execute("""
+        SELECT c.relname, i.inhparent IS NOT NULL
+        FROM pg_class c
+        LEFT JOIN pg_inherits i
+            ON i.inhrelid = c.oid AND i.inhparent = 'notifications'::regclass
+        WHERE c.relkind = 'r' AND c.relname LIKE 'notifications\\_y%'
+          AND c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = 'notifications'::regclass)
+    """)
+    return [(name, attached) for name, attached in cursor.fetchall() if _month_of(name)]
+
+
+def _list_archived(cursor, schema: str) -> List[str]:
+    """Секции, уже перенесенные в архивную схему"""
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind = 'r' AND n.nspname = %s AND c.relname LIKE 'notifications\\_y%%'
+    """, (schema,))
+    return sorted(name for name, in cursor.fetchall() if _month_of(name))
+
+
+def ensure_partitions(months_ahead: int = MONTHS_AHEAD, engine=None) -> List[str]:
+    """Создать секции на текущий и следующие месяцы"""
+    engine = engine or get_engine()
+    current = date.today().replace(day=1)
+    created = []
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        existing = {name for name, _ in _list_partitions(cursor)}
+        for offset in range(months_ahead + 1):
+            month = _add_months(current, offset)
+            name = partition_name(month)
+            if name in existing:
+                continue
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF notifications '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                (month, _add_months(month, 1))
+            )
+            created.append(name)
+        conn.commit()
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return created
+
+
+def _export_table(conn, schema: str, name: str, archive_dir: str) -> str:
+    """Выгрузить архивную таблицу в gzip CSV и удалить ее"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    tmp_path = path + ".tmp"
+
+    cursor = conn.cursor()
+    with gzip.open(tmp_path, 'wt', encoding='utf-8', newline='') as archive:
+        cursor.copy_expert(f'COPY "{schema}"."{name}" TO STDOUT WITH (FORMAT csv, HEADER true)', archive)
+    # Удаляем таблицу только после того, как архив целиком записан
+    os.replace(tmp_path, path)
+
+    cursor.execute(f'DROP TABLE "{schema}"."{name}"')
+    conn.commit()
+    cursor.close()
+    return path
+
+
+def archive_old_partitions(retention_months: int = RETENTION_MONTHS, schema: str = ARCHIVE_SCHEMA,
+                           archive_dir: str = ARCHIVE_DIR, engine=None) -> List[str]:
+    """Отсоединить секции старше срока хранения и перенести их в архивную схему
+
+    Перенос в схему меняет только метаданные: строки не переписываются и
+    остаются в базе. Если задан archive_dir (долговременное хранилище),
+    архивные таблицы дополнительно выгружаются в сжатые файлы и удаляются;
+    таблица, выгрузка которой не удалась, подхватывается при следующем запуске.
+    """
+    engine = engine or get_engine()
+    oldest_kept = _add_months(date.today().replace(day=1), -retention_months)
+    archived = []
+
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        partitions = _list_partitions(cursor)
+
+        expired = sorted(name for name, _ in partitions if _month_of(name) < oldest_kept)
+        if expired:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+        for name, attached in partitions:
+            if name in expired and attached:
+                # Отсоединение — изменение метаданных, строки не переписываются
+                cursor.execute(f'ALTER TABLE notifications DETACH PARTITION "{name}"')
+        for name in expired:
+            cursor.execute(f'ALTER TABLE "{name}" SET SCHEMA "{schema}"')
+            archived.append(f"{schema}.{name}")
+            logger.info(f"🗄️ Секция {name} перенесена в схему {schema}")
+        conn.commit()
+
+        if archive_dir:
+            for name in _list_archived(cursor, schema):
+                try:
+                    _export_table(conn, schema, name, archive_dir)
+                    logger.info(f"🗄️ Секция {name} выгружена в {archive_dir}")
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Ошибка выгрузки секции {name}: {e}")
+        cursor.close()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    return archived
+
+
+def run_maintenance() -> Tuple[List[str], List[str]]:
+    """Ежедневное обслуживание: новые секции вперед, старые — в архивную схему"""
+    return ensure_partitions(), archive_old_partitions()
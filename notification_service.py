@@ -1,38 +1,108 @@
 import os
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from sqlalchemy import create_engine, func, and_, or_
-from sqlalchemy.orm import sessionmaker
-from database import DatabaseManager
-from models import Notification, Subscription, Base, Order
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import func, and_, or_
+from database import DatabaseManager, get_engine, get_session_factory
+from models import Notification, Subscription, SubscriptionScope, Order
+from subscription_index import subscription_index, SubscriberSettings
+
+# Лимит длины сообщения Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Окно склейки: уведомления чата копятся, пока самое старое из них
+# не станет старше окна, затем уходят одним сообщением-дайджестом
+DIGEST_WINDOW_SECONDS = int(os.getenv('NOTIFICATION_DIGEST_WINDOW', '60'))
+DIGEST_SEPARATOR = "\n➖➖➖➖➖➖➖➖\n"
+
+
+def split_digest(messages: List[str], ids: List[int],
+                 limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[Tuple[str, List[int]]]:
+    """Склеить сообщения в минимальное число частей не длиннее limit
+
+    Части режутся только между сообщениями; сообщение длиннее лимита
+    само по себе делится на куски. Возвращает (текст части, id
+    уведомлений, которые этой частью доставлены полностью): после
+    отправки части ее id можно отмечать, не дожидаясь остальных.
+    Пустые сообщения не отправляются, их id идут с ближайшей частью;
+    если непустых сообщений нет, частей нет.
+    """
+    messages = [message.strip() for message in messages]
+    if len(messages) == 1 and messages[0] and len(messages[0]) <= limit:
+        return [(messages[0], list(ids))]
+
+    header = f"🔔 *Уведомления ({sum(1 for message in messages if message)})*\n"
+    parts = []
+    current = header
+    current_ids = []
+    has_content = False
+    for message, notification_id in zip(messages, ids):
+        for i in range(0, len(message), limit):
+            chunk = message[i:i + limit]
+            glue = DIGEST_SEPARATOR if has_content else ""
+            if len(current) + len(glue) + len(chunk) <= limit:
+                current += glue + chunk
+            elif has_content:
+                parts.append((current, current_ids))
+                current = chunk
+                current_ids = []
+            else:
+                # Заголовок не помещается вместе с первым сообщением
+                current = chunk
+            has_content = True
+        current_ids.append(notification_id)
+    if has_content:
+        parts.append((current, current_ids))
+    return parts
+
 
 class NotificationService:
-    """Сервис уведомлений"""
+    """Сервис уведомлений
+
+    Не держит сессию ORM: каждая операция открывает свою сессию
+    (_session) и закрывает ее по завершении, так что загруженные
+    Notification и Subscription не копятся в identity map, а один
+    экземпляр сервиса можно использовать из разных потоков.
+    """
     
     def __init__(self):
-        self.database_url = os.getenv('DATABASE_URL')
-        self.engine = create_engine(self.database_url)
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
-        self.db_session = SessionLocal()
-        
-        # Создание таблиц если их нет
-        Base.metadata.create_all(bind=self.engine)
+        # Engine и пул соединений общие для всего процесса
+        self.engine = get_engine()
+        self._session_factory = get_session_factory()
         
+        # Схема создается версионированными миграциями (migrations.py),
+        # а не create_all при каждом создании сервиса
         self.db_manager = DatabaseManager()
     
+    @contextmanager
+    def _session(self):
+        """Сессия на одну операцию: commit при успехе, rollback при ошибке, затем close"""
+        session = self._session_factory()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    
     def get_upcoming_notifications(self) -> List[Dict]:
         """Получить предстоящие уведомления"""
         try:
             now = datetime.now()
             future = now + timedelta(minutes=5)  # Проверяем на 5 минут вперед
             
-            notifications = self.db_session.query(Notification).filter(
-                and_(
-                    Notification.scheduled_time >= now,
-                    Notification.scheduled_time <= future,
-                    Notification.sent == False
-                )
-            ).all()
+            with self._session() as session:
+                notifications = session.query(
+                    Notification.id, Notification.chat_id, Notification.message, Notification.scheduled_time
+                ).filter(
+                    and_(
+                        Notification.scheduled_time >= now,
+                        Notification.scheduled_time <= future,
+                        Notification.sent == False
+                    )
+                ).all()
             
             return [
                 {
@@ -48,182 +118,278 @@ class NotificationService:
             print(f"Error getting upcoming notifications: {e}")
             return []
     
-    def mark_notification_sent(self, notification_id: int) -> bool:
-        """Пометить уведомление как отправленное"""
+    def get_pending_digests(self, window_seconds: int = DIGEST_WINDOW_SECONDS, max_rows: int = 5000) -> List[Dict]:
+        """Готовые к отправке дайджесты: по одному на чат
+
+        Чат готов, когда его самое раннее наступившее уведомление ждет
+        дольше окна; тогда все его наступившие уведомления склеиваются.
+        """
         try:
-            notification = self.db_session.query(Notification).filter(
-                Notification.id == notification_id
-            ).first()
+            now = datetime.now()
+            cutoff = now - timedelta(seconds=window_seconds)
             
-            if notification:
-                notification.sent = True
-                self.db_session.commit()
-                return True
+            with self._session() as session:
+                ready_chats = session.query(Notification.chat_id).filter(
+                    Notification.sent == False,
+                    Notification.scheduled_time <= now
+                ).group_by(Notification.chat_id).having(
+                    func.min(Notification.scheduled_time) <= cutoff
+                )
+                
+                rows = session.query(
+                    Notification.id, Notification.chat_id, Notification.message
+                ).filter(
+                    Notification.sent == False,
+                    Notification.scheduled_time <= now,
+                    Notification.chat_id.in_(ready_chats)
+                ).order_by(
+                    Notification.chat_id, Notification.scheduled_time, Notification.id
+                ).limit(max_rows).all()
+            
+            digests = []
+            for row in rows:
+                if not digests or digests[-1]['chat_id'] != row.chat_id:
+                    digests.append({'chat_id': row.chat_id, 'ids': [], 'messages': []})
+                digests[-1]['ids'].append(row.id)
+                digests[-1]['messages'].append(row.message)
+            
+            for digest in digests:
+                digest['parts'] = split_digest(digest['messages'], digest['ids'])
+            return digests
+            
+        except Exception as e:
+            print(f"Error getting pending digests: {e}")
+            return []
+    
+    def mark_notifications_sent(self, notification_ids: List[int]) -> bool:
+        """Пометить пачку уведомлений как отправленные одним запросом"""
+        if not notification_ids:
+            return True
+        
+        try:
+            with self._session() as session:
+                session.query(Notification).filter(
+                    Notification.id.in_(notification_ids)
+                ).update({Notification.sent: True}, synchronize_session=False)
+            return True
+            
+        except Exception as e:
+            print(f"Error marking notifications as sent: {e}")
             return False
+    
+    def mark_notification_sent(self, notification_id: int) -> bool:
+        """Пометить уведомление как отправленное"""
+        try:
+            with self._session() as session:
+                updated = session.query(Notification).filter(
+                    Notification.id == notification_id
+                ).update({Notification.sent: True}, synchronize_session=False)
+            return bool(updated)
             
         except Exception as e:
             print(f"Error marking notification as sent: {e}")
-            self.db_session.rollback()
             return False
     
     def create_event_notification(self, order: Order, event_type: str, event_date: datetime) -> bool:
         """Создать уведомление о событии"""
         try:
-            # Получаем всех подписчиков
-            subscriptions = self.db_session.query(Subscription).filter(
-                Subscription.is_active == True,
-                Subscription.notify_events == True
-            ).all()
-            
-            for subscription in subscriptions:
-                message = self._format_event_message(order, event_type, event_date)
-                
-                notification = Notification(
-                    chat_id=subscription.chat_id,
-                    message=message,
-                    notification_type='event',
-                    scheduled_time=event_date,
-                    sent=False
-                )
-                
-                self.db_session.add(notification)
+            # Только подписчики, которым интересен этот заказ
+            recipients = self._get_recipients(order, 'notify_events')
+            if not recipients:
+                return True
             
-            self.db_session.commit()
+            message = self._format_event_message(order, event_type, event_date)
+            with self._session() as session:
+                session.add_all([
+                    Notification(
+                        chat_id=chat_id,
+                        message=message,
+                        notification_type='event',
+                        scheduled_time=event_date,
+                        sent=False
+                    )
+                    for chat_id, _ in recipients
+                ])
             return True
             
         except Exception as e:
             print(f"Error creating event notification: {e}")
-            self.db_session.rollback()
             return False
     
     def create_reminder_notification(self, order: Order, event_type: str, event_date: datetime) -> bool:
         """Создать напоминание о предстоящем событии"""
         try:
-            # Получаем подписчиков с настройками напоминаний
-            subscriptions = self.db_session.query(Subscription).filter(
-                Subscription.is_active == True,
-                Subscription.notify_reminders == True
-            ).all()
-            
-            for subscription in subscriptions:
-                # Рассчитываем время напоминания
-                reminder_time = event_date - timedelta(hours=subscription.hours_before)
-                
-                # Создаем напоминание только если оно в будущем
-                if reminder_time > datetime.now():
-                    message = self._format_reminder_message(order, event_type, event_date, subscription.hours_before)
-                    
-                    notification = Notification(
-                        chat_id=subscription.chat_id,
-                        message=message,
-                        notification_type='reminder',
-                        scheduled_time=reminder_time,
-                        sent=False
-                    )
-                    
-                    self.db_session.add(notification)
+            # Подписчики с настройками напоминаний, которым интересен этот заказ
+            recipients = self._get_recipients(order, 'notify_reminders')
             
-            self.db_session.commit()
+            with self._session() as session:
+                for chat_id, settings in recipients:
+                    # Рассчитываем время напоминания
+                    reminder_time = event_date - timedelta(hours=settings.hours_before)
+                    
+                    # Создаем напоминание только если оно в будущем
+                    if reminder_time > datetime.now():
+                        message = self._format_reminder_message(order, event_type, event_date, settings.hours_before)
+                        
+                        session.add(Notification(
+                            chat_id=chat_id,
+                            message=message,
+                            notification_type='reminder',
+                            scheduled_time=reminder_time,
+                            sent=False
+                        ))
             return True
             
         except Exception as e:
             print(f"Error creating reminder notification: {e}")
-            self.db_session.rollback()
             return False
     
     def create_alert_notification(self, order: Order, alert_type: str, alert_message: str) -> bool:
         """Создать оповещение об изменении статуса или проблеме"""
+        return self.create_alert_notifications([(order, alert_type, alert_message)])
+    
+    def create_alert_notifications(self, alerts: List[Tuple[Order, str, str]]) -> bool:
+        """Создать оповещения по нескольким заказам одной транзакцией
+
+        alerts — список (заказ, тип оповещения, текст).
+        """
         try:
-            subscriptions = self.db_session.query(Subscription).filter(
-                Subscription.is_active == True,
-                Subscription.notify_alerts == True
-            ).all()
-            
-            for subscription in subscriptions:
+            now = datetime.now()
+            notifications = []
+            for order, alert_type, alert_message in alerts:
+                recipients = self._get_recipients(order, 'notify_alerts')
+                if not recipients:
+                    continue
                 message = self._format_alert_message(order, alert_type, alert_message)
-                
-                notification = Notification(
-                    chat_id=subscription.chat_id,
-                    message=message,
-                    notification_type='alert',
-                    scheduled_time=datetime.now(),
-                    sent=False
+                notifications.extend(
+                    Notification(
+                        chat_id=chat_id,
+                        message=message,
+                        notification_type='alert',
+                        scheduled_time=now,
+                        sent=False
+                    )
+                    for chat_id, _ in recipients
                 )
-                
-                self.db_session.add(notification)
             
-            self.db_session.commit()
+            if notifications:
+                with self._session() as session:
+                    session.add_all(notifications)
             return True
             
         except Exception as e:
             print(f"Error creating alert notification: {e}")
-            self.db_session.rollback()
             return False
     
+    def _ensure_subscription_index(self):
+        """Загрузить индекс подписок при первом обращении"""
+        if not subscription_index.loaded:
+            with self._session() as session:
+                subscription_index.load(
+                    session.query(Subscription).all(),
+                    session.query(SubscriptionScope).all()
+                )
+    
+    def _get_recipients(self, order: Order, flag: str):
+        """Получатели события по заказу из инвертированного индекса"""
+        self._ensure_subscription_index()
+        return subscription_index.match(order, flag)
+    
+    @staticmethod
+    def _index_settings(subscription: Subscription) -> Optional[SubscriberSettings]:
+        """Настройки подписки для индекса (None для неактивной)"""
+        if not subscription.is_active:
+            return None
+        return SubscriberSettings(
+            bool(subscription.notify_events),
+            bool(subscription.notify_reminders),
+            bool(subscription.notify_alerts),
+            subscription.hours_before or 24
+        )
+    
+    @staticmethod
+    def _activate_subscription(session, chat_id: str) -> Subscription:
+        """Активная подписка чата (создается при первом обращении)"""
+        subscription = session.query(Subscription).filter(
+            Subscription.chat_id == chat_id
+        ).first()
+        
+        if subscription:
+            subscription.is_active = True
+            subscription.updated_at = datetime.now()
+        else:
+            subscription = Subscription(
+                chat_id=chat_id,
+                is_active=True,
+                notify_events=True,
+                notify_reminders=True,
+                notify_alerts=True,
+                hours_before=24,
+                scoped=False
+            )
+            session.add(subscription)
+        return subscription
+    
     def subscribe_user(self, chat_id: str) -> bool:
-        """Подписать пользователя на уведомления"""
+        """Подписать пользователя на уведомления
+
+        Чат без областей подписки снова получает уведомления по всем заказам.
+        """
         try:
-            existing = self.db_session.query(Subscription).filter(
-                Subscription.chat_id == chat_id
-            ).first()
+            with self._session() as session:
+                subscription = self._activate_subscription(session, chat_id)
+                subscription.scoped = session.query(SubscriptionScope.id).filter(
+                    SubscriptionScope.chat_id == chat_id
+                ).first() is not None
+                # После commit объект истекает вместе с сессией: настройки берем до него
+                settings = self._index_settings(subscription)
+                scoped = subscription.scoped
             
-            if existing:
-                existing.is_active = True
-                existing.updated_at = datetime.now()
-            else:
-                subscription = Subscription(
-                    chat_id=chat_id,
-                    is_active=True,
-                    notify_events=True,
-                    notify_reminders=True,
-                    notify_alerts=True,
-                    hours_before=24
-                )
-                self.db_session.add(subscription)
-            
-            self.db_session.commit()
+            self._ensure_subscription_index()
+            subscription_index.set_subscription(chat_id, settings, scoped)
             return True
             
         except Exception as e:
             print(f"Error subscribing user: {e}")
-            self.db_session.rollback()
             return False
     
     def unsubscribe_user(self, chat_id: str) -> bool:
         """Отписать пользователя от уведомлений"""
         try:
-            subscription = self.db_session.query(Subscription).filter(
-                Subscription.chat_id == chat_id
-            ).first()
-            
-            if subscription:
+            with self._session() as session:
+                subscription = session.query(Subscription).filter(
+                    Subscription.chat_id == chat_id
+                ).first()
+                
+                if not subscription:
+                    return False
                 subscription.is_active = False
                 subscription.updated_at = datetime.now()
-                self.db_session.commit()
-                return True
             
-            return False
+            subscription_index.set_subscription(chat_id, None)
+            return True
             
         except Exception as e:
             print(f"Error unsubscribing user: {e}")
-            self.db_session.rollback()
             return False
     
     def get_user_settings(self, chat_id: str) -> Optional[Dict]:
         """Получить настройки пользователя"""
         try:
-            subscription = self.db_session.query(Subscription).filter(
-                Subscription.chat_id == chat_id
-            ).first()
-            
-            if subscription:
-                return {
-                    'is_active': subscription.is_active,
-                    'notify_events': subscription.notify_events,
-                    'notify_reminders': subscription.notify_reminders,
-                    'notify_alerts': subscription.notify_alerts,
-                    'hours_before': subscription.hours_before
-                }
+            with self._session() as session:
+                subscription = session.query(Subscription).filter(
+                    Subscription.chat_id == chat_id
+                ).first()
+                
+                if subscription:
+                    return {
+                        'is_active': subscription.is_active,
+                        'notify_events': subscription.notify_events,
+                        'notify_reminders': subscription.notify_reminders,
+                        'notify_alerts': subscription.notify_alerts,
+                        'hours_before': subscription.hours_before,
+                        'scoped': bool(subscription.scoped)
+                    }
             
             return None
             
@@ -234,26 +400,87 @@ class NotificationService:
     def update_user_settings(self, chat_id: str, settings: Dict) -> bool:
         """Обновить настройки пользователя"""
         try:
-            subscription = self.db_session.query(Subscription).filter(
-                Subscription.chat_id == chat_id
-            ).first()
-            
-            if subscription:
+            with self._session() as session:
+                subscription = session.query(Subscription).filter(
+                    Subscription.chat_id == chat_id
+                ).first()
+                
+                if not subscription:
+                    return False
                 for key, value in settings.items():
                     if hasattr(subscription, key):
                         setattr(subscription, key, value)
                 
                 subscription.updated_at = datetime.now()
-                self.db_session.commit()
-                return True
+                index_settings = self._index_settings(subscription)
             
-            return False
+            subscription_index.set_subscription(chat_id, index_settings)
+            return True
             
         except Exception as e:
             print(f"Error updating user settings: {e}")
-            self.db_session.rollback()
             return False
     
+    def add_subscription_scope(self, chat_id: str, scope_type: str, value: str) -> bool:
+        """Подписать чат на конкретный заказ, клиента или маршрут"""
+        try:
+            scope_type, scope_value = subscription_index.scope_key(scope_type, value)
+            
+            with self._session() as session:
+                # Область возможна только у активной подписки, и с ней
+                # чат получает уведомления только по своим областям
+                subscription = self._activate_subscription(session, chat_id)
+                subscription.scoped = True
+                settings = self._index_settings(subscription)
+                session.flush()
+                
+                existing = session.query(SubscriptionScope).filter(
+                    SubscriptionScope.chat_id == chat_id,
+                    SubscriptionScope.scope_type == scope_type,
+                    SubscriptionScope.scope_value == scope_value
+                ).first()
+                
+                if not existing:
+                    session.add(SubscriptionScope(
+                        chat_id=chat_id,
+                        scope_type=scope_type,
+                        scope_value=scope_value
+                    ))
+            
+            self._ensure_subscription_index()
+            subscription_index.set_subscription(chat_id, settings, scoped=True)
+            subscription_index.add_scope(chat_id, scope_type, scope_value)
+            return True
+            
+        except Exception as e:
+            print(f"Error adding subscription scope: {e}")
+            return False
+    
+    def remove_subscription_scope(self, chat_id: str, scope_type: str, value: str) -> bool:
+        """Убрать область подписки"""
+        try:
+            scope_type, scope_value = subscription_index.scope_key(scope_type, value)
+            
+            with self._session() as session:
+                deleted = session.query(SubscriptionScope).filter(
+                    SubscriptionScope.chat_id == chat_id,
+                    SubscriptionScope.scope_type == scope_type,
+                    SubscriptionScope.scope_value == scope_value
+                ).delete(synchronize_session=False)
+            
+            self._ensure_subscription_index()
+            subscription_index.remove_scope(chat_id, scope_type, scope_value)
+            return bool(deleted)
+            
+        except Exception as e:
+            print(f"Error removing subscription scope: {e}")
+            return False
+    
+    def get_subscription_scopes(self, chat_id: str) -> List[Tuple[str, str]]:
+        """Области подписки чата: [(тип, значение)]"""
+        self._ensure_subscription_index()
+        return subscription_index.scopes_for(chat_id)
+    
     def check_and_create_notifications(self):
         """Проверить и создать уведомления о предстоящих событиях"""
         try:
@@ -264,13 +491,13 @@ class NotificationService:
             events = self.db_manager.get_upcoming_events(from_date, to_date)
             
             for event in events:
-                order = self.db_manager.get_order_by_number(event['order_number'])
+                order = self.db_manager.get_order_by_number(event.order_number)
                 if order:
                     # Создаем уведомление о событии
-                    self.create_event_notification(order, event['event_type'], event['event_date'])
+                    self.create_event_notification(order, event.event_type, event.event_date)
                     
                     # Создаем напоминание
-                    self.create_reminder_notification(order, event['event_type'], event['event_date'])
+                    self.create_reminder_notification(order, event.event_type, event.event_date)
             
             return True
             
@@ -345,9 +572,5 @@ class NotificationService:
         """
     
     def close(self):
-        """Закрыть соединения"""
-        try:
-            self.db_session.close()
-            self.db_manager.close()
-        except:
-            pass
\ No newline at end of file
+        """Совместимость: сессии закрываются после каждой операции"""
+        pass
\ No newline at end of file
@@ -13,8 +13,18 @@ from reportlab.graphics.charts.barcharts import VerticalBarChart
 from reportlab.graphics.charts.piecharts import Pie
 from reportlab.graphics.charts.legends import Legend
 
+from typing import Optional, Sequence, Union
+
 from models import Order
 from database import DatabaseManager
+from rows import OrderView
+
+# Цвета секторов и столбцов диаграмм
+CHART_COLORS = [
+    colors.HexColor('#3498DB'), colors.HexColor('#27AE60'), colors.HexColor('#E67E22'),
+    colors.HexColor('#9B59B6'), colors.HexColor('#E74C3C'), colors.HexColor('#1ABC9C'),
+    colors.HexColor('#F1C40F'), colors.HexColor('#34495E'),
+]
 
 # Регистрация шрифтов (если нужны кириллические шрифты)
 try:
@@ -26,8 +36,15 @@ class PDFGenerator:
     """Генератор PDF отчетов"""
     
     @staticmethod
-    def generate_order_pdf(order: Order) -> bytes:
-        """Сгенерировать PDF отчет по заказу"""
+    def generate_order_pdf(order: Union[Order, OrderView], containers: Optional[Sequence] = None) -> bytes:
+        """Сгенерировать PDF отчет по заказу
+
+        Для строки OrderView контейнеры передаются отдельно
+        (DatabaseManager.get_order_containers), у ORM Order они берутся из связи.
+        """
+        if containers is None:
+            containers = getattr(order, 'containers', None) or []
+
         buffer = io.BytesIO()
         
         # Создаем документ
@@ -145,13 +162,13 @@ class PDFGenerator:
         story.append(Spacer(1, 20))
         
         # Контейнеры
-        if order.containers:
+        if containers:
             story.append(Paragraph("<b>КОНТЕЙНЕРЫ</b>", heading_style))
             
             container_headers = ["Контейнер", "Тип", "Вес (кг)", "Объем (м³)"]
             container_data = [container_headers]
             
-            for container in order.containers:
+            for container in containers:
                 container_data.append([
                     container.container_number,
                     container.container_type,
@@ -172,11 +189,11 @@ class PDFGenerator:
             story.append(container_table)
             
             # Итоги по контейнерам
-            total_weight = sum(c.weight for c in order.containers)
-            total_volume = sum(c.volume for c in order.containers)
+            total_weight = sum(c.weight or 0 for c in containers)
+            total_volume = sum(c.volume or 0 for c in containers)
             
             totals = Paragraph(
-                f"<b>Итого:</b> {len(order.containers)} контейнеров, "
+                f"<b>Итого:</b> {len(containers)} контейнеров, "
                 f"{total_weight:.0f} кг, {total_volume:.1f} м³",
                 normal_style
             )
@@ -235,15 +252,76 @@ class PDFGenerator:
         return buffer.getvalue()
     
     @staticmethod
-    def generate_summary_pdf(days: int = 30) -> bytes:
-        """Сгенерировать сводный PDF отчет"""
+    def _status_chart(status_counts: Sequence) -> Drawing:
+        """Круговая диаграмма заказов по статусам с легендой"""
+        drawing = Drawing(16*cm, 6*cm)
+        pie = Pie()
+        pie.x, pie.y = 0.5*cm, 0.3*cm
+        pie.width = pie.height = 5.4*cm
+        pie.data = [row.order_count for row in status_counts]
+        pie.labels = [str(row.order_count) for row in status_counts]
+        pie.slices.strokeColor = colors.white
+        for i in range(len(status_counts)):
+            pie.slices[i].fillColor = CHART_COLORS[i % len(CHART_COLORS)]
+        drawing.add(pie)
+        
+        legend = Legend()
+        legend.x, legend.y = 7*cm, 5.5*cm
+        legend.fontSize = 8
+        legend.alignment = 'right'
+        legend.colorNamePairs = [
+            (CHART_COLORS[i % len(CHART_COLORS)], f"{row.status} ({row.order_count})")
+            for i, row in enumerate(status_counts)
+        ]
+        drawing.add(legend)
+        return drawing
+    
+    @staticmethod
+    def _volume_chart(series: Sequence, label_format: str) -> Drawing:
+        """Столбцы: контейнеры и объем (м³) по дням или неделям"""
+        drawing = Drawing(24*cm, 7*cm)
+        chart = VerticalBarChart()
+        chart.x, chart.y = 1.5*cm, 1*cm
+        chart.width, chart.height = 17*cm, 5.5*cm
+        chart.data = [
+            [int(row.containers) for row in series],
+            [round(float(row.volume), 1) for row in series],
+        ]
+        chart.categoryAxis.categoryNames = [row.bucket.strftime(label_format) for row in series]
+        chart.categoryAxis.labels.fontSize = 7
+        chart.categoryAxis.labels.angle = 30 if len(series) > 8 else 0
+        chart.categoryAxis.labels.boxAnchor = 'ne' if len(series) > 8 else 'n'
+        chart.valueAxis.valueMin = 0
+        chart.valueAxis.labels.fontSize = 7
+        chart.bars[0].fillColor = CHART_COLORS[0]
+        chart.bars[1].fillColor = CHART_COLORS[2]
+        drawing.add(chart)
+        
+        legend = Legend()
+        legend.x, legend.y = 19.5*cm, 6*cm
+        legend.fontSize = 8
+        legend.alignment = 'right'
+        legend.colorNamePairs = [(CHART_COLORS[0], "Контейнеры"), (CHART_COLORS[2], "Объем, м³")]
+        drawing.add(legend)
+        return drawing
+    
+    @staticmethod
+    def generate_summary_pdf(days: int = 30, db: DatabaseManager = None) -> bytes:
+        """Сгенерировать сводный PDF отчет с диаграммами статусов и объемов
+
+        Готовые отчеты за 7/30/90 дней хранит summary_reports.
+        """
         buffer = io.BytesIO()
         
-        # Получаем статистику
-        db = DatabaseManager()
+        # Получаем статистику (DatabaseManager работает поверх общего пула)
+        db = db or DatabaseManager()
         stats = db.get_statistics(days)
         active_orders = db.get_active_orders()
-        recent_orders = db.get_all_orders()[:10]  # Последние 10 заказов
+        recent_orders = db.get_recent_orders(10)
+        status_counts = db.get_period_status_counts(days)
+        # Короткий период — по дням, длинный — по неделям
+        bucket, label_format = ('day', '%d.%m') if days <= 14 else ('week', 'нед. %d.%m')
+        series = db.get_summary_series(days, bucket)
         
         # Создаем документ
         doc = SimpleDocTemplate(
@@ -312,6 +390,17 @@ class PDFGenerator:
         story.append(stats_table)
         story.append(Spacer(1, 30))
         
+        # Диаграммы
+        if status_counts:
+            story.append(Paragraph("<b>ЗАКАЗЫ ПО СТАТУСАМ</b>", heading_style))
+            story.append(PDFGenerator._status_chart(status_counts))
+            story.append(Spacer(1, 20))
+        if series:
+            period_name = "ДНЯМ" if bucket == 'day' else "НЕДЕЛЯМ"
+            story.append(Paragraph(f"<b>КОНТЕЙНЕРЫ И ОБЪЕМ ПО {period_name}</b>", heading_style))
+            story.append(PDFGenerator._volume_chart(series, label_format))
+            story.append(Spacer(1, 30))
+        
         # Активные заказы
         story.append(Paragraph(f"<b>АКТИВНЫЕ ЗАКАЗЫ ({len(active_orders)})</b>", heading_style))
         
@@ -398,10 +487,10 @@ class PDFGenerator:
         return buffer.getvalue()
 
 # Функции для экспорта
-def generate_order_pdf(order: Order) -> bytes:
+def generate_order_pdf(order: Union[Order, OrderView], containers: Optional[Sequence] = None) -> bytes:
     """Сгенерировать PDF для заказа"""
-    return PDFGenerator.generate_order_pdf(order)
+    return PDFGenerator.generate_order_pdf(order, containers)
 
-def generate_summary_pdf(days: int = 30) -> bytes:
+def generate_summary_pdf(days: int = 30, db: DatabaseManager = None) -> bytes:
     """Сгенерировать сводный PDF отчет"""
-    return PDFGenerator.generate_summary_pdf(days)
\ No newline at end of file
+    return PDFGenerator.generate_summary_pdf(days, db)
\ No newline at end of file
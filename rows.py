@@ -0,0 +1,73 @@
+from operator import itemgetter
+from typing import Dict, Iterable, List, Sequence, Tuple, Type
+
+# Типы строк по набору колонок: (базовый класс, колонки) -> класс
+_view_types: Dict[Tuple[type, Tuple[str, ...]], type] = {}
+
+
+class RowView(tuple):
+    """Компактная строка результата запроса
+
+    Это кортеж значений (без словаря на строку) с доступом к колонкам
+    по имени атрибута: row.order_number. Класс строки создается один раз
+    на набор колонок, сами строки строятся прямо из кортежей курсора.
+    """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+    _index: Dict[str, int] = {}
+
+    def get(self, name: str, default=None):
+        """Значение колонки или default, если такой колонки нет"""
+        i = self._index.get(name)
+        return default if i is None else self[i]
+
+    def _asdict(self) -> Dict:
+        return dict(zip(self._fields, self))
+
+    def _replace(self, **changes) -> 'RowView':
+        values = list(self)
+        for name, value in changes.items():
+            values[self._index[name]] = value
+        return tuple.__new__(type(self), values)
+
+    def __repr__(self) -> str:
+        values = ', '.join(f"{name}={value!r}" for name, value in zip(self._fields, self))
+        return f"{type(self).__name__}({values})"
+
+
+class OrderView(RowView):
+    """Строка заказа (SELECT из orders, в т.ч. с вычисляемыми колонками)"""
+
+    __slots__ = ()
+
+
+def view_type(columns: Sequence[str], base: Type[RowView] = RowView) -> Type[RowView]:
+    """Класс строки для набора колонок (кэшируется)"""
+    columns = tuple(columns)
+    key = (base, columns)
+    cls = _view_types.get(key)
+    if cls is None:
+        namespace = {
+            '__slots__': (),
+            '_fields': columns,
+            '_index': {name: i for i, name in enumerate(columns)},
+        }
+        for i, name in enumerate(columns):
+            # Имена, совпадающие с методами кортежа, доступны через get()
+            if not name.startswith('_') and not hasattr(base, name):
+                namespace[name] = property(itemgetter(i), doc=name)
+        cls = _view_types[key] = type(base.__name__, (base,), namespace)
+    return cls
+
+
+def make_rows(columns: Sequence[str], rows: Iterable[tuple], base: Type[RowView] = RowView) -> List[RowView]:
+    """Обернуть кортежи курсора в строки с доступом по имени"""
+    cls = view_type(columns, base)
+    new = tuple.__new__
+    return [new(cls, row) for row in rows]
+
+
+def make_row(columns: Sequence[str], values: Sequence, base: Type[RowView] = RowView) -> RowView:
+    """Одна строка из значений (например, из словаря или ORM объекта)"""
+    return tuple.__new__(view_type(columns, base), values)
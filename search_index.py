@@ -0,0 +1,163 @@
+import bisect
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from rows import OrderView, make_row
+
+# Перекрытие окна инкрементального обновления: строки, закоммиченные
+# чуть позже своего updated_at, не теряются (повторный upsert безвреден)
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+# Колонки краткой записи заказа (их же отдает get_orders_updated_since)
+SUMMARY_COLUMNS = ('order_number', 'client_name', 'status', 'route', 'container_count', 'updated_at')
+
+
+def normalize_key(text: str) -> str:
+    """Ключ индекса: регистронезависимый, без лишних пробелов"""
+    return ' '.join((text or '').split()).casefold()
+
+
+class OrderSearchIndex:
+    """Отсортированный индекс префиксов номеров заказов и имен клиентов в памяти
+
+    Поиск — бинарный поиск по отсортированному списку ключей, без запросов
+    к базе. Индекс загружается целиком при старте и затем обновляется
+    инкрементально по orders.updated_at.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[str, str]] = []  # (ключ, номер заказа), отсортировано
+        self._orders: Dict[str, OrderView] = {}  # номер заказа -> краткие данные
+        self._order_keys: Dict[str, Tuple[str, ...]] = {}
+        self.last_updated_at: Optional[datetime] = None
+        self.loaded = False
+
+    @staticmethod
+    def _keys_for(row: OrderView) -> Tuple[str, ...]:
+        """Ключи заказа: номер, имя клиента и каждое слово имени клиента"""
+        keys = {normalize_key(row.order_number)}
+        client = normalize_key(row.client_name or '')
+        if client:
+            keys.add(client)
+            keys.update(client.split())
+        return tuple(keys)
+
+    @staticmethod
+    def _summary(row: OrderView) -> OrderView:
+        """Краткие данные заказа для подсказки
+
+        Строки get_orders_updated_since уже краткие и хранятся как есть;
+        полная строка заказа сводится к колонкам SUMMARY_COLUMNS.
+        """
+        if row._fields == SUMMARY_COLUMNS:
+            return row
+        return make_row(SUMMARY_COLUMNS, [row.get(name) for name in SUMMARY_COLUMNS], OrderView)
+
+    def _remove_locked(self, order_number: str):
+        for key in self._order_keys.pop(order_number, ()):
+            entry = (key, order_number)
+            i = bisect.bisect_left(self._entries, entry)
+            if i < len(self._entries) and self._entries[i] == entry:
+                del self._entries[i]
+        self._orders.pop(order_number, None)
+
+    def _upsert_locked(self, row: OrderView):
+        order_number = row.order_number
+        self._remove_locked(order_number)
+
+        keys = self._keys_for(row)
+        for key in keys:
+            bisect.insort(self._entries, (key, order_number))
+        self._order_keys[order_number] = keys
+        self._orders[order_number] = self._summary(row)
+
+        updated_at = row.get('updated_at')
+        if updated_at and (self.last_updated_at is None or updated_at > self.last_updated_at):
+            self.last_updated_at = updated_at
+
+    def load(self, db) -> int:
+        """Полная загрузка индекса (также убирает удаленные заказы)"""
+        rows = db.get_orders_updated_since(None)
+
+        entries = []
+        orders = {}
+        order_keys = {}
+        last_updated_at = None
+        for row in rows:
+            keys = self._keys_for(row)
+            entries.extend((key, row.order_number) for key in keys)
+            order_keys[row.order_number] = keys
+            orders[row.order_number] = self._summary(row)
+            updated_at = row.updated_at
+            if updated_at and (last_updated_at is None or updated_at > last_updated_at):
+                last_updated_at = updated_at
+        entries.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._orders = orders
+            self._order_keys = order_keys
+            self.last_updated_at = last_updated_at
+            self.loaded = True
+        return len(orders)
+
+    def refresh(self, db) -> int:
+        """Инкрементальное обновление по orders.updated_at
+
+        Возвращает число заказов, которые действительно изменились: строки
+        из окна перекрытия REFRESH_OVERLAP, совпадающие с записью индекса,
+        не считаются.
+        """
+        if not self.loaded:
+            return self.load(db)
+
+        since = self.last_updated_at - REFRESH_OVERLAP if self.last_updated_at else None
+        rows = db.get_orders_updated_since(since)
+        changed = 0
+        with self._lock:
+            for row in rows:
+                if self._orders.get(row.order_number) == self._summary(row):
+                    continue
+                self._upsert_locked(row)
+                changed += 1
+        return changed
+
+    def upsert(self, row: OrderView):
+        """Обновить один заказ (например, после локального изменения)"""
+        with self._lock:
+            self._upsert_locked(row)
+
+    def remove(self, order_number: str):
+        """Удалить заказ из индекса"""
+        with self._lock:
+            self._remove_locked(order_number)
+
+    def search(self, prefix: str, limit: int = 10) -> List[OrderView]:
+        """Заказы, у которых номер, имя клиента или слово имени начинается с prefix"""
+        key = normalize_key(prefix)
+        if not key:
+            return []
+
+        results = []
+        seen = set()
+        with self._lock:
+            i = bisect.bisect_left(self._entries, (key, ''))
+            while i < len(self._entries) and len(results) < limit:
+                entry_key, order_number = self._entries[i]
+                if not entry_key.startswith(key):
+                    break
+                if order_number not in seen:
+                    seen.add(order_number)
+                    results.append(self._orders[order_number])
+                i += 1
+        return results
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+
+# Индекс процесса
+order_search_index = OrderSearchIndex()
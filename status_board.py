@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+from circuit_breaker import current_report, track_stale
+
+# Сколько секунд считать счетчики доски статусов свежими
+STATUS_BOARD_TTL = float(os.getenv('STATUS_BOARD_TTL', '30'))
+
+
+class StatusCount(NamedTuple):
+    """Счетчики одного статуса"""
+    orders: int
+    containers: int
+
+
+class StatusCountsCache:
+    """Кэш счетчиков заказов по статусам
+
+    Доска статусов строится одним GROUP BY запросом; результат живет
+    STATUS_BOARD_TTL секунд, так что повторные /status и нажатия кнопок
+    в этом окне обходятся без базы.
+    """
+
+    def __init__(self, ttl: float = STATUS_BOARD_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counts: Dict[str, StatusCount] = {}
+        self._loaded_at: Optional[float] = None
+
+    def get(self, db) -> Dict[str, StatusCount]:
+        """Счетчики по статусам (из кэша или одним запросом)"""
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._counts
+
+        outer = current_report()
+        with track_stale() as reads:
+            rows = db.get_status_counts()
+        counts = {
+            row.status: StatusCount(int(row.order_count), int(row.container_count))
+            for row in rows
+        }
+        if outer is not None:
+            # Вызывающий код тоже должен узнать об устаревших данных или сбое
+            outer.unavailable = outer.unavailable or reads.unavailable
+            if reads.stale:
+                outer.mark_stale(reads.fetched_at)
+        if reads.unavailable or reads.stale:
+            # Пустой ответ при недоступной базе или старые данные не кэшируем:
+            # следующий запрос снова пойдет в базу
+            return counts
+
+        with self._lock:
+            self._counts = counts
+            self._loaded_at = time.monotonic()
+        return counts
+
+    def invalidate(self):
+        """Сбросить кэш (например, после изменения заказов)"""
+        with self._lock:
+            self._loaded_at = None
+
+
+# Кэш процесса
+status_counts = StatusCountsCache()
@@ -0,0 +1,148 @@
+import threading
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from search_index import normalize_key
+
+# Типы областей подписки и атрибут заказа, с которым они сравниваются
+SCOPE_TYPES = {
+    'order': 'order_number',
+    'client': 'client_name',
+    'route': 'route',
+}
+
+
+class SubscriberSettings(NamedTuple):
+    """Настройки активного подписчика, нужные для рассылки"""
+    notify_events: bool
+    notify_reminders: bool
+    notify_alerts: bool
+    hours_before: int
+
+
+class SubscriptionIndex:
+    """Инвертированный индекс подписок: (тип, значение) -> chat_id
+
+    Подписчик без областей получает все события (как раньше). Подписчик
+    с областями получает только события своих заказов, клиентов и
+    маршрутов; после удаления последней области он остается в этом
+    режиме (ничего не получает), пока снова не подпишется на все. Подбор получателей стоит пропорционально числу
+    заинтересованных чатов, а не числу всех подписчиков.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settings: Dict[str, SubscriberSettings] = {}
+        self._scopes_by_chat: Dict[str, Set[Tuple[str, str]]] = {}
+        self._chats_by_scope: Dict[Tuple[str, str], Set[str]] = {}
+        self._global: Set[str] = set()
+        # Чаты, подписанные только по областям (Subscription.scoped)
+        self._scoped: Set[str] = set()
+        self.loaded = False
+
+    @staticmethod
+    def scope_key(scope_type: str, value: str) -> Tuple[str, str]:
+        if scope_type not in SCOPE_TYPES:
+            raise ValueError(f"Неизвестный тип подписки: {scope_type}")
+        return scope_type, normalize_key(value)
+
+    def _refresh_global_locked(self, chat_id: str):
+        if chat_id in self._settings and chat_id not in self._scoped:
+            self._global.add(chat_id)
+        else:
+            self._global.discard(chat_id)
+
+    def load(self, subscriptions, scopes):
+        """Полная загрузка из ORM объектов Subscription и SubscriptionScope"""
+        settings = {}
+        scoped = set()
+        for subscription in subscriptions:
+            if subscription.scoped:
+                scoped.add(subscription.chat_id)
+            if subscription.is_active:
+                settings[subscription.chat_id] = SubscriberSettings(
+                    bool(subscription.notify_events),
+                    bool(subscription.notify_reminders),
+                    bool(subscription.notify_alerts),
+                    subscription.hours_before or 24
+                )
+
+        scopes_by_chat: Dict[str, Set[Tuple[str, str]]] = {}
+        chats_by_scope: Dict[Tuple[str, str], Set[str]] = {}
+        for scope in scopes:
+            key = (scope.scope_type, scope.scope_value)
+            scopes_by_chat.setdefault(scope.chat_id, set()).add(key)
+            chats_by_scope.setdefault(key, set()).add(scope.chat_id)
+            scoped.add(scope.chat_id)
+
+        with self._lock:
+            self._settings = settings
+            self._scopes_by_chat = scopes_by_chat
+            self._chats_by_scope = chats_by_scope
+            self._scoped = scoped
+            self._global = {chat_id for chat_id in settings if chat_id not in scoped}
+            self.loaded = True
+
+    def set_subscription(self, chat_id: str, settings: Optional[SubscriberSettings],
+                         scoped: Optional[bool] = None):
+        """Обновить настройки подписчика (None — подписка неактивна)
+
+        scoped — только по областям (None — не менять).
+        """
+        with self._lock:
+            if settings is None:
+                self._settings.pop(chat_id, None)
+            else:
+                self._settings[chat_id] = settings
+            if scoped is True:
+                self._scoped.add(chat_id)
+            elif scoped is False:
+                self._scoped.discard(chat_id)
+            self._refresh_global_locked(chat_id)
+
+    def add_scope(self, chat_id: str, scope_type: str, value: str):
+        key = self.scope_key(scope_type, value)
+        with self._lock:
+            self._scopes_by_chat.setdefault(chat_id, set()).add(key)
+            self._chats_by_scope.setdefault(key, set()).add(chat_id)
+            self._scoped.add(chat_id)
+            self._refresh_global_locked(chat_id)
+
+    def remove_scope(self, chat_id: str, scope_type: str, value: str):
+        key = self.scope_key(scope_type, value)
+        with self._lock:
+            self._scopes_by_chat.get(chat_id, set()).discard(key)
+            chats = self._chats_by_scope.get(key)
+            if chats is not None:
+                chats.discard(chat_id)
+                if not chats:
+                    del self._chats_by_scope[key]
+            # Последняя область не расширяет подписку до всех заказов
+
+    def match(self, order, flag: str) -> List[Tuple[str, SubscriberSettings]]:
+        """Получатели события по заказу
+
+        flag — поле SubscriberSettings ('notify_events', 'notify_reminders',
+        'notify_alerts'), которое должно быть включено у подписчика.
+        """
+        with self._lock:
+            chat_ids = set(self._global)
+            for scope_type, attribute in SCOPE_TYPES.items():
+                value = getattr(order, attribute, None)
+                if value:
+                    chat_ids |= self._chats_by_scope.get((scope_type, normalize_key(value)), set())
+
+            result = []
+            for chat_id in chat_ids:
+                settings = self._settings.get(chat_id)
+                if settings is not None and getattr(settings, flag):
+                    result.append((chat_id, settings))
+            return result
+
+    def scopes_for(self, chat_id: str) -> List[Tuple[str, str]]:
+        """Области подписки чата"""
+        with self._lock:
+            return sorted(self._scopes_by_chat.get(chat_id, set()))
+
+
+# Индекс процесса (общий для всех экземпляров NotificationService)
+subscription_index = SubscriptionIndex()
@@ -0,0 +1,140 @@
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Периоды готовых сводных отчетов, дней
+SUMMARY_PERIODS = (7, 30, 90)
+
+# Где хранить готовые PDF между перезапусками процесса
+REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'margiana_reports'))
+
+# Как часто проверять, не изменились ли данные отчетов, секунд
+REPORT_CHECK_SECONDS = int(os.getenv('REPORT_CHECK_SECONDS', '600'))
+
+
+class CachedReport(NamedTuple):
+    """Готовый сводный отчет"""
+    days: int
+    pdf: bytes
+    fingerprint: Optional[tuple]
+    day: date
+    built_at: datetime
+
+
+class SummaryReportCache:
+    """Готовые сводные PDF отчеты за 7/30/90 дней
+
+    Отчеты строятся ночью и при первом запросе за день, хранятся в памяти
+    и на диске (REPORT_CACHE_DIR). Перестраиваются только когда меняется
+    отпечаток данных (DatabaseManager.get_report_fingerprint) или
+    наступает новый день (окно периода сдвигается); пока данные не
+    менялись, запрос отчета отвечает готовым PDF без обращения к базе.
+    """
+
+    def __init__(self, directory: str = REPORT_CACHE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        # Не дает двум потокам строить один отчет одновременно
+        self._build_locks: Dict[int, threading.Lock] = {days: threading.Lock() for days in SUMMARY_PERIODS}
+        self._reports: Dict[int, CachedReport] = {}
+        # Периоды, по которым пришли изменения данных после построения
+        self._dirty: set = set()
+
+    def _paths(self, days: int) -> Tuple[str, str]:
+        base = os.path.join(self.directory, f"summary_{days}d")
+        return base + '.pdf', base + '.json'
+
+    def _load(self, days: int) -> Optional[CachedReport]:
+        """Отчет с диска (после перезапуска процесса)"""
+        pdf_path, meta_path = self._paths(days)
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(pdf_path, 'rb') as f:
+                pdf = f.read()
+            fingerprint = tuple(meta['fingerprint']) if meta.get('fingerprint') is not None else None
+            return CachedReport(days, pdf, fingerprint, date.fromisoformat(meta['day']),
+                                datetime.fromisoformat(meta['built_at']))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, report: CachedReport):
+        pdf_path, meta_path = self._paths(report.days)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Сначала PDF, затем метаданные: неполный отчет не будет принят за готовый
+            with open(pdf_path + '.tmp', 'wb') as f:
+                f.write(report.pdf)
+            os.replace(pdf_path + '.tmp', pdf_path)
+            with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'fingerprint': list(report.fingerprint) if report.fingerprint is not None else None,
+                    'day': report.day.isoformat(),
+                    'built_at': report.built_at.isoformat(),
+                }, f)
+            os.replace(meta_path + '.tmp', meta_path)
+        except OSError as e:
+            print(f"Не удалось сохранить отчет за {report.days} дней: {e}")
+
+    def _cached(self, days: int) -> Optional[CachedReport]:
+        with self._lock:
+            report = self._reports.get(days)
+        if report is None:
+            report = self._load(days)
+            if report is not None:
+                with self._lock:
+                    self._reports.setdefault(days, report)
+        return report
+
+    def _build(self, db, days: int, fingerprint: Optional[tuple]) -> CachedReport:
+        from pdf_generator import generate_summary_pdf
+
+        report = CachedReport(days, generate_summary_pdf(days, db), fingerprint, date.today(), datetime.now())
+        with self._lock:
+            self._reports[days] = report
+        self._save(report)
+        return report
+
+    def get(self, db, days: int) -> CachedReport:
+        """Готовый отчет; строится, только если его нет или он за прошлый день"""
+        report = self._cached(days)
+        if report is not None and report.day == date.today() and days not in self._dirty:
+            return report
+
+        with self._build_locks[days]:
+            # Пока ждали, отчет мог построить другой поток
+            report = self._cached(days)
+            if report is not None and report.day == date.today() and days not in self._dirty:
+                return report
+            self._dirty.discard(days)
+            fingerprint = db.get_report_fingerprint()
+            if report is not None and report.day == date.today() and report.fingerprint == fingerprint:
+                return report
+            return self._build(db, days, fingerprint)
+
+    def refresh(self, db, force: bool = False) -> List[int]:
+        """Перестроить отчеты, данные которых изменились (force — все); возвращает периоды"""
+        # Отпечаток снимается до построения: изменения во время построения
+        # попадут в следующую проверку
+        self._dirty.clear()
+        fingerprint = db.get_report_fingerprint()
+        rebuilt = []
+        for days in SUMMARY_PERIODS:
+            with self._build_locks[days]:
+                report = self._cached(days)
+                if (force or report is None or report.day != date.today()
+                        or report.fingerprint != fingerprint):
+                    self._build(db, days, fingerprint)
+                    rebuilt.append(days)
+        return rebuilt
+
+    def mark_dirty(self):
+        """Данные заказов изменились: следующий запрос или проверка сверит отпечаток"""
+        self._dirty.update(SUMMARY_PERIODS)
+
+
+# Отчеты процесса
+summary_reports = SummaryReportCache()
@@ -1,7 +1,40 @@
 import os
+import json
+import random
+import warnings
 import requests
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from psycopg2.extras import Json, execute_values
+
+from database import get_engine
+from wpf_stream import OrderRecordParser, WpfOrderRecord, decode_orders
+
+# Размер куска при потоковом чтении ответа WPF
+SYNC_CHUNK_SIZE = 64 * 1024
+
+# Очередь уведомлений для WPF: сколько отправлять одним запросом
+OUTBOX_BATCH_SIZE = int(os.getenv('WPF_OUTBOX_BATCH_SIZE', '100'))
+# Экспоненциальная пауза между попытками: 5 с, 10 с, 20 с ... до 30 минут
+OUTBOX_BACKOFF_BASE_SECONDS = 5
+OUTBOX_BACKOFF_MAX_SECONDS = 1800
+# После стольких неудачных попыток уведомление помечается failed
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('WPF_OUTBOX_MAX_ATTEMPTS', '12'))
+# На сколько пакет закрепляется за флашером на время запроса к WPF
+# (больше таймаута запроса, 5 + 30 с)
+OUTBOX_LEASE_SECONDS = 120
+
+
+def _json_dumps(value) -> str:
+    """JSON для payload: даты и прочие типы — строкой"""
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def outbox_backoff(attempts: int) -> timedelta:
+    """Пауза перед следующей попыткой (с разбросом, чтобы не бить залпом)"""
+    seconds = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=seconds * random.uniform(0.8, 1.2))
 
 class SyncService:
     """Сервис синхронизации с WPF программой"""
@@ -15,59 +48,256 @@ class SyncService:
         """Проверка настроек синхронизации"""
         return bool(self.api_key and self.sync_endpoint)
     
-    def sync_orders_from_wpf(self) -> List[Dict]:
-        """Синхронизировать заказы из WPF программы"""
+    def iter_orders_from_wpf(self) -> Iterator[WpfOrderRecord]:
+        """Потоково получить заказы из WPF программы
+
+        Ответ разбирается по мере поступления: в памяти нет ни полного
+        тела ответа, ни промежуточного списка словарей. Если поток
+        оборвался на середине (сбой соединения, испорченный JSON),
+        исключение пробрасывается: полученные заказы неполные.
+        """
         if not self.is_configured():
             print("⚠️  Синхронизация не настроена. Установите SYNC_API_KEY и SYNC_ENDPOINT")
-            return []
-        
+            return
+
+        parser = OrderRecordParser()
+        count = 0
         try:
-            # Здесь будет API вызов к вашей WPF программе
-            # Предполагаем, что WPF программа отдает данные в формате JSON
-            response = requests.post(
+            # Предполагаем, что WPF программа отдает {"orders": [...]} в формате JSON
+            with requests.post(
                 self.sync_endpoint,
                 headers={'Authorization': f'Bearer {self.api_key}'},
-                json={'action': 'get_orders'}
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.last_sync_time = datetime.now()
-                print(f"✅ Синхронизация успешна. Получено {len(data.get('orders', []))} заказов")
-                return data.get('orders', [])
-            else:
-                print(f"❌ Ошибка синхронизации: {response.status_code}")
-                return []
-                
+                json={'action': 'get_orders'},
+                stream=True,
+                timeout=(10, 300)
+            ) as response:
+                if response.status_code != 200:
+                    print(f"❌ Ошибка синхронизации: {response.status_code}")
+                    return
+
+                for record in decode_orders(response.iter_content(chunk_size=SYNC_CHUNK_SIZE), parser):
+                    count += 1
+                    yield record
+
+            self.last_sync_time = datetime.now()
+            print(f"✅ Синхронизация успешна. Получено {count} заказов, пропущено {parser.skipped}")
         except Exception as e:
-            print(f"❌ Ошибка при синхронизации: {e}")
+            print(f"❌ Ошибка при синхронизации (получено {count} заказов): {e}")
+            raise
+
+    def sync_orders_from_wpf(self) -> List[Dict]:
+        """Синхронизировать заказы из WPF программы (устарело)
+
+        Оставлено для совместимости: возвращает список словарей, как
+        раньше, и держит в памяти весь ответ; при ошибке (в том числе
+        оборванном потоке) — пустой список. Используйте
+        iter_orders_from_wpf().
+        """
+        warnings.warn(
+            "sync_orders_from_wpf() устарел, используйте iter_orders_from_wpf()",
+            DeprecationWarning, stacklevel=2
+        )
+        try:
+            return [record.to_dict() for record in self.iter_orders_from_wpf()]
+        except Exception:
+            # Ошибка уже выведена в iter_orders_from_wpf
             return []
     
     def send_notification_to_wpf(self, order_data: Dict, notification_type: str) -> bool:
-        """Отправить уведомление в WPF программу"""
+        """Поставить уведомление для WPF программы в очередь (outbox)
+
+        Сетевого запроса здесь нет: уведомление сохраняется в таблицу
+        wpf_outbox и уходит пакетом при следующем flush_outbox().
+        """
         if not self.is_configured():
             return False
         
+        conn = get_engine().raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO wpf_outbox (notification_type, payload)
+                VALUES (%s, %s)
+            """, (notification_type, Json(order_data, dumps=_json_dumps)))
+            conn.commit()
+            cursor.close()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Ошибка постановки уведомления WPF в очередь: {e}")
+            return False
+        finally:
+            conn.close()
+    
+    def flush_outbox(self, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+        """Отправить пакет готовых уведомлений одним запросом, вернуть число отправленных
+
+        Пакет забирается короткой транзакцией: next_attempt_at строк
+        сдвигается на OUTBOX_LEASE_SECONDS, поэтому другой флашер их не
+        возьмет, а соединение и блокировки не держатся во время запроса
+        к WPF. Результат записывается второй короткой транзакцией; при
+        ошибке у строк растет attempts и сдвигается next_attempt_at.
+        Все времена берутся из базы (NOW()).
+        """
+        if not self.is_configured():
+            return 0
+        
+        rows = self._claim_outbox_batch(batch_size)
+        if not rows:
+            return 0
+        
+        error = None
         try:
             response = requests.post(
                 self.sync_endpoint,
-                headers={'Authorization': f'Bearer {self.api_key}'},
-                json={
-                    'action': 'notification',
-                    'type': notification_type,
-                    'order': order_data,
-                    'timestamp': datetime.now().isoformat()
-                }
+                headers={'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'},
+                data=_json_dumps({
+                    'action': 'notifications',
+                    'notifications': [
+                        {
+                            'id': row_id,
+                            'type': notification_type,
+                            'order': payload,
+                            'timestamp': created_at.isoformat()
+                        }
+                        for row_id, notification_type, payload, created_at, _ in rows
+                    ]
+                }).encode('utf-8'),
+                timeout=(5, 30)
             )
-            return response.status_code == 200
-        except:
-            return False
+            if response.status_code != 200:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+        except requests.RequestException as e:
+            error = str(e)[:500]
+        
+        self._record_outbox_result(rows, error)
+        if error is not None:
+            print(f"❌ Ошибка отправки {len(rows)} уведомлений в WPF: {error}")
+            return 0
+        return len(rows)
+    
+    def _claim_outbox_batch(self, batch_size: int) -> List[tuple]:
+        """Забрать пакет готовых уведомлений (аренда на OUTBOX_LEASE_SECONDS)"""
+        conn = get_engine().raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                WITH batch AS (
+                    SELECT id
+                    FROM wpf_outbox
+                    WHERE status = 'pending' AND next_attempt_at <= NOW()
+                    ORDER BY next_attempt_at, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE wpf_outbox o
+                SET next_attempt_at = NOW() + %s * INTERVAL '1 second'
+                FROM batch
+                WHERE o.id = batch.id
+                RETURNING o.id, o.notification_type, o.payload, o.created_at, o.attempts
+            """, (batch_size, OUTBOX_LEASE_SECONDS))
+            rows = sorted(cursor.fetchall())
+            conn.commit()
+            cursor.close()
+            return rows
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def _record_outbox_result(self, rows: List[tuple], error: Optional[str]):
+        """Отметить пакет отправленным или назначить следующую попытку"""
+        conn = get_engine().raw_connection()
+        try:
+            cursor = conn.cursor()
+            if error is None:
+                cursor.execute("""
+                    UPDATE wpf_outbox
+                    SET status = 'sent', sent_at = NOW(), attempts = attempts + 1, last_error = NULL
+                    WHERE id = ANY(%s)
+                """, ([row[0] for row in rows],))
+            else:
+                values = []
+                for row_id, _, _, _, attempts in rows:
+                    attempts += 1
+                    values.append((
+                        row_id,
+                        attempts,
+                        'failed' if attempts >= OUTBOX_MAX_ATTEMPTS else 'pending',
+                        outbox_backoff(attempts).total_seconds(),
+                        error
+                    ))
+                execute_values(cursor, """
+                    UPDATE wpf_outbox o
+                    SET attempts = v.attempts, last_error = v.error, status = v.status,
+                        next_attempt_at = NOW() + v.delay * INTERVAL '1 second'
+                    FROM (VALUES %s) AS v(id, attempts, status, delay, error)
+                    WHERE o.id = v.id
+                """, values, template="(%s, %s, %s, %s::float8, %s)")
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def prune_outbox(self, retention_days: int = 7) -> int:
+        """Удалить отправленные уведомления старше срока хранения (failed остаются для разбора)"""
+        conn = get_engine().raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM wpf_outbox
+                WHERE status = 'sent' AND sent_at < NOW() - %s * INTERVAL '1 day'
+            """, (retention_days,))
+            deleted = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            return deleted
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def get_outbox_status(self) -> Dict:
+        """Счетчики очереди уведомлений WPF по статусам и возраст самого старого ожидающего"""
+        conn = get_engine().raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT status, COUNT(*), MIN(created_at)
+                FROM wpf_outbox
+                WHERE status <> 'sent' OR sent_at >= NOW() - INTERVAL '1 day'
+                GROUP BY status
+            """)
+            status = {'pending': 0, 'sent_last_day': 0, 'failed': 0, 'oldest_pending': None}
+            for name, count, oldest in cursor.fetchall():
+                if name == 'sent':
+                    status['sent_last_day'] = count
+                else:
+                    status[name] = count
+                    if name == 'pending' and oldest:
+                        status['oldest_pending'] = oldest.isoformat()
+            cursor.close()
+            return status
+        finally:
+            conn.rollback()
+            conn.close()
     
     def get_sync_status(self) -> Dict:
         """Получить статус синхронизации"""
-        return {
+        status = {
             'configured': self.is_configured(),
             'last_sync': self.last_sync_time.isoformat() if self.last_sync_time else None,
             'api_key_set': bool(self.api_key),
             'endpoint_set': bool(self.sync_endpoint)
         }
+        if self.is_configured():
+            try:
+                status['outbox'] = self.get_outbox_status()
+            except Exception as e:
+                status['outbox'] = {'error': str(e)[:100]}
+        return status
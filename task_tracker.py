@@ -0,0 +1,160 @@
+"""Сроки задач: привязка исполнителей к чатам и пакетные напоминания
+
+tasks.assigned_to — свободный текст из WPF программы. Исполнитель
+привязывает к нему свой чат командой /tasks iam <имя>; напоминания по его
+задачам приходят в этот чат.
+
+Периодическая проверка находит задачи со сроком до «сейчас + окно»
+одним диапазонным запросом по частичному индексу ix_tasks_open_due
+(и просроченные, и скоро истекающие), кладет по одному сообщению на чат
+в notifications (их доставляет обычная отправка дайджестов) и отмечает
+в task_reminders, что напоминание сделано, — все одной транзакцией.
+"""
+import os
+from collections import defaultdict
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+from psycopg2.extras import execute_values
+
+from database import ASSIGNEE_KEY_SQL, TASK_COLUMNS, TASK_OPEN_SQL, get_engine, normalize_assignee
+from rows import make_rows
+
+# За сколько часов до срока напоминать о задаче
+TASK_DUE_SOON_HOURS = float(os.getenv('TASK_DUE_SOON_HOURS', '24'))
+# Как часто повторять напоминание о просроченной задаче
+TASK_OVERDUE_REPEAT_HOURS = float(os.getenv('TASK_OVERDUE_REPEAT_HOURS', '24'))
+# Предел задач за одну проверку (остальные попадут в следующую)
+TASK_REMINDER_BATCH = 1000
+# Сколько задач перечислять в одном напоминании
+TASK_REMINDER_LINES = 20
+
+REMINDER_SQL = f"""
+    SELECT {TASK_COLUMNS}, a.chat_id, t.due_date < LOCALTIMESTAMP AS is_overdue
+    FROM tasks t
+    JOIN orders o ON o.id = t.order_id
+    JOIN task_assignees a ON a.assignee = {ASSIGNEE_KEY_SQL}
+    LEFT JOIN task_reminders r ON r.task_id = t.id
+    WHERE {TASK_OPEN_SQL}
+      AND t.due_date < LOCALTIMESTAMP + %(soon)s
+      AND CASE WHEN t.due_date < LOCALTIMESTAMP
+               THEN r.overdue_sent_at IS NULL OR r.overdue_sent_at < LOCALTIMESTAMP - %(repeat)s
+               ELSE r.due_soon_sent_at IS NULL
+          END
+    ORDER BY a.chat_id, t.due_date, t.id
+    LIMIT %(limit)s
+"""
+
+
+def link_assignee(name: str, chat_id) -> str:
+    """Привязать исполнителя к чату; возвращает ключ исполнителя"""
+    assignee = normalize_assignee(name)[:100]
+    if not assignee:
+        raise ValueError("Пустое имя исполнителя")
+
+    conn = get_engine().raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO task_assignees (assignee, chat_id)
+            VALUES (%s, %s)
+            ON CONFLICT (assignee, chat_id) DO NOTHING
+        """, (assignee, str(chat_id)))
+        conn.commit()
+        cursor.close()
+        return assignee
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def unlink_assignees(chat_id) -> int:
+    """Отвязать от чата всех исполнителей"""
+    conn = get_engine().raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM task_assignees WHERE chat_id = %s", (str(chat_id),))
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def format_task_reminder(tasks: List) -> str:
+    """Одно сообщение со всеми задачами чата: сначала просроченные"""
+    overdue = [task for task in tasks if task.is_overdue]
+    soon = [task for task in tasks if not task.is_overdue]
+
+    text = "📋 *Напоминание о задачах*\n"
+    shown = 0
+    for title, group in (("🔴 Просрочены", overdue), (f"🟡 Срок в ближайшие {TASK_DUE_SOON_HOURS:g} ч", soon)):
+        if not group:
+            continue
+        text += f"\n*{title}* ({len(group)}):\n"
+        for task in group:
+            if shown >= TASK_REMINDER_LINES:
+                break
+            text += (f"• {task.due_date.strftime('%d.%m %H:%M')} · *{task.order_number}* — "
+                     f"{task.description} ({task.assigned_to})\n")
+            shown += 1
+    if len(tasks) > shown:
+        text += f"… и еще {len(tasks) - shown}. Все задачи: /tasks mine\n"
+    return text
+
+
+def queue_task_reminders(engine=None) -> Tuple[int, int]:
+    """Поставить напоминания о просроченных и скоро истекающих задачах
+
+    Возвращает (число задач, число чатов).
+    """
+    engine = engine or get_engine()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(REMINDER_SQL, {
+            'soon': timedelta(hours=TASK_DUE_SOON_HOURS),
+            'repeat': timedelta(hours=TASK_OVERDUE_REPEAT_HOURS),
+            'limit': TASK_REMINDER_BATCH,
+        })
+        columns = [column[0] for column in cursor.description]
+        rows = make_rows(columns, cursor.fetchall())
+        if not rows:
+            conn.rollback()
+            return 0, 0
+
+        by_chat: Dict[str, List] = defaultdict(list)
+        for row in rows:
+            by_chat[row.chat_id].append(row)
+
+        execute_values(cursor, """
+            INSERT INTO notifications (chat_id, message, notification_type, scheduled_time, sent)
+            VALUES %s
+        """, [(chat_id, format_task_reminder(tasks)) for chat_id, tasks in by_chat.items()],
+            template="(%s, %s, 'task', LOCALTIMESTAMP, FALSE)")
+
+        # Задача могла прийти в несколько чатов: отмечаем один раз
+        flags = {row.id: row.is_overdue for row in rows}
+        execute_values(cursor, """
+            INSERT INTO task_reminders (task_id, due_soon_sent_at, overdue_sent_at)
+            VALUES %s
+            ON CONFLICT (task_id) DO UPDATE SET
+                due_soon_sent_at = COALESCE(EXCLUDED.due_soon_sent_at, task_reminders.due_soon_sent_at),
+                overdue_sent_at = COALESCE(EXCLUDED.overdue_sent_at, task_reminders.overdue_sent_at)
+        """, [(task_id, not overdue, overdue) for task_id, overdue in flags.items()],
+            template="(%s, CASE WHEN %s THEN LOCALTIMESTAMP END, CASE WHEN %s THEN LOCALTIMESTAMP END)")
+
+        conn.commit()
+        cursor.close()
+        return len(flags), len(by_chat)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
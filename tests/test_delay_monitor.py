@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('sqlalchemy')
+
+from delay_monitor import ETA_STAGE, MILESTONES, find_delays
+
+NOW = 1_700_000_000.0
+DAY = 86400
+
+
+def columns_for(*orders):
+    """Колонки результата DELAY_SCAN_SQL для заказов (eta_at, даты этапов)"""
+    rows = [
+        (i, f'ORD-{i}', 'client', 'route', 'status', None, eta_at, *milestones, None, NOW)
+        for i, (eta_at, milestones) in enumerate(orders)
+    ]
+    return list(zip(*rows))
+
+
+def milestones(**dates):
+    return [dates.get(name) for name in MILESTONES]
+
+
+def test_planned_future_dates_do_not_advance_stage():
+    late = (NOW - 10 * DAY, milestones(loading_date=NOW - 60 * DAY, client_receiving_date=NOW + 5 * DAY))
+    delays = find_delays(columns_for(late), NOW)
+    assert [(row, stage) for row, stage, _, _ in delays] == [(0, 0)]
+
+
+def test_received_order_is_not_late():
+    received = (NOW - 10 * DAY, milestones(loading_date=NOW - 60 * DAY, client_receiving_date=NOW - DAY))
+    assert find_delays(columns_for(received), NOW) == []
+
+
+def test_eta_only_order():
+    delays = find_delays(columns_for((NOW - 2 * DAY, milestones())), NOW)
+    assert delays == [(0, ETA_STAGE, None, 2 * DAY)]
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+
+from rows import OrderView, make_row
+from search_index import SUMMARY_COLUMNS, OrderSearchIndex
+
+UPDATED = datetime(2024, 1, 10, 12, 0)
+
+
+def order(number, client='Client', status='В пути', updated_at=UPDATED):
+    return make_row(SUMMARY_COLUMNS, [number, client, status, 'route', 1, updated_at], OrderView)
+
+
+class FakeDb:
+    """get_orders_updated_since по списку строк в памяти"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_orders_updated_since(self, since):
+        return [row for row in self.rows if since is None or row.updated_at >= since]
+
+
+def test_refresh_without_changes_returns_zero():
+    db = FakeDb([order('ORD-1'), order('ORD-2', updated_at=UPDATED - timedelta(seconds=2))])
+    index = OrderSearchIndex()
+    assert index.load(db) == 2
+    # Обе строки попадают в окно перекрытия, но не менялись
+    assert index.refresh(db) == 0
+
+
+def test_refresh_counts_changed_orders():
+    db = FakeDb([order('ORD-1'), order('ORD-2')])
+    index = OrderSearchIndex()
+    index.load(db)
+    db.rows[1] = order('ORD-2', client='Other', updated_at=UPDATED + timedelta(minutes=1))
+    assert index.refresh(db) == 1
+    assert [row.order_number for row in index.search('other')] == ['ORD-2']
+    assert index.refresh(db) == 0
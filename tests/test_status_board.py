@@ -0,0 +1,34 @@
+from circuit_breaker import current_report, track_stale
+from rows import make_rows
+from status_board import StatusCountsCache
+
+COLUMNS = ('status', 'order_count', 'container_count')
+
+
+class FakeDb:
+    """get_status_counts, которая не может прочитать базу, пока down"""
+
+    def __init__(self):
+        self.down = True
+        self.calls = 0
+
+    def get_status_counts(self):
+        self.calls += 1
+        if self.down:
+            current_report().unavailable = True
+            return []
+        return make_rows(COLUMNS, [('В пути', 2, 5)])
+
+
+def test_failed_read_is_not_cached():
+    db = FakeDb()
+    cache = StatusCountsCache(ttl=60)
+    with track_stale() as reads:
+        assert cache.get(db) == {}
+    assert reads.unavailable
+
+    db.down = False
+    counts = cache.get(db)
+    assert counts['В пути'].orders == 2
+    assert cache.get(db) is counts
+    assert db.calls == 2
@@ -0,0 +1,69 @@
+import json
+
+import pytest
+
+pytest.importorskip('psycopg2')
+pytest.importorskip('sqlalchemy')
+requests = pytest.importorskip('requests')
+
+from sync_service import SyncService
+
+ORDER = {'order_number': 'ORD-1', 'client_name': 'Client'}
+
+
+class FakeResponse:
+    """Потоковый ответ WPF из заранее заданных кусков"""
+
+    status_code = 200
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv('SYNC_API_KEY', 'key')
+    monkeypatch.setenv('SYNC_ENDPOINT', 'http://wpf.local/sync')
+    return SyncService()
+
+
+def respond(monkeypatch, *chunks):
+    monkeypatch.setattr(requests, 'post', lambda *args, **kwargs: FakeResponse(chunks))
+
+
+def test_complete_stream(monkeypatch, service):
+    body = json.dumps({'orders': [ORDER, dict(ORDER, order_number='ORD-2')]}).encode()
+    respond(monkeypatch, body[:20], body[20:])
+    with pytest.warns(DeprecationWarning):
+        orders = service.sync_orders_from_wpf()
+    assert [order['order_number'] for order in orders] == ['ORD-1', 'ORD-2']
+    assert service.last_sync_time is not None
+
+
+def test_connection_reset_mid_stream(monkeypatch, service):
+    body = json.dumps({'orders': [ORDER, dict(ORDER, order_number='ORD-2')]}).encode()
+    respond(monkeypatch, body[:-20], requests.ConnectionError('reset'))
+    with pytest.raises(requests.ConnectionError):
+        list(service.iter_orders_from_wpf())
+    with pytest.warns(DeprecationWarning):
+        assert service.sync_orders_from_wpf() == []
+    assert service.last_sync_time is None
+
+
+def test_truncated_body(monkeypatch, service):
+    body = json.dumps({'orders': [ORDER, dict(ORDER, order_number='ORD-2')]}).encode()
+    respond(monkeypatch, body[:-20])
+    with pytest.raises(ValueError):
+        list(service.iter_orders_from_wpf())
@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('telegram')
+
+from telegram import Chat, Message, Update
+
+from update_processor import FLOOD_BURST, ChatOrderedUpdateProcessor
+
+
+def update_for(chat_id, update_id):
+    chat = Chat(chat_id, Chat.PRIVATE)
+    message = Message(update_id, datetime.now(timezone.utc), chat)
+    return Update(update_id, message=message)
+
+
+def test_updates_of_one_chat_run_in_order():
+    processor = ChatOrderedUpdateProcessor(4)
+    handled = []
+
+    async def handle(n, delay):
+        await asyncio.sleep(delay)
+        handled.append(n)
+
+    async def main():
+        # Первое обновление обрабатывается дольше остальных
+        await asyncio.gather(*(
+            processor.process_update(update_for(1, n), handle(n, delay))
+            for n, delay in enumerate((0.05, 0.01, 0))
+        ))
+
+    asyncio.run(main())
+    assert handled == [0, 1, 2]
+
+
+def test_sequential_flood_is_dropped():
+    processor = ChatOrderedUpdateProcessor(4)
+    handled = []
+
+    async def handle(n):
+        handled.append(n)
+
+    async def main():
+        # Каждое обновление успевает обработаться до прихода следующего
+        for n in range(int(FLOOD_BURST) + 3):
+            await processor.process_update(update_for(1, n), handle(n))
+
+    asyncio.run(main())
+    assert processor.dropped > 0
+    assert len(handled) < int(FLOOD_BURST) + 3
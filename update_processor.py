@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+# Сколько обновлений обрабатывать одновременно (во всех чатах вместе)
+CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', '16'))
+
+# Защита от флуда в одном чате: в среднем FLOOD_RATE обновлений в секунду
+# с запасом FLOOD_BURST подряд и не больше FLOOD_MAX_PENDING в очереди чата
+FLOOD_RATE = float(os.getenv('FLOOD_RATE', '1'))
+FLOOD_BURST = float(os.getenv('FLOOD_BURST', '5'))
+FLOOD_MAX_PENDING = int(os.getenv('FLOOD_MAX_PENDING', '10'))
+# Не чаще раза в столько секунд предупреждать чат о флуде
+FLOOD_WARNING_SECONDS = 30
+
+FLOOD_WARNING_TEXT = "⏳ Слишком много запросов. Подождите несколько секунд."
+
+
+class _ChatState:
+    """Очередь и счетчик флуда одного чата"""
+
+    __slots__ = ('lock', 'pending', 'tokens', 'checked_at', 'warned_at')
+
+    def __init__(self, now: float):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+        self.tokens = FLOOD_BURST
+        self.checked_at = now
+        self.warned_at = float('-inf')
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка обновлений с сохранением порядка внутри чата
+
+    Обновления разных чатов обрабатываются одновременно (не больше
+    max_concurrent_updates), обновления одного чата — строго по очереди
+    поступления: перед общим лимитом берется блокировка чата, а ожидающие
+    asyncio.Lock получают ее в порядке FIFO. Inline-запросы отвечаются из
+    памяти и идут без очереди.
+
+    Чату, который присылает больше FLOOD_RATE обновлений в секунду (с
+    запасом FLOOD_BURST) или копит больше FLOOD_MAX_PENDING необработанных,
+    лишние обновления не обрабатываются; раз в FLOOD_WARNING_SECONDS он
+    получает предупреждение.
+    """
+
+    def __init__(self, max_concurrent_updates: int = CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        self._chats: Dict[Hashable, _ChatState] = {}
+        self.dropped = 0
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[Hashable]:
+        if not isinstance(update, Update) or update.inline_query is not None:
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return ('user', update.effective_user.id)
+        return None
+
+    def _allow(self, state: _ChatState, now: float) -> bool:
+        """Токен-бакет чата: пополняется со скоростью FLOOD_RATE"""
+        state.tokens = min(FLOOD_BURST, state.tokens + (now - state.checked_at) * FLOOD_RATE)
+        state.checked_at = now
+        if state.tokens < 1 or state.pending >= FLOOD_MAX_PENDING:
+            return False
+        state.tokens -= 1
+        return True
+
+    @staticmethod
+    def _refilled(state: _ChatState, now: float) -> bool:
+        """Бакет чата пополнился до FLOOD_BURST к моменту now"""
+        return state.tokens + (now - state.checked_at) * FLOOD_RATE >= FLOOD_BURST
+
+    async def process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._chat_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        now = time.monotonic()
+        state = self._chats.get(key)
+        if state is None:
+            state = self._chats[key] = _ChatState(now)
+
+        if not self._allow(state, now):
+            coroutine.close()
+            self.dropped += 1
+            await self._warn_flood(update, state, now)
+            return
+
+        state.pending += 1
+        try:
+            # До первого await очередь чата не меняется, поэтому блокировку
+            # запрашивают в порядке поступления обновлений
+            async with state.lock:
+                await super().process_update(update, coroutine)
+        finally:
+            state.pending -= 1
+            if not state.pending and self._refilled(state, time.monotonic()):
+                # Бакет снова полон: состояние пустого чата не отличается от
+                # нового, хранить его не нужно
+                self._chats.pop(key, None)
+
+    async def _warn_flood(self, update: Update, state: _ChatState, now: float):
+        if now - state.warned_at < FLOOD_WARNING_SECONDS:
+            return
+        state.warned_at = now
+        logger.warning(f"🌊 Флуд из чата {self._chat_key(update)}: обновление пропущено")
+        try:
+            if update.callback_query is not None:
+                await update.callback_query.answer(FLOOD_WARNING_TEXT)
+            elif update.effective_message is not None:
+                await update.effective_message.reply_text(FLOOD_WARNING_TEXT)
+        except Exception as e:
+            logger.debug(f"Не удалось предупредить о флуде: {e}")
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def report(self) -> str:
+        return (f"Обработка обновлений: до {self.max_concurrent_updates} одновременно, "
+                f"чатов в очереди: {len(self._chats)}, пропущено из-за флуда: {self.dropped}")
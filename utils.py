@@ -1,6 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Union
 from models import Order, OrderStatus
+from rows import OrderView
 
 def format_date(date: Optional[datetime]) -> str:
     """Форматировать дату в читаемый вид"""
@@ -27,9 +28,15 @@ def get_status_emoji(status: str) -> str:
     }
     return emoji_map.get(status, "📋")
 
-def format_order_info(order: Order) -> str:
-    """Форматировать информацию о заказе"""
+def format_order_info(order: Union[Order, OrderView]) -> str:
+    """Форматировать информацию о заказе
+
+    Принимает ORM Order или строку OrderView из get_order_by_number
+    (в ней итоги веса и объема уже посчитаны запросом).
+    """
     emoji = get_status_emoji(order.status)
+    total_weight = getattr(order, 'total_weight', None) or 0
+    total_volume = getattr(order, 'total_volume', None) or 0
     
     text = f"""
 {emoji} *ЗАКАЗ: {order.order_number}*
@@ -37,8 +44,8 @@ def format_order_info(order: Order) -> str:
 *Основная информация:*
 👤 Клиент: {order.client_name}
 📦 Контейнеров: {order.container_count}
-⚖️ Вес: {order.total_weight:.0f} кг
-📏 Объем: {order.total_volume:.1f} м³
+⚖️ Вес: {total_weight:.0f} кг
+📏 Объем: {total_volume:.1f} м³
 📍 Маршрут: {order.route or '-'}
 🏁 Транзитный порт: {order.transit_port or '-'}
 📦 Груз: {order.goods_type or '-'}
@@ -77,6 +84,49 @@ def format_order_info(order: Order) -> str:
     
     return text
 
+def format_container_info(container) -> str:
+    """Карточка контейнера: заказ, хронология перевозки и водитель
+
+    container — строка find_containers / find_containers_by_truck
+    (колонки контейнера и order_number, client_name, route, status заказа).
+    """
+    timeline = [
+        ("📦 Загрузка", container.loading_date),
+        ("🚢 Отплытие из Китая", container.departure_date),
+        ("🏁 Прибытие в Иран", container.arrival_iran_date),
+        ("🚛 Погрузка на грузовик", container.truck_loading_date),
+        ("🏁 Прибытие в Туркменистан", container.arrival_turkmenistan_date),
+        ("✅ Получение клиентом", container.client_receiving_date),
+    ]
+    
+    text = f"""
+📦 *КОНТЕЙНЕР: {container.container_number or '-'}*
+
+🏷️ Тип: {container.container_type or '-'}
+⚖️ Вес: {container.weight or 0:.0f} кг
+📏 Объем: {container.volume or 0:.1f} м³
+
+*Заказ:*
+{get_status_emoji(container.status)} *{container.order_number}* - {container.client_name}
+📍 Маршрут: {container.route or '-'}
+📝 Статус: {container.status}
+
+*Хронология:*
+"""
+    for title, date in timeline:
+        text += f"{'✓' if date else '✗'} {title}: {format_date(date)}\n"
+    
+    driver = ' '.join(part for part in (container.driver_first_name, container.driver_last_name) if part)
+    text += f"""
+*Водитель:*
+👤 {driver or '-'}
+🏢 Компания: {container.driver_company or '-'}
+🚛 Грузовик: {container.truck_number or '-'}
+📞 Иран: {container.driver_iran_phone or '-'}
+📞 Туркменистан: {container.driver_turkmenistan_phone or '-'}
+"""
+    return text
+
 def calculate_days_left(target_date: datetime) -> int:
     """Рассчитать количество дней до даты"""
     if not target_date:
@@ -0,0 +1,246 @@
+import re
+import json
+import codecs
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Поля заказа, которые принимаются от WPF программы
+STRING_FIELDS = (
+    'order_number', 'client_name', 'goods_type', 'route', 'transit_port',
+    'document_number', 'chinese_transport_company', 'iranian_transport_company',
+    'status', 'status_color', 'notes', 'additional_info'
+)
+INT_FIELDS = ('container_count',)
+BOOL_FIELDS = ('has_loading_photo', 'has_local_charges', 'has_tex')
+DATE_FIELDS = (
+    'creation_date', 'loading_date', 'departure_date', 'arrival_iran_date',
+    'truck_loading_date', 'arrival_turkmenistan_date', 'client_receiving_date',
+    'arrival_notice_date', 'tkm_date', 'eta_date'
+)
+ORDER_FIELDS = STRING_FIELDS + INT_FIELDS + BOOL_FIELDS + DATE_FIELDS
+
+# Ключи JSON сопоставляются без учета регистра и подчеркиваний:
+# order_number, OrderNumber и orderNumber означают одно поле
+_FIELD_BY_KEY = {name.replace('_', ''): name for name in ORDER_FIELDS}
+
+# Предел размера одного элемента массива в буфере (защита от мусора в потоке)
+MAX_ITEM_CHARS = 1024 * 1024
+
+
+class WpfOrderRecord:
+    """Компактная проверенная запись заказа из WPF (без словаря на экземпляр)"""
+
+    __slots__ = ORDER_FIELDS
+
+    def __init__(self, **values):
+        for name in ORDER_FIELDS:
+            setattr(self, name, values.get(name))
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in ORDER_FIELDS}
+
+    def __repr__(self) -> str:
+        return f"WpfOrderRecord({self.order_number!r}, {self.status!r})"
+
+
+# Разбор дат: быстрые разборщики без strptime
+def _parse_iso(value: str) -> datetime:
+    result = datetime.fromisoformat(value)
+    if result.tzinfo is not None:
+        result = result.astimezone().replace(tzinfo=None)
+    return result
+
+
+def _parse_dmy(value: str) -> datetime:
+    """dd.mm.yyyy"""
+    if len(value) != 10 or value[2] != '.' or value[5] != '.':
+        raise ValueError(value)
+    return datetime(int(value[6:10]), int(value[3:5]), int(value[0:2]))
+
+
+def _parse_dmy_hm(value: str) -> datetime:
+    """dd.mm.yyyy HH:MM"""
+    if len(value) != 16 or value[2] != '.' or value[5] != '.' or value[13] != ':':
+        raise ValueError(value)
+    return datetime(int(value[6:10]), int(value[3:5]), int(value[0:2]),
+                    int(value[11:13]), int(value[14:16]))
+
+
+_DOTNET_DATE_RE = re.compile(r'^/Date\((-?\d+)([+-]\d{4})?\)/$')
+
+
+def _parse_dotnet(value: str) -> datetime:
+    """/Date(1714550400000)/ — формат DataContractJsonSerializer"""
+    match = _DOTNET_DATE_RE.match(value)
+    if not match:
+        raise ValueError(value)
+    return datetime(1970, 1, 1) + timedelta(milliseconds=int(match.group(1)))
+
+
+DATE_PARSERS = (_parse_iso, _parse_dmy, _parse_dmy_hm, _parse_dotnet)
+
+
+class FieldDateParser:
+    """Разбор дат с запоминанием формата для каждого поля
+
+    Первый удачный формат поля кэшируется; следующие значения поля
+    разбираются сразу им, без перебора форматов через исключения.
+    """
+
+    def __init__(self):
+        self._cache: Dict[str, Callable[[str], datetime]] = {}
+
+    def parse(self, field: str, value) -> Optional[datetime]:
+        if not value or not isinstance(value, str):
+            return None
+
+        parser = self._cache.get(field)
+        if parser is not None:
+            try:
+                return parser(value)
+            except (ValueError, TypeError):
+                pass
+
+        for parser in DATE_PARSERS:
+            try:
+                result = parser(value)
+            except (ValueError, TypeError, OverflowError):
+                continue
+            self._cache[field] = parser
+            return result
+        return None
+
+
+class OrderRecordParser:
+    """Проверка и приведение типов одного заказа из JSON"""
+
+    def __init__(self):
+        self.dates = FieldDateParser()
+        self._key_cache: Dict[str, Optional[str]] = {}
+        self.skipped = 0
+
+    def _field(self, key: str) -> Optional[str]:
+        field = self._key_cache.get(key, False)
+        if field is False:
+            field = self._key_cache[key] = _FIELD_BY_KEY.get(key.replace('_', '').lower())
+        return field
+
+    def parse(self, item) -> Optional[WpfOrderRecord]:
+        """Запись или None, если заказ невалиден (без номера или клиента)"""
+        if not isinstance(item, dict):
+            self.skipped += 1
+            return None
+
+        values = {}
+        for key, value in item.items():
+            field = self._field(key)
+            if field is None or value is None:
+                continue
+            if field in DATE_FIELDS:
+                values[field] = self.dates.parse(field, value)
+            elif field in BOOL_FIELDS:
+                values[field] = value if isinstance(value, bool) else str(value).lower() in ('1', 'true', 'yes')
+            elif field in INT_FIELDS:
+                try:
+                    values[field] = int(value)
+                except (TypeError, ValueError):
+                    values[field] = 0
+            else:
+                values[field] = str(value).strip()
+
+        if not values.get('order_number') or not values.get('client_name'):
+            self.skipped += 1
+            return None
+        return WpfOrderRecord(**values)
+
+
+class OrderArrayDecoder:
+    """Инкрементальный разбор массива заказов из потока байтов
+
+    Принимает либо {"orders": [...], ...}, либо голый массив [...].
+    В памяти держится только необработанный хвост буфера, а не весь ответ.
+    """
+
+    _ARRAY_START_RE = re.compile(r'"orders"\s*:\s*\[')
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'seek'
+
+    def feed(self, chunk: bytes) -> Iterator:
+        """Добавить очередной кусок ответа и вернуть готовые элементы массива"""
+        self._buffer += self._text.decode(chunk)
+        if self._state == 'seek':
+            self._seek()
+        if self._state == 'items':
+            yield from self._items()
+
+    def close(self):
+        """Проверить, что массив завершен"""
+        if self._state == 'seek':
+            raise ValueError("В ответе нет массива заказов")
+        if self._state == 'items':
+            raise ValueError("Ответ оборван внутри массива заказов")
+
+    def _seek(self):
+        stripped = self._buffer.lstrip()
+        if stripped.startswith('['):
+            self._pos = len(self._buffer) - len(stripped) + 1
+            self._state = 'items'
+            return
+
+        match = self._ARRAY_START_RE.search(self._buffer)
+        if match:
+            self._pos = match.end()
+            self._state = 'items'
+        elif len(self._buffer) > 64:
+            # Ключ может быть разрезан между кусками: оставляем хвост
+            self._buffer = self._buffer[-64:]
+
+    def _items(self) -> Iterator:
+        buffer = self._buffer
+        pos = self._pos
+        length = len(buffer)
+
+        while True:
+            while pos < length and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= length:
+                break
+            if buffer[pos] == ']':
+                self._state = 'done'
+                pos += 1
+                break
+            try:
+                item, pos = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Элемент пришел не целиком — ждем следующий кусок
+                if length - pos > MAX_ITEM_CHARS:
+                    raise ValueError("Слишком большой или поврежденный элемент в ответе WPF")
+                break
+            yield item
+
+        # Сжимаем буфер: обработанная часть больше не нужна
+        self._buffer = buffer[pos:]
+        self._pos = 0
+
+
+def decode_orders(chunks, parser: Optional[OrderRecordParser] = None) -> Iterator[WpfOrderRecord]:
+    """Разобрать поток кусков ответа в проверенные записи заказов"""
+    decoder = OrderArrayDecoder()
+    parser = parser or OrderRecordParser()
+    for chunk in chunks:
+        for item in decoder.feed(chunk):
+            record = parser.parse(item)
+            if record is not None:
+                yield record
+    decoder.close()
+
+
+def parse_records(items: List) -> List[WpfOrderRecord]:
+    """Разобрать уже загруженный список словарей (например, из тела webhook)"""
+    parser = OrderRecordParser()
+    return [record for record in map(parser.parse, items) if record is not None]
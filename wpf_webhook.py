@@ -0,0 +1,282 @@
+"""Входящий webhook для изменений заказов из WPF программы
+
+WPF программа сама отправляет измененные и удаленные заказы:
+
+    POST /wpf/orders
+    X-Timestamp: <unix время, секунды>
+    X-Idempotency-Key: <уникальный ключ пакета>
+    X-Signature: <hex HMAC-SHA256(WPF_WEBHOOK_SECRET, "<timestamp>.<тело>")>
+
+    {"orders": [{...заказ целиком...}], "deleted": ["ORD-001"]}
+
+Каждый пакет применяется к базе одной транзакцией. Повторная доставка
+с тем же ключом идемпотентности подтверждается без повторного применения.
+Сервер работает в отдельном потоке процесса бота (только stdlib).
+"""
+import hmac
+import json
+import hashlib
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from database import get_engine
+from wpf_stream import ORDER_FIELDS, WpfOrderRecord, parse_records
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = '/wpf/orders'
+
+# Порт не задан — webhook выключен
+WEBHOOK_PORT = os.getenv('WPF_WEBHOOK_PORT')
+WEBHOOK_HOST = os.getenv('WPF_WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_SECRET = os.getenv('WPF_WEBHOOK_SECRET', '')
+
+# Допустимое расхождение X-Timestamp с часами бота (защита от повтора старых запросов)
+SIGNATURE_TOLERANCE_SECONDS = 300
+MAX_BODY_BYTES = 10 * 1024 * 1024
+MAX_IDEMPOTENCY_KEY_LENGTH = 100
+
+# Сколько дней хранить ключи идемпотентности
+DELIVERY_RETENTION_DAYS = 7
+
+# Значения по умолчанию (SQL) для колонок с DEFAULT в orders. Подставляются
+# только новому заказу; у существующего заказа колонка, не пришедшая из
+# WPF, сохраняет прежнее значение (дата создания и статус не переписываются)
+_DEFAULTS = {
+    'container_count': '0',
+    'status': "'New'",
+    'status_color': "'#FFFFFF'",
+    'has_loading_photo': 'FALSE',
+    'has_local_charges': 'FALSE',
+    'has_tex': 'FALSE',
+    'creation_date': 'LOCALTIMESTAMP',
+}
+
+
+def _update_expression(field: str) -> str:
+    if field in _DEFAULTS:
+        return f'{field} = COALESCE(EXCLUDED.{field}, orders.{field})'
+    return f'{field} = EXCLUDED.{field}'
+
+
+UPSERT_SQL = f"""
+    INSERT INTO orders ({', '.join(ORDER_FIELDS)})
+    VALUES %s
+    ON CONFLICT (order_number) DO UPDATE SET
+        {', '.join(_update_expression(field) for field in ORDER_FIELDS if field != 'order_number')}
+    RETURNING id
+"""
+
+# Новые заказы вставляются с NULL в не пришедших колонках: заполняем их
+FILL_DEFAULTS_SQL = f"""
+    UPDATE orders
+    SET {', '.join(f'{field} = COALESCE({field}, {default})' for field, default in _DEFAULTS.items())}
+    WHERE id = ANY(%s)
+      AND ({' OR '.join(f'{field} IS NULL' for field in _DEFAULTS)})
+"""
+
+
+class WebhookError(Exception):
+    """Ошибка запроса webhook с HTTP статусом ответа"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def verify_signature(secret: str, timestamp: str, body: bytes, signature: str,
+                     now: Optional[float] = None) -> bool:
+    """Проверить подпись HMAC-SHA256 и свежесть метки времени"""
+    if not secret or not timestamp or not signature:
+        return False
+    try:
+        sent_at = int(timestamp)
+    except ValueError:
+        return False
+    if abs((now or time.time()) - sent_at) > SIGNATURE_TOLERANCE_SECONDS:
+        return False
+
+    expected = hmac.new(secret.encode(), timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+def _order_values(record: WpfOrderRecord) -> Tuple:
+    return tuple(getattr(record, field) for field in ORDER_FIELDS)
+
+
+def apply_delta(idempotency_key: str, records: List[WpfOrderRecord], deleted: List[str],
+                engine=None) -> bool:
+    """Применить пакет одной транзакцией; False — пакет с этим ключом уже применен"""
+    engine = engine or get_engine()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO wpf_webhook_deliveries (idempotency_key, orders_upserted, orders_deleted)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (idempotency_key) DO NOTHING
+        """, (idempotency_key, len(records), len(deleted)))
+        if cursor.rowcount == 0:
+            conn.rollback()
+            return False
+
+        if records:
+            # Заказ с одним номером дважды в пакете: побеждает последний
+            unique = {record.order_number: record for record in records}
+            upserted = execute_values(cursor, UPSERT_SQL, [_order_values(record) for record in unique.values()],
+                                      page_size=500, fetch=True)
+            cursor.execute(FILL_DEFAULTS_SQL, ([row[0] for row in upserted],))
+
+        if deleted:
+            # Зависимые строки не удаляются каскадом — убираем их явно
+            cursor.execute("""
+                DELETE FROM containers
+                WHERE order_id IN (SELECT id FROM orders WHERE order_number = ANY(%s))
+            """, (deleted,))
+            cursor.execute("""
+                DELETE FROM tasks
+                WHERE order_id IN (SELECT id FROM orders WHERE order_number = ANY(%s))
+            """, (deleted,))
+            cursor.execute("DELETE FROM orders WHERE order_number = ANY(%s)", (deleted,))
+
+        conn.commit()
+        cursor.close()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def prune_deliveries(retention_days: int = DELIVERY_RETENTION_DAYS, engine=None) -> int:
+    """Удалить старые ключи идемпотентности"""
+    engine = engine or get_engine()
+    conn = engine.raw_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM wpf_webhook_deliveries WHERE received_at < NOW() - %s * INTERVAL '1 day'",
+            (retention_days,)
+        )
+        deleted = cursor.rowcount
+        conn.commit()
+        cursor.close()
+        return deleted
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def parse_delta(body: bytes) -> Tuple[List[WpfOrderRecord], List[str], int]:
+    """Разобрать тело пакета: (записи, удаленные номера, число отброшенных заказов)"""
+    try:
+        payload = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        raise WebhookError(400, "Тело запроса не является JSON")
+    if not isinstance(payload, dict):
+        raise WebhookError(400, "Ожидается JSON объект")
+
+    orders = payload.get('orders') or []
+    deleted = payload.get('deleted') or []
+    if not isinstance(orders, list) or not isinstance(deleted, list):
+        raise WebhookError(400, "orders и deleted должны быть массивами")
+
+    records = parse_records(orders)
+    deleted = [str(number).strip() for number in deleted if number and str(number).strip()]
+    return records, deleted, len(orders) - len(records)
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов webhook"""
+
+    # Задаются сервером
+    secret = ''
+    on_change: Optional[Callable[[List[WpfOrderRecord], List[str]], None]] = None
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            raise WebhookError(411, "Нужен Content-Length")
+        if length < 0:
+            # rfile.read(-1) ждал бы конца соединения
+            raise WebhookError(400, "Неверный Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise WebhookError(413, "Слишком большой пакет")
+        return self.rfile.read(length)
+
+    def do_POST(self):
+        try:
+            if self.path != WEBHOOK_PATH:
+                raise WebhookError(404, "Неизвестный адрес")
+
+            body = self._read_body()
+            if not verify_signature(self.secret, self.headers.get('X-Timestamp', ''), body,
+                                    self.headers.get('X-Signature', '')):
+                raise WebhookError(401, "Неверная подпись")
+
+            key = (self.headers.get('X-Idempotency-Key') or '').strip()
+            if not key or len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+                raise WebhookError(400, "Нужен X-Idempotency-Key")
+
+            records, deleted, rejected = parse_delta(body)
+            if not apply_delta(key, records, deleted):
+                self._reply(200, {'status': 'duplicate'})
+                return
+
+            if self.on_change is not None:
+                try:
+                    self.on_change(records, deleted)
+                except Exception as e:
+                    logger.error(f"Ошибка обновления кэшей после webhook: {e}")
+
+            logger.info(f"📥 Webhook WPF: {len(records)} заказов, удалено {len(deleted)}, отброшено {rejected}")
+            self._reply(200, {'status': 'applied', 'upserted': len(records),
+                              'deleted': len(deleted), 'rejected': rejected})
+        except WebhookError as e:
+            self._reply(e.status, {'status': 'error', 'error': str(e)})
+        except Exception as e:
+            logger.error(f"Ошибка обработки webhook WPF: {e}")
+            self._reply(500, {'status': 'error', 'error': 'internal error'})
+
+    def log_message(self, format, *args):
+        # Доступ логируется через logging, а не в stderr
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def start_webhook_server(on_change: Optional[Callable] = None, port: Optional[int] = None,
+                         host: str = WEBHOOK_HOST, secret: str = WEBHOOK_SECRET) -> Optional[ThreadingHTTPServer]:
+    """Запустить сервер webhook в фоновом потоке (None, если не настроен)"""
+    port = port if port is not None else (int(WEBHOOK_PORT) if WEBHOOK_PORT else None)
+    if port is None:
+        return None
+    if not secret:
+        logger.error("❌ WPF_WEBHOOK_SECRET не задан: webhook WPF не запущен")
+        return None
+
+    handler = type('ConfiguredWebhookHandler', (WebhookHandler,), {
+        'secret': secret,
+        'on_change': staticmethod(on_change) if on_change else None,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='wpf-webhook', daemon=True).start()
+    logger.info(f"📥 Webhook WPF слушает {host}:{port}{WEBHOOK_PATH}")
+    return server